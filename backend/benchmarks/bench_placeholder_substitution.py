@@ -0,0 +1,85 @@
+"""Compare the legacy and single-pass placeholder substitution on the shipped template.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_placeholder_substitution [--repeat 200]
+"""
+import argparse
+import copy
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from docx.oxml.ns import qn  # noqa: E402
+
+from shared_code import rendering  # noqa: E402
+
+TEMPLATE_PATH = ROOT / "templates" / "contract-template.docx"
+
+
+def legacy_apply_placeholders_to_runs(
+    runs: Iterable[Any], placeholders: Dict[str, str], used: set[str]
+) -> None:
+    """The O(runs x placeholders) implementation this benchmark measures against."""
+    for run in runs:
+        for key, value in placeholders.items():
+            marker = f"[{key}]"
+            if marker in run.text:
+                run.text = run.text.replace(marker, value)
+                used.add(key)
+
+
+def _sample_context(placeholders: Iterable[str]) -> Dict[str, str]:
+    return {key: f"value for {key.lower()}" for key in placeholders}
+
+
+def _time_path(
+    apply: Callable[[Iterable[Any], Dict[str, str], set[str]], None],
+    pristine: Any,
+    context: Dict[str, str],
+    repeat: int,
+) -> List[float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        runs = list(copy.deepcopy(pristine).iter(qn("w:r")))
+        used: set[str] = set()
+        started = time.perf_counter()
+        apply(runs, context, used)
+        samples.append(time.perf_counter() - started)
+        assert used == set(context), sorted(set(context) - used)
+    return samples
+
+
+def _report(label: str, samples: List[float]) -> float:
+    median = statistics.median(samples)
+    print(
+        f"{label:<12} median {median * 1e6:9.1f} us   "
+        f"min {min(samples) * 1e6:9.1f} us   ops/s {1 / median:10.0f}"
+    )
+    return median
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    compiled = rendering.CompiledDocxTemplate(TEMPLATE_PATH.read_bytes())
+    pristine = compiled._pristine
+    context = _sample_context(compiled.placeholders)
+    run_count = sum(1 for _ in pristine.iter(qn("w:r")))
+
+    print(f"{TEMPLATE_PATH.name}: {run_count} runs, {len(context)} placeholders, {args.repeat} rounds")
+    legacy = _report("legacy", _time_path(legacy_apply_placeholders_to_runs, pristine, context, args.repeat))
+    single = _report("single-pass", _time_path(rendering._apply_placeholders_to_runs, pristine, context, args.repeat))
+    print(f"speed-up     {legacy / single:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Synthetic payloads and scaled templates for the benchmarks."""
+import copy
+import io
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from docx import Document
+
+ROOT = Path(__file__).resolve().parents[1]
+TEMPLATE_PATH = ROOT / "templates" / "contract-template.docx"
+
+
+# ============================================================
+# Mask A/B payloads
+# ============================================================
+
+
+BASE_MASK_A: Dict[str, Any] = {
+    "rolle": "Vermieter",
+    "eigene_name": "Hausverwaltung Muster GmbH",
+    "eigene_anschrift": "Musterstraße 1, 10115 Berlin",
+    "eigene_email": "verwaltung@example.com",
+    "eigene_telefon": "+49 30 1234567",
+    "eigene_iban": "DE89370400440532013000",
+    "gegenpartei_bekannt": "Ja",
+    "gegenpartei_name": "Erika Mustermann",
+    "gegenpartei_anschrift": "Beispielweg 2, 10117 Berlin",
+    "ust_id": "DE123456789",
+    "steuernummer": "12/345/67890",
+    "objektadresse": "Objektstraße 3, 10119 Berlin",
+    "wohnung_bez": "3. OG links",
+    "wohnflaeche": "78.5",
+    "ausstattung": ["Einbauküche", "Balkon"],
+    "zustand": "renoviert",
+    "schluessel_anzahl": "4",
+    "schluessel_arten": ["Haustür", "Wohnung", "Briefkasten"],
+    "bezugsfertig": "2009-05-01",
+    "mietbeginn": "2025-01-01",
+    "grundmiete": "1250.00",
+}
+
+BASE_MASK_B: Dict[str, Any] = {
+    "kuendigungsverzicht": 2,
+    "anlagen": ["Hausordnung", "Übergabeprotokoll", "Energieausweis"],
+}
+
+_OVER_LIMIT = {
+    "mpb_status": "Bereits vermietet",
+    "mpb_vormiet": "nach dem 1. Juni 2015",
+    "mpb_grenze": "Nein, über Grenze",
+}
+
+# One entry per terminal branch of the Mietpreisbremse cascade.
+MPB_BRANCHES: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {
+    "new-build-after-2014": ({"bezugsfertig": "2016-03-01"}, {}),
+    "neubau-never-let": ({}, {"mpb_status": "Neubau (nie vermietet)"}),
+    "prior-tenancy-before-2015": (
+        {},
+        {"mpb_status": "Bereits vermietet", "mpb_vormiet": "vor dem 1. Juni 2015"},
+    ),
+    "within-limit": (
+        {},
+        {
+            "mpb_status": "Bereits vermietet",
+            "mpb_vormiet": "nach dem 1. Juni 2015",
+            "mpb_grenze": "Ja, unter Grenze",
+        },
+    ),
+    "over-limit-prior-rent": (
+        {},
+        {**_OVER_LIMIT, "mpb_vormiete": True, "mpb_vormiete_betrag": "1180"},
+    ),
+    "over-limit-modernisation": (
+        {},
+        {**_OVER_LIMIT, "mpb_modern": "Ja", "mpb_modern_text": "Fenster und Heizung 2023"},
+    ),
+    "over-limit-first-let": (
+        {},
+        {**_OVER_LIMIT, "mpb_erstmiete": "on", "mpb_erstmiete_text": "Kernsanierung 2024"},
+    ),
+}
+
+
+def mask_pair(branch: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    mask_a_overrides, mask_b_overrides = MPB_BRANCHES[branch]
+    mask_a = {**BASE_MASK_A, **mask_a_overrides}
+    mask_b = {**BASE_MASK_B, **mask_b_overrides}
+    # Alternate the optional sections so both sides of each switch are exercised.
+    if branch.startswith("over-limit"):
+        mask_a.update({"rolle": "Mieter", "wird_vertreten": "Ja", "vertreten_durch": "RA Beispiel"})
+        mask_a.update({"weg": "Ja", "mea": "125/10000"})
+        mask_b["weg_text"] = "Die Teilungserklärung ist Bestandteil dieses Vertrages."
+    return mask_a, mask_b
+
+
+# ============================================================
+# Templates
+# ============================================================
+
+
+def scaled_docx_template(factor: int, source: Optional[bytes] = None) -> bytes:
+    """Return the shipped template with its body repeated ``factor`` times."""
+    data = source if source is not None else TEMPLATE_PATH.read_bytes()
+    if factor == 1:
+        return data
+
+    document = Document(io.BytesIO(data))
+    body = document.element.body
+    blocks = [child for child in body if not child.tag.endswith("}sectPr")]
+    sect_pr = body[-1] if body[-1].tag.endswith("}sectPr") else None
+    for _ in range(factor - 1):
+        for block in blocks:
+            if sect_pr is not None:
+                sect_pr.addprevious(copy.deepcopy(block))
+            else:
+                body.append(copy.deepcopy(block))
+
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def html_template_from_docx(docx_bytes: bytes) -> bytes:
+    document = Document(io.BytesIO(docx_bytes))
+    blocks: List[str] = [f"<p>{p.text}</p>" for p in document.paragraphs if p.text.strip()]
+    return "\n\n".join(blocks).encode("utf-8")
+
+
+def docx_template_with_tables(source: Optional[bytes] = None) -> bytes:
+    """Return the shipped template with every body paragraph repeated in a table.
+
+    Each row holds the paragraph in a horizontally merged cell and again in a
+    table nested in the last cell, the layouts that proxy-based walks revisit
+    or miss.
+    """
+    data = source if source is not None else TEMPLATE_PATH.read_bytes()
+    document = Document(io.BytesIO(data))
+    paragraphs = [p._p for p in document.paragraphs if p.text.strip()]
+
+    table = document.add_table(rows=len(paragraphs), cols=3)
+    for row, paragraph in zip(table.rows, paragraphs):
+        merged = row.cells[0].merge(row.cells[1])
+        merged._tc.append(copy.deepcopy(paragraph))
+        nested = row.cells[2].add_table(rows=1, cols=2)
+        for cell in nested.rows[0].cells:
+            cell._tc.append(copy.deepcopy(paragraph))
+
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def _noise_png(width: int, height: int) -> bytes:
+    """An RGB PNG of random pixels, which does not compress (like a scanned photo)."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + os.urandom(width * 3) for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows, 0))
+        + chunk(b"IEND", b"")
+    )
+
+
+def docx_template_with_images(count: int = 2, side: int = 1024, source: Optional[bytes] = None) -> bytes:
+    """Return the shipped template with ``count`` embedded ``side``x``side`` photos (~3 MiB each)."""
+    data = source if source is not None else TEMPLATE_PATH.read_bytes()
+    document = Document(io.BytesIO(data))
+    for _ in range(count):
+        document.add_picture(io.BytesIO(_noise_png(side, side)))
+
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
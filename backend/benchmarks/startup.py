@@ -0,0 +1,148 @@
+"""Cold-start import cost of each Azure Function.
+
+Imports every function package (each folder holding a ``function.json``) in a
+fresh interpreter under ``python -X importtime`` and reports the median
+cumulative import time together with its heaviest direct imports.
+
+Run from ``backend/``::
+
+    python -m benchmarks.startup --save benchmarks/startup-baseline.json
+    python -m benchmarks.startup --compare benchmarks/startup-baseline.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Already loaded by the Functions worker before any function is imported.
+PRELOADED = ("azure.functions",)
+
+
+@dataclass
+class StartupResult:
+    function: str
+    import_ms: float
+    heaviest: List[Tuple[str, float]] = field(default_factory=list)
+
+
+def discover_functions(root: Path = ROOT) -> List[str]:
+    return sorted(path.parent.name for path in root.glob("*/function.json"))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, str, float]]:
+    """Return ``(depth, module, cumulative_ms)`` for every ``-X importtime`` line."""
+    entries: List[Tuple[int, str, float]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        entries.append((depth, stripped.strip(), int(cumulative) / 1000))
+    return entries
+
+
+def measure_function(name: str, runs: int, top: int) -> StartupResult:
+    preload = "".join(f"import {module}; " for module in PRELOADED)
+    samples: List[float] = []
+    heaviest: List[Tuple[str, float]] = []
+
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"{preload}import {name}"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        entries = parse_importtime(completed.stderr)
+        root_index = max(i for i, (depth, module, _) in enumerate(entries) if depth == 0 and module == name)
+        samples.append(entries[root_index][2])
+
+        # Children are printed before their parent; walk back to the previous top-level line.
+        children: List[Tuple[str, float]] = []
+        for depth, module, cumulative in reversed(entries[:root_index]):
+            if depth == 0:
+                break
+            if depth == 1:
+                children.append((module, cumulative))
+        if samples[-1] == min(samples):
+            heaviest = sorted(children, key=lambda item: item[1], reverse=True)[:top]
+
+    return StartupResult(name, round(statistics.median(samples), 2), heaviest)
+
+
+def _print_results(results: List[StartupResult], baseline: Optional[Dict[str, Any]]) -> None:
+    previous = {case["function"]: case for case in (baseline or {}).get("functions", [])}
+    print(f"{'function':<28}{'import ms':>10}" + ("   vs baseline" if previous else ""))
+    for result in results:
+        line = f"{result.function:<28}{result.import_ms:>10.1f}"
+        if result.function in previous:
+            line += f"   {result.import_ms / previous[result.function]['import_ms'] - 1:+7.1%}"
+        print(line)
+        for module, cumulative in result.heaviest:
+            print(f"    {module:<40}{cumulative:>8.1f}")
+
+
+def _regressions(
+    results: List[StartupResult], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    previous = {case["function"]: case for case in baseline.get("functions", [])}
+    return [
+        result.function
+        for result in results
+        if result.function in previous
+        and result.import_ms > previous[result.function]["import_ms"] * (1 + threshold)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="only measure functions whose name contains this text")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per function")
+    parser.add_argument("--top", type=int, default=5, help="direct imports listed per function")
+    parser.add_argument("--save", type=Path, help="write results as a baseline JSON file")
+    parser.add_argument("--compare", type=Path, help="compare against a saved baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25,
+        help="relative import time increase reported as a regression (default 0.25)",
+    )
+    args = parser.parse_args(argv)
+
+    results = [
+        measure_function(name, args.runs, args.top)
+        for name in discover_functions()
+        if args.filter in name
+    ]
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    _print_results(results, baseline)
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "functions": [asdict(result) for result in results],
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+
+    if baseline is not None:
+        regressed = _regressions(results, baseline, args.threshold)
+        if regressed:
+            print(f"Regressions above {args.threshold:.0%}: " + ", ".join(regressed))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
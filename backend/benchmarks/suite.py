@@ -0,0 +1,284 @@
+"""Offline benchmark suite for the contract generation hot path.
+
+Drives ``build_contract_context``, template compilation, ``render_docx_template``,
+``render_html_template`` and the full ``generate_contract.main`` against an
+in-memory storage backend, so neither Azurite nor ``func start`` is needed.
+The ``tables`` template repeats the body in merged and nested table cells and
+the ``images`` template carries two large embedded pictures; ``peak KiB`` is
+the traced allocation peak of a single call, i.e. per request for ``main/*``.
+
+Run from ``backend/``::
+
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import azure.functions as func  # noqa: E402
+
+import generate_contract as gc  # noqa: E402
+from benchmarks import fixtures  # noqa: E402
+from domain.contract_context import (  # noqa: E402
+    build_contract_context,
+    build_contract_context_columns,
+    iter_contract_contexts,
+    update_contract_context,
+)
+from shared_code import rendering  # noqa: E402
+from shared_code.storage import get_blob_store  # noqa: E402
+
+SCALES = (1, 10, 100)
+SCALED_LABELS = tuple(f"{scale}x" for scale in SCALES)
+STORAGE_CONNECTION = "memory://benchmarks"
+
+
+@dataclass
+class CaseResult:
+    name: str
+    iterations: int
+    ops_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    peak_kib: float
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_case(
+    name: str, operation: Callable[[], Any], min_time: float, min_iterations: int
+) -> CaseResult:
+    operation()  # warm caches (compiled templates, pooled clients) outside the samples
+
+    samples: List[float] = []
+    started = time.perf_counter()
+    while len(samples) < min_iterations or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - t0)
+
+    # Peak memory is sampled on a separate call; tracemalloc would skew timings.
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return CaseResult(
+        name=name,
+        iterations=len(samples),
+        ops_per_sec=len(samples) / sum(samples),
+        p50_ms=statistics.median(samples) * 1000,
+        p99_ms=_percentile(samples, 0.99) * 1000,
+        peak_kib=peak / 1024,
+    )
+
+
+# ============================================================
+# Cases
+# ============================================================
+
+
+def context_cases() -> Dict[str, Callable[[], Any]]:
+    cases = {}
+    for branch in fixtures.MPB_BRANCHES:
+        mask_a, mask_b = fixtures.mask_pair(branch)
+        cases[f"context/{branch}"] = lambda a=mask_a, b=mask_b: build_contract_context(a, b)
+
+    # A short-form template's placeholders: the MPB cascade and annex list are skipped.
+    mask_a, mask_b = fixtures.mask_pair("over-limit-modernisation")
+    short_form = {"LANDLORD_NAME", "TENANT_NAME", "OBJEKTADRESSE", "MIETBEGINN", "BETRAG"}
+    cases["context-short-form/modernisation"] = (
+        lambda: build_contract_context(mask_a, mask_b, short_form)
+    )
+
+    # A portfolio of every branch, built through the streaming and columnar bulk APIs.
+    portfolio = [fixtures.mask_pair(branch) for branch in fixtures.MPB_BRANCHES] * 150
+    cases[f"context-bulk/{len(portfolio)}"] = lambda: list(iter_contract_contexts(portfolio))
+    cases[f"context-columns/{len(portfolio)}"] = lambda: build_contract_context_columns(portfolio)
+
+    # A draft edit of the rent, recomputed incrementally from the previous context.
+    mask_a, mask_b = fixtures.mask_pair("over-limit-prior-rent")
+    previous = build_contract_context(mask_a, mask_b)
+    edited = {**mask_a, "grundmiete": "1250"}
+    cases["context-update/grundmiete"] = (
+        lambda: update_contract_context(previous, edited, mask_b, {"grundmiete"})
+    )
+    return cases
+
+
+def _render_and_discard(extension: str, template: bytes, context: Dict[str, str]) -> None:
+    with rendering.render_to_buffer(extension, template, context):
+        pass
+
+
+def render_cases(docx_templates: Dict[str, bytes]) -> Dict[str, Callable[[], Any]]:
+    context = build_contract_context(*fixtures.mask_pair("within-limit"))
+    cases: Dict[str, Callable[[], Any]] = {}
+    for label, template in docx_templates.items():
+        if label in SCALED_LABELS:
+            html = fixtures.html_template_from_docx(template)
+            cases[f"render-html/{label}"] = lambda h=html: rendering.render_html_template(h, context)
+        cases[f"compile-docx/{label}"] = lambda t=template: rendering.CompiledDocxTemplate(t)
+        cases[f"render-docx/{label}"] = lambda t=template: rendering.render_docx_template(t, context)
+        # Same render into a spooled buffer, as the functions do before uploading.
+        cases[f"render-docx-spooled/{label}"] = (
+            lambda t=template: _render_and_discard(".docx", t, context)
+        )
+    return cases
+
+
+class _MainRunner:
+    """Calls ``generate_contract.main`` on one event loop."""
+
+    def __init__(self, blob_name: str) -> None:
+        self.loop = asyncio.new_event_loop()
+        mask_a, mask_b = fixtures.mask_pair("over-limit-prior-rent")
+        self.request = func.HttpRequest(
+            method="POST",
+            url="/api/generate_contract",
+            body=json.dumps(
+                {"maskA": mask_a, "maskB": mask_b, "templatePath": f"templates/{blob_name}"}
+            ).encode("utf-8"),
+        )
+
+    def __call__(self) -> None:
+        response = self.loop.run_until_complete(gc.main(self.request))
+        if response.status_code != 200:
+            raise RuntimeError(f"main returned {response.status_code}: {response.get_body()!r}")
+
+
+def main_cases(docx_templates: Dict[str, bytes]) -> Dict[str, Callable[[], Any]]:
+    """Full pipeline cases, served by the in-memory storage backend instead of Azure."""
+    os.environ.update(
+        {
+            "StorageBackend": "memory",
+            "TemplateBlobConnection": STORAGE_CONNECTION,
+            "ContractsBlobConnection": STORAGE_CONNECTION,
+            "ContractDeduplication": "false",
+        }
+    )
+
+    store = get_blob_store(STORAGE_CONNECTION)
+    cases: Dict[str, Callable[[], Any]] = {}
+    for label in ("1x", "10x", "images"):
+        blob_name = f"bench-{label}.docx"
+        asyncio.run(store.upload("templates", blob_name, docx_templates[label]))
+        cases[f"main/{label}"] = _MainRunner(blob_name)
+    return cases
+
+
+# ============================================================
+# Reporting
+# ============================================================
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_results(results: List[CaseResult], baseline: Optional[Dict[str, Any]]) -> None:
+    previous = {case["name"]: case for case in (baseline or {}).get("cases", [])}
+    header = f"{'case':<34}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>11}"
+    print(header + ("   p50 vs baseline" if previous else ""))
+    for result in results:
+        line = (
+            f"{result.name:<34}{result.ops_per_sec:>10.1f}{result.p50_ms:>10.2f}"
+            f"{result.p99_ms:>10.2f}{result.peak_kib:>11.1f}"
+        )
+        if result.name in previous:
+            change = result.p50_ms / previous[result.name]["p50_ms"] - 1
+            line += f"   {change:+7.1%}"
+        print(line)
+
+
+def _regressions(
+    results: List[CaseResult], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    previous = {case["name"]: case for case in baseline.get("cases", [])}
+    return [
+        result.name
+        for result in results
+        if result.name in previous and result.p50_ms > previous[result.name]["p50_ms"] * (1 + threshold)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to sample each case")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--save", type=Path, help="write results as a baseline JSON file")
+    parser.add_argument("--compare", type=Path, help="compare against a saved baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10,
+        help="relative p50 slowdown reported as a regression (default 0.10)",
+    )
+    args = parser.parse_args(argv)
+
+    docx_templates = {f"{scale}x": fixtures.scaled_docx_template(scale) for scale in SCALES}
+    docx_templates["tables"] = fixtures.docx_template_with_tables()
+    docx_templates["images"] = fixtures.docx_template_with_images()
+    cases: Dict[str, Callable[[], Any]] = {}
+    cases.update(context_cases())
+    cases.update(render_cases(docx_templates))
+    cases.update(main_cases(docx_templates))
+
+    results = [
+        run_case(name, operation, args.min_time, args.min_iterations)
+        for name, operation in cases.items()
+        if args.filter in name
+    ]
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    _print_results(results, baseline)
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(
+            json.dumps(
+                {
+                    "revision": _git_revision(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "cases": [asdict(result) for result in results],
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+
+    if baseline is not None:
+        regressed = _regressions(results, baseline, args.threshold)
+        if regressed:
+            print(f"Regressions above {args.threshold:.0%}: " + ", ".join(regressed))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
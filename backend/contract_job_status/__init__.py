@@ -0,0 +1,36 @@
+import json
+import logging
+from uuid import UUID
+
+import azure.functions as func
+
+from shared_code.jobs import FAILED, SUCCEEDED, get_job
+from shared_code.responses import error_response
+
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    job_id = req.route_params.get("jobId") or ""
+    try:
+        UUID(job_id)
+    except ValueError:
+        return error_response("Unknown contract job.", 404)
+
+    try:
+        job = await get_job(job_id)
+    except RuntimeError:
+        logging.exception("Failed to read contract job %s", job_id)
+        return error_response("Failed to read contract job.", 500)
+
+    if job is None:
+        return error_response("Unknown contract job.", 404)
+
+    headers = {"Cache-Control": "no-store"}
+    if job.status not in (SUCCEEDED, FAILED):
+        headers["Retry-After"] = "1"
+
+    return func.HttpResponse(
+        json.dumps(job.to_dict(), ensure_ascii=False),
+        status_code=200,
+        mimetype="application/json",
+        headers=headers,
+    )
@@ -1,102 +1,356 @@
+import functools
+from dataclasses import dataclass, field
 from datetime import datetime, date
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from decimal import Decimal, InvalidOperation
 import re
 MPB_THRESHOLD = datetime.strptime("2014-10-01", "%Y-%m-%d").date()
 
+_ISO_DATE_PATTERN = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_UNRESOLVED_PLACEHOLDER_PATTERN = re.compile(r"\[[A-Z0-9_]+\]")
+_REQUIRED_PLACEHOLDERS = ("LANDLORD_NAME", "TENANT_NAME", "OBJEKTADRESSE", "MIETBEGINN", "BETRAG")
+_ZUSTAND_TEXTS = {
+    "renoviert": "renoviert",
+    "neu erstellt": "ist neu erstellt",
+    "gebraucht/vertragsgemäß": "in gebrauchtem, vertragsgemäßem Zustand",
+}
+
 
 class ContractContextError(Exception):
     pass
 
 
-def build_contract_context(mask_a: Dict[str, Any], mask_b: Dict[str, Any]) -> Dict[str, Any]:
-    context: Dict[str, Any] = {}
+def build_contract_context(
+    mask_a: Dict[str, Any],
+    mask_b: Dict[str, Any],
+    placeholders: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Builds the placeholder context for one contract.
+
+    ``placeholders`` (usually the template's own set) restricts the context to
+    those keys: only the rules producing them run, so an unused MPB cascade or
+    annex list is neither computed nor validated. Placeholders no rule produces
+    are left out for the template check to report.
+    """
+    return _build_context(mask_a, mask_b, _format_date(date.today()), _requested(placeholders))
+
+
+# ==========================
+# Bulk building
+# ==========================
+
+MaskPair = Tuple[Dict[str, Any], Dict[str, Any]]
 
-    # -------------------------------------------------
-    # A1 – ROLE (Landlord / Tenant)
-    # -------------------------------------------------
+
+def iter_contract_contexts(
+    pairs: Iterable[MaskPair],
+    placeholders: Optional[Iterable[str]] = None,
+) -> Iterator[Union[Dict[str, Any], ContractContextError]]:
+    """
+    Builds one context per (mask_a, mask_b) pair, lazily and in input order,
+    restricted to ``placeholders`` as in build_contract_context.
+
+    A pair that cannot be turned into a context yields its ContractContextError
+    instead of ending the stream; malformed values (e.g. a non-numeric area) are
+    reported the same way. The signature date is taken once for the whole run.
+    """
+    today = _format_date(date.today())
+    requested = _requested(placeholders)
+    for mask_a, mask_b in pairs:
+        try:
+            yield _build_context(mask_a, mask_b, today, requested)
+        except ContractContextError as exc:
+            yield exc
+        except (ArithmeticError, TypeError, ValueError) as exc:
+            error = ContractContextError(f"Invalid value: {exc}")
+            error.__cause__ = exc
+            yield error
+
+
+@dataclass
+class ContractContextColumns:
+    """Bulk build results laid out per placeholder, e.g. for CSV or dataframe export."""
+
+    # Input position of each built context; every column is aligned with it.
+    rows: List[int] = field(default_factory=list)
+    columns: Dict[str, List[Any]] = field(default_factory=dict)
+    errors: Dict[int, ContractContextError] = field(default_factory=dict)
+
+
+def build_contract_context_columns(
+    pairs: Iterable[MaskPair], placeholders: Optional[Iterable[str]] = None
+) -> ContractContextColumns:
+    result = ContractContextColumns()
+    for index, context in enumerate(iter_contract_contexts(pairs, placeholders)):
+        if isinstance(context, ContractContextError):
+            result.errors[index] = context
+            continue
+        result.rows.append(index)
+        for key, value in context.items():
+            result.columns.setdefault(key, []).append(value)
+    return result
+
+
+# ==========================
+# Placeholder rules
+# ==========================
+
+# A rule computes one or more placeholders from the Mask A/B fields it lists.
+# Mask A and Mask B field names do not overlap, so fields are named bare.
+# Rules run in this order, which is also the order errors are reported in.
+@dataclass(frozen=True)
+class _Rule:
+    placeholders: Tuple[str, ...]
+    fields: FrozenSet[str]
+    compute: Callable[[Dict[str, Any], Dict[str, Any], str], Dict[str, Any]]
+
+
+def _rule(*placeholders: str, fields: Iterable[str] = ()):
+    def register(compute):
+        _RULES.append(_Rule(placeholders, frozenset(fields), compute))
+        return compute
+    return register
+
+
+_RULES: List[_Rule] = []
+
+_PARTY_FIELDS = (
+    "rolle", "eigene_name", "eigene_anschrift", "gegenpartei_name",
+    "gegenpartei_anschrift", "wird_vertreten", "vertreten_durch",
+)
+_MPB_FIELDS = (
+    "bezugsfertig", "mpb_status", "mpb_vormiet", "mpb_grenze",
+    "mpb_vormiete", "mpb_vormiete_betrag", "mpb_modern", "mpb_modern_text",
+    "mpb_erstmiete", "mpb_erstmiete_text",
+)
+
+
+# -------------------------------------------------
+# A1 – ROLE (Landlord / Tenant)
+# -------------------------------------------------
+@_rule(
+    "LANDLORD_NAME", "LANDLORD_ADDRESS", "TENANT_NAME", "TENANT_ADDRESS",
+    "LANDLORD_REPRESENTATIVE", "TENANT_REPRESENTATIVE",
+    fields=_PARTY_FIELDS,
+)
+def _parties(mask_a, mask_b, today):
     rolle = mask_a.get("rolle")
     if rolle not in ("Vermieter", "Mieter"):
         raise ContractContextError("A1.rolle must be 'Vermieter' or 'Mieter'")
+    return _format_party_fields(rolle, mask_a)
+
 
-    context.update(_format_party_fields(rolle, mask_a))
+@_rule("VAT_ID", fields=("ust_id",))
+def _vat_id(mask_a, mask_b, today):
+    return {"VAT_ID": mask_a.get("ust_id", "")}
 
-    context["VAT_ID"] = mask_a.get("ust_id", "")
-    context["TAX_NUMBER"] = mask_a.get("steuernummer", "")
 
-    # -------------------------------------------------
-    # A2 – PROPERTY
-    # -------------------------------------------------
-    context["OBJEKTADRESSE"] = mask_a.get("objektadresse", "")
-    context["WOHNUNG_BESCHREIBUNG"] = mask_a.get("wohnung_bez", "")
+@_rule("TAX_NUMBER", fields=("steuernummer",))
+def _tax_number(mask_a, mask_b, today):
+    return {"TAX_NUMBER": mask_a.get("steuernummer", "")}
 
-    context["FLAECHE"] = _format_decimal(mask_a.get("wohnflaeche"))
 
+# -------------------------------------------------
+# A2 – PROPERTY
+# -------------------------------------------------
+@_rule("OBJEKTADRESSE", fields=("objektadresse",))
+def _objektadresse(mask_a, mask_b, today):
+    return {"OBJEKTADRESSE": mask_a.get("objektadresse", "")}
+
+
+@_rule("WOHNUNG_BESCHREIBUNG", fields=("wohnung_bez",))
+def _wohnung(mask_a, mask_b, today):
+    return {"WOHNUNG_BESCHREIBUNG": mask_a.get("wohnung_bez", "")}
+
+
+@_rule("FLAECHE", fields=("wohnflaeche",))
+def _flaeche(mask_a, mask_b, today):
+    return {"FLAECHE": _format_decimal(mask_a.get("wohnflaeche"), "A2.wohnflaeche")}
+
+
+@_rule("AUSSTATTUNG", fields=("ausstattung",))
+def _ausstattung(mask_a, mask_b, today):
     ausstattung = mask_a.get("ausstattung", [])
-    context["AUSSTATTUNG"] = ", ".join(ausstattung) if ausstattung else "keine"
-
-    # -------------------------------------------------
-    # A3 – CONDITION & KEYS
-    # -------------------------------------------------
-    context["ZUSTAND"] = _map_zustand_text(mask_a.get("zustand", ""))
-
-    context["ANZAHL"] = str(mask_a.get("schluessel_anzahl", "") or "")
-    context["ARTEN"] = ", ".join(mask_a.get("schluessel_arten", []) or [])
-
-    # -------------------------------------------------
-    # B2 – MIETPREISBREMSE (MPB) FULL CASCADE
-    # Triggered by A3.bezugsfertig date (critical)
-    # -------------------------------------------------
-    context["MPB_CLAUSE"] = _build_mpb_clause(mask_a, mask_b)
-
-
-
-    # -------------------------------------------------
-    # A4 – RENTAL START
-    # -------------------------------------------------
-    mietbeginn = _parse_date(mask_a.get("mietbeginn"), "A4.mietbeginn")
-    context["MIETBEGINN"] = _format_date(mietbeginn)
-
-    # -------------------------------------------------
-    # A5 – RENT
-    # -------------------------------------------------
-    grundmiete = _format_monetary(mask_a.get("grundmiete"), "A5.grundmiete")
-    context["BETRAG"] = grundmiete
-
-    context["IBAN"] = mask_a.get("eigene_iban", "")
-
-    # -------------------------------------------------
-    # B1 – TERMINATION WAIVER
-    # -------------------------------------------------
-    jahre = int(mask_b.get("kuendigungsverzicht", 0) or 0)
-    context["JAHRE"] = str(jahre) if jahre > 0 else ""
-
-    # -------------------------------------------------
-    # B3 – WEG (optional)
-    # -------------------------------------------------
-    if mask_a.get("weg") == "Ja":
-        context["MEA"] = str(mask_a.get("mea", "") or "")
-        context["WEG_TEXT"] = mask_b.get("weg_text", "")
-    else:
-        context["MEA"] = ""
-        context["WEG_TEXT"] = ""
+    return {"AUSSTATTUNG": ", ".join(ausstattung) if ausstattung else "keine"}
+
+
+# -------------------------------------------------
+# A3 – CONDITION & KEYS
+# -------------------------------------------------
+@_rule("ZUSTAND", fields=("zustand",))
+def _zustand(mask_a, mask_b, today):
+    return {"ZUSTAND": _map_zustand_text(mask_a.get("zustand", ""))}
+
+
+@_rule("ANZAHL", fields=("schluessel_anzahl",))
+def _anzahl(mask_a, mask_b, today):
+    return {"ANZAHL": str(mask_a.get("schluessel_anzahl", "") or "")}
+
+
+@_rule("ARTEN", fields=("schluessel_arten",))
+def _arten(mask_a, mask_b, today):
+    return {"ARTEN": ", ".join(mask_a.get("schluessel_arten", []) or [])}
+
+
+# -------------------------------------------------
+# B2 – MIETPREISBREMSE (MPB) FULL CASCADE
+# Triggered by A3.bezugsfertig date (critical)
+# -------------------------------------------------
+@_rule("MPB_CLAUSE", fields=_MPB_FIELDS)
+def _mpb_clause(mask_a, mask_b, today):
+    return {"MPB_CLAUSE": _build_mpb_clause(mask_a, mask_b)}
+
+
+# -------------------------------------------------
+# A4 – RENTAL START
+# -------------------------------------------------
+@_rule("MIETBEGINN", fields=("mietbeginn",))
+def _mietbeginn(mask_a, mask_b, today):
+    return {"MIETBEGINN": _format_date(_parse_date(mask_a.get("mietbeginn"), "A4.mietbeginn"))}
+
+
+# -------------------------------------------------
+# A5 – RENT
+# -------------------------------------------------
+@_rule("BETRAG", fields=("grundmiete",))
+def _betrag(mask_a, mask_b, today):
+    return {"BETRAG": _format_monetary(mask_a.get("grundmiete"), "A5.grundmiete")}
+
 
-    # -------------------------------------------------
-    # B7 – ANNEXES
-    # -------------------------------------------------
+@_rule("IBAN", fields=("eigene_iban",))
+def _iban(mask_a, mask_b, today):
+    return {"IBAN": mask_a.get("eigene_iban", "")}
+
+
+# -------------------------------------------------
+# B1 – TERMINATION WAIVER
+# -------------------------------------------------
+@_rule("JAHRE", fields=("kuendigungsverzicht",))
+def _jahre(mask_a, mask_b, today):
+    try:
+        jahre = int(mask_b.get("kuendigungsverzicht", 0) or 0)
+    except (OverflowError, TypeError, ValueError) as exc:
+        raise ContractContextError("B1.kuendigungsverzicht must be a whole number") from exc
+    return {"JAHRE": str(jahre) if jahre > 0 else ""}
+
+
+# -------------------------------------------------
+# B3 – WEG (optional)
+# -------------------------------------------------
+@_rule("MEA", fields=("weg", "mea"))
+def _mea(mask_a, mask_b, today):
+    return {"MEA": str(mask_a.get("mea", "") or "") if mask_a.get("weg") == "Ja" else ""}
+
+
+@_rule("WEG_TEXT", fields=("weg", "weg_text"))
+def _weg_text(mask_a, mask_b, today):
+    return {"WEG_TEXT": mask_b.get("weg_text", "") if mask_a.get("weg") == "Ja" else ""}
+
+
+# -------------------------------------------------
+# B7 – ANNEXES
+# -------------------------------------------------
+@_rule("COMPLETE_ANNEX_LIST", fields=("anlagen",))
+def _annex_list(mask_a, mask_b, today):
     anlagen: List[str] = mask_b.get("anlagen", []) or []
-    context["COMPLETE_ANNEX_LIST"] = _format_anlagen(anlagen)
+    return {"COMPLETE_ANNEX_LIST": _format_anlagen(anlagen)}
+
+
+# -------------------------------------------------
+# SIGNATURE
+# -------------------------------------------------
+@_rule("ORT", fields=("objektadresse",))
+def _ort(mask_a, mask_b, today):
+    return {"ORT": _extract_city(mask_a.get("objektadresse", ""))}
+
+
+# Reads no mask field; refreshed on every incremental update instead.
+@_rule("DATUM")
+def _datum(mask_a, mask_b, today):
+    return {"DATUM": today}
+
+
+# Placeholder -> the Mask A/B fields its value is computed from.
+PLACEHOLDER_DEPENDENCIES: Dict[str, FrozenSet[str]] = {
+    placeholder: rule.fields for rule in _RULES for placeholder in rule.placeholders
+}
+
+
+# ==========================
+# Single context
+# ==========================
+
+@functools.lru_cache(maxsize=32)
+def _rules_for(placeholders: FrozenSet[str]) -> Tuple[_Rule, ...]:
+    return tuple(rule for rule in _RULES if placeholders.intersection(rule.placeholders))
 
-    # -------------------------------------------------
-    # SIGNATURE
-    # -------------------------------------------------
-    context["ORT"] = _extract_city(context["OBJEKTADRESSE"])
-    context["DATUM"] = _format_date(date.today())
+
+def _requested(placeholders: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    return None if placeholders is None else frozenset(placeholders)
+
+
+def _build_context(
+    mask_a: Dict[str, Any],
+    mask_b: Dict[str, Any],
+    today: str,
+    placeholders: Optional[FrozenSet[str]] = None,
+) -> Dict[str, Any]:
+    context: Dict[str, Any] = {}
+    for rule in _RULES if placeholders is None else _rules_for(placeholders):
+        context.update(rule.compute(mask_a, mask_b, today))
+
+    if placeholders is not None:
+        # Multi-placeholder rules (the party block) may produce unrequested keys.
+        context = {key: value for key, value in context.items() if key in placeholders}
 
     _validate_context(context)
     return context
 
 
+def affected_placeholders(changed_fields: Iterable[str]) -> Set[str]:
+    """Placeholders whose value may change when any of ``changed_fields`` changes."""
+    changed = set(changed_fields)
+    return {
+        placeholder
+        for rule in _RULES
+        if not rule.fields or rule.fields & changed
+        for placeholder in rule.placeholders
+    }
+
+
+def update_contract_context(
+    previous: Dict[str, Any],
+    mask_a: Dict[str, Any],
+    mask_b: Dict[str, Any],
+    changed_fields: Iterable[str],
+    placeholders: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Returns the context for the edited masks, recomputing only the placeholders
+    that read one of ``changed_fields`` and copying the rest from ``previous``.
+
+    ``previous`` must be the context built from the masks before the edit, and
+    ``changed_fields`` must name every Mask A/B field that changed since.
+    ``placeholders`` defaults to the keys of ``previous``, so a context built
+    for a template's placeholders stays restricted to them.
+    """
+    requested = frozenset(previous) if placeholders is None else frozenset(placeholders)
+    changed = set(changed_fields)
+    today = _format_date(date.today())
+    context = dict(previous)
+    recomputed: List[str] = []
+    for rule in _rules_for(requested):
+        if not rule.fields or rule.fields & changed:
+            context.update(rule.compute(mask_a, mask_b, today))
+            recomputed.extend(key for key in rule.placeholders if key in requested)
+
+    # Multi-placeholder rules (the party block) may produce unrequested keys.
+    context = {key: value for key, value in context.items() if key in requested}
+    _validate_context(context, recomputed)
+    return context
+
+
 # ==========================
 # Helper functions
 # ==========================
@@ -140,19 +394,28 @@ def _parse_date(value: str, field_name: str) -> date:
     if not value:
         raise ContractContextError(f"{field_name} is required")
     try:
+        # Zero-padded dates skip strptime; anything else still goes through it.
+        match = _ISO_DATE_PATTERN.fullmatch(value) if isinstance(value, str) else None
+        if match:
+            return date(int(match[1]), int(match[2]), int(match[3]))
         return datetime.strptime(value, "%Y-%m-%d").date()
     except (TypeError, ValueError) as exc:
         raise ContractContextError(f"{field_name} must use YYYY-MM-DD format") from exc
 
 
 def _format_date(value: date) -> str:
-    return value.strftime("%d.%m.%Y")
+    # Same output as strftime("%d.%m.%Y"), without the C-level format parsing.
+    return f"{value.day:02d}.{value.month:02d}.{value.year}"
 
 
-def _format_decimal(value) -> str:
+def _format_decimal(value, field_name: str = "value") -> str:
     if value is None or value == "":
         return ""
-    return f"{Decimal(value):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    try:
+        decimal_value = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError) as exc:
+        raise ContractContextError(f"{field_name} must be a valid number") from exc
+    return f"{decimal_value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
 
 def _format_monetary(value: Any, field_name: str, allow_zero: bool = True) -> str:
@@ -171,11 +434,7 @@ def _format_monetary(value: Any, field_name: str, allow_zero: bool = True) -> st
 
 
 def _map_zustand_text(zustand: str) -> str:
-    return {
-        "renoviert": "renoviert",
-        "neu erstellt": "ist neu erstellt",
-        "gebraucht/vertragsgemäß": "in gebrauchtem, vertragsgemäßem Zustand",
-    }.get(zustand, zustand)
+    return _ZUSTAND_TEXTS.get(zustand, zustand)
 
 
 def _extract_city(address: str) -> str:
@@ -190,15 +449,16 @@ def _format_anlagen(items: List[str]) -> str:
     )
 
 
-def _validate_context(context: Dict[str, Any]) -> None:
-    required = ["LANDLORD_NAME", "TENANT_NAME", "OBJEKTADRESSE", "MIETBEGINN", "BETRAG"]
-    missing = [k for k in required if not context.get(k)]
+def _validate_context(context: Dict[str, Any], keys: Optional[Iterable[str]] = None) -> None:
+    # ``keys`` limits the unresolved-marker scan to values that were just computed.
+    # Required placeholders a template-restricted context leaves out are not checked.
+    missing = [k for k in _REQUIRED_PLACEHOLDERS if k in context and not context[k]]
     if missing:
         raise ContractContextError(f"Missing required placeholders: {missing}")
 
     bad = [
-        k for k, v in context.items()
-        if isinstance(v, str) and re.search(r"\[[A-Z0-9_]+\]", v)
+        k for k, v in (context.items() if keys is None else ((k, context[k]) for k in keys))
+        if isinstance(v, str) and "[" in v and _UNRESOLVED_PLACEHOLDER_PATTERN.search(v)
     ]
     if bad:
         raise ContractContextError(f"Unresolved placeholders found: {bad}")
@@ -1,93 +1,32 @@
-import io
+import asyncio
 import json
 import logging
-import os
-import re
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Any, Dict, Iterable, Optional, Tuple
-from uuid import uuid4
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
 
 import azure.functions as func
-from azure.core.exceptions import AzureError
-from azure.storage.blob import BlobClient, BlobServiceClient
-from docx import Document
-from pydantic import BaseModel, ValidationError
 
 from domain.contract_context import build_contract_context, ContractContextError
+from shared_code.contracts import (
+    contract_blob_name,
+    contract_fingerprint,
+    deduplication_enabled,
+    find_existing_contract,
+    upload_contract,
+)
+from shared_code.jobs import enqueue_job
+from shared_code.render_executor import RENDER_EXECUTOR, RenderQueueFull, busy_response
+from shared_code.rendering import buffer_size, template_placeholders
+from shared_code.responses import error_response
+from shared_code.templates import StorageSettings, TemplateProcessingError, load_template
+from shared_code.timing import StageTimer, request_body_size
 
+# pydantic is imported on first use to keep cold starts short; see
+# benchmarks/startup.py.
+if TYPE_CHECKING:
+    from .models import GenerateContractRequest
 
-PLACEHOLDER_PATTERN = re.compile(r"\[([A-Z0-9_]+)\]")
 
-
-# ============================================================
-# Errors
-# ============================================================
-
-
-class TemplateProcessingError(RuntimeError):
-    pass
-
-
-# ============================================================
-# Storage Resolution (CRITICAL FIX)
-# ============================================================
-
-
-def _clean(value: Optional[str]) -> Optional[str]:
-    if value and value.strip():
-        return value.strip()
-    return None
-
-
-def _resolve_connection(*env_vars: str, default: str = "UseDevelopmentStorage=true") -> str:
-    for var in env_vars:
-        candidate = _clean(os.getenv(var))
-        if candidate:
-            return candidate
-    return default
-
-
-@dataclass
-class StorageSettings:
-    template_path: str
-    template_container: str
-    template_connection: str
-    contracts_container: str
-    contracts_connection: str
-
-    @classmethod
-    def from_env(cls, template_path_override: Optional[str]) -> "StorageSettings":
-        template_path = _clean(template_path_override) or _clean(
-            os.getenv("TemplateBlobPath")
-        )
-
-        if not template_path:
-            raise TemplateProcessingError(
-                "Template path not provided. Supply 'templatePath' in the request or set the TemplateBlobPath environment variable."
-            )
-
-        return cls(
-            template_path=template_path,
-            template_container=_clean(os.getenv("TemplatesContainer")) or "templates",
-            template_connection=_resolve_connection(
-                "TemplateBlobConnection", "ContractsBlobConnection", "AzureWebJobsStorage"
-            ),
-            contracts_container=_clean(os.getenv("ContractsContainer")) or "contracts",
-            contracts_connection=_resolve_connection(
-                "ContractsBlobConnection", "AzureWebJobsStorage"
-            ),
-        )
-
-    @staticmethod
-    def template_hint() -> str:
-        return (
-            "Check TemplateBlobConnection, ContractsBlobConnection, AzureWebJobsStorage, and TemplatesContainer environment values."
-        )
-
-    @staticmethod
-    def contract_hint() -> str:
-        return "Verify ContractsBlobConnection, AzureWebJobsStorage, and ContractsContainer environment values."
+JOB_STATUS_ROUTE = "/api/contract_jobs"
 
 
 # ============================================================
@@ -95,263 +34,194 @@ class StorageSettings:
 # ============================================================
 
 
-class GenerateContractRequest(BaseModel):
-    maskA: Dict[str, Any]
-    maskB: Dict[str, Any]
-    templatePath: Optional[str] = None
+def __getattr__(name: str) -> Any:
+    if name == "GenerateContractRequest":
+        from .models import GenerateContractRequest
 
-    class Config:
-        extra = "forbid"
+        return GenerateContractRequest
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ============================================================
-# Helpers
+# Azure Function Entry Point
 # ============================================================
 
 
-def _error_response(message: str, status_code: int) -> func.HttpResponse:
-    return func.HttpResponse(
-        json.dumps({"message": message}, ensure_ascii=False),
-        status_code=status_code,
-        mimetype="application/json",
-    )
+def _discard_task(task: "asyncio.Task[Any]") -> None:
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        # Mark a failure we returned early on as retrieved.
+        task.exception()
 
 
-def _load_template(
-    template_path: str, connection_string: str, container: str
-) -> Tuple[str, bytes]:
-    # Local file
-    if os.path.exists(template_path):
-        with open(template_path, "rb") as f:
-            return os.path.splitext(template_path)[1].lower(), f.read()
-
-    if not connection_string:
-        raise TemplateProcessingError(
-            f"Template storage connection not configured for '{template_path}'. {StorageSettings.template_hint()}"
-        )
-
-    blob_name = template_path.lstrip("/")
-    container_name = container
+def _async_requested(req: func.HttpRequest) -> bool:
+    params = getattr(req, "params", None) or {}
+    return (params.get("mode") or "").lower() == "async"
 
-    if "/" in blob_name:
-        maybe_container, remainder = blob_name.split("/", 1)
-        if remainder:
-            container_name = maybe_container
-            blob_name = remainder
 
+async def _enqueue_generation(
+    storage_settings: StorageSettings, context: Dict[str, str], timer: StageTimer
+) -> func.HttpResponse:
     try:
-        service = BlobServiceClient.from_connection_string(connection_string)
-        container_client = service.get_container_client(container_name)
-
-        if not container_client.exists():
-            raise TemplateProcessingError(
-                f"Template container '{container_name}' not found while attempting to read '{template_path}'. {StorageSettings.template_hint()}"
-            )
-
-        blob_client = container_client.get_blob_client(blob_name)
-
-        if not blob_client.exists():
-            raise TemplateProcessingError(
-                f"Template blob '{blob_name}' not found in container '{container_name}'. {StorageSettings.template_hint()}"
-            )
-
-        data = blob_client.download_blob().readall()
-
-    except TemplateProcessingError:
-        raise
-    except (AzureError, ValueError) as exc:
-        raise TemplateProcessingError(
-            f"Failed to load template '{template_path}' from blob storage. {StorageSettings.template_hint()}"
-        ) from exc
-
-    return os.path.splitext(template_path)[1].lower(), data
-
-
-def _apply_placeholders_to_runs(
-    runs: Iterable[Any], placeholders: Dict[str, str], used: set[str]
-) -> None:
-    for run in runs:
-        for key, value in placeholders.items():
-            marker = f"[{key}]"
-            if marker in run.text:
-                run.text = run.text.replace(marker, value)
-                used.add(key)
-
-
-def _extract_placeholders(text: str) -> set[str]:
-    return set(PLACEHOLDER_PATTERN.findall(text or ""))
-
-
-def _collect_template_placeholders(document: Document) -> set[str]:
-    found: set[str] = set()
-
-    for paragraph in document.paragraphs:
-        found.update(_extract_placeholders(paragraph.text))
-
-    for table in document.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                found.update(_extract_placeholders(cell.text))
-
-    return found
-
-
-def _render_docx_template(template_bytes: bytes, context: Dict[str, str]) -> bytes:
-    document = Document(io.BytesIO(template_bytes))
-    used: set[str] = set()
-
-    template_placeholders = _collect_template_placeholders(document)
-    context_keys = set(context.keys())
-
-    missing = template_placeholders - context_keys
-    if missing:
-        raise TemplateProcessingError(
-            "Missing placeholders in context: " + ", ".join(sorted(missing))
+        job = await timer.measure(
+            "enqueue",
+            enqueue_job({"templatePath": storage_settings.template_path, "context": context}),
         )
+    except RuntimeError:
+        logging.exception("Failed to enqueue contract generation job")
+        return error_response("Failed to enqueue contract generation job.", 500)
 
-    unexpected = context_keys - template_placeholders
-    if unexpected:
-        raise TemplateProcessingError(
-            "Unexpected placeholders not in template: " + ", ".join(sorted(unexpected))
-        )
-
-    for p in document.paragraphs:
-        _apply_placeholders_to_runs(p.runs, context, used)
-
-    for table in document.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    _apply_placeholders_to_runs(p.runs, context, used)
-
-    missing = set(context.keys()) - used
-    if missing:
-        raise TemplateProcessingError(
-            "Unreplaced placeholders in template: " + ", ".join(sorted(missing))
-        )
+    status_url = f"{JOB_STATUS_ROUTE}/{job.job_id}"
+    return func.HttpResponse(
+        json.dumps({**job.to_dict(), "statusUrl": status_url}, ensure_ascii=False),
+        status_code=202,
+        mimetype="application/json",
+        headers={"Location": status_url},
+    )
 
-    out = io.BytesIO()
-    document.save(out)
-    return out.getvalue()
 
+def _validate_request(body: Any, timer: StageTimer) -> "GenerateContractRequest":
+    from .models import GenerateContractRequest
 
-def _render_html_template(html_bytes: bytes, context: Dict[str, str]) -> bytes:
-    html = html_bytes.decode("utf-8", errors="ignore")
+    with timer.stage("validate"):
+        return GenerateContractRequest(**body)
 
-    for key, value in context.items():
-        html = html.replace(f"[{key}]", value)
 
-    unresolved = re.findall(r"\[[A-Z0-9_]+\]", html)
-    if unresolved:
-        raise TemplateProcessingError(
-            "Unreplaced placeholders in template: " + ", ".join(sorted(set(unresolved)))
-        )
+def _build_template_context(
+    payload: "GenerateContractRequest", extension: str, template_bytes: bytes, timer: StageTimer
+) -> Dict[str, str]:
+    # The first request for a template compiles it here.
+    with timer.stage("compile"):
+        placeholders = template_placeholders(extension, template_bytes)
+    with timer.stage("context"):
+        return build_contract_context(payload.maskA, payload.maskB, placeholders)
 
-    text = re.sub(r"<[^>]+>", "", html)
 
-    document = Document()
-    for block in filter(None, (b.strip() for b in text.split("\n\n"))):
-        document.add_paragraph(block)
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    timer = StageTimer("generate_contract")
+    timer.size("request", request_body_size(req))
+    response = await _generate(req, timer)
+    return timer.finish(response)
 
-    out = io.BytesIO()
-    document.save(out)
-    return out.getvalue()
 
+async def _generate(req: func.HttpRequest, timer: StageTimer) -> func.HttpResponse:
+    from pydantic import ValidationError
 
-def _upload_contract(
-    contract_bytes: bytes, connection_string: str, container: str
-) -> Tuple[str, str]:
     try:
-        if not connection_string:
-            raise TemplateProcessingError(
-                f"Contract storage connection not configured. {StorageSettings.contract_hint()}"
+        with timer.stage("parse"):
+            body = req.get_json()
+    except ValueError:
+        return error_response("Invalid JSON body.", 400)
+
+    # Start the template download before validation so storage latency
+    # overlaps with validating the request.
+    template_override = body.get("templatePath") if isinstance(body, dict) else None
+    async_mode = _async_requested(req)
+    settings_error: Optional[TemplateProcessingError] = None
+    template_task: Optional["asyncio.Task[Tuple[str, bytes]]"] = None
+    try:
+        storage_settings = StorageSettings.from_env(
+            template_override if isinstance(template_override, str) else None
+        )
+    except TemplateProcessingError as exc:
+        settings_error = exc
+
+    # Async jobs need it too: their context is built for the template's placeholders.
+    if settings_error is None:
+        template_task = asyncio.create_task(
+            timer.measure(
+                "template",
+                load_template(
+                    storage_settings.template_path,
+                    storage_settings.template_connection,
+                    storage_settings.template_container,
+                ),
             )
-
-        service = BlobServiceClient.from_connection_string(connection_string)
-        container_client = service.get_container_client(container)
-
-        if not container_client.exists():
-            container_client.create_container()
-
-        blob_name = f"contract-{datetime.utcnow():%Y%m%d%H%M%S}-{uuid4()}.docx"
-        blob_client = container_client.get_blob_client(blob_name)
-
-        blob_client.upload_blob(
-            contract_bytes,
-            overwrite=True,
-            content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         )
+        # Let the download issue its first request before validation starts.
+        await asyncio.sleep(0)
 
-        return blob_name, blob_client.url
-
-    except TemplateProcessingError:
-        raise
-    except (AzureError, ValueError) as exc:
-        logging.exception("Blob upload failed")
-        raise TemplateProcessingError(
-            f"Failed to upload generated contract to container '{container}'. {StorageSettings.contract_hint()}"
-        ) from exc
-
-
-# ============================================================
-# Azure Function Entry Point
-# ============================================================
-
-
-async def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
-        body = req.get_json()
-    except ValueError:
-        return _error_response("Invalid JSON body.", 400)
-
+        try:
+            payload = await asyncio.to_thread(_validate_request, body, timer)
+        except ValidationError as exc:
+            return func.HttpResponse(exc.json(), status_code=400, mimetype="application/json")
+
+        if settings_error is not None:
+            return error_response(str(settings_error), 400)
+
+        # Load template
+        try:
+            extension, template_bytes = await template_task
+        except TemplateProcessingError as exc:
+            return error_response(str(exc), 400)
+        timer.size("template", len(template_bytes))
+    finally:
+        if template_task is not None:
+            _discard_task(template_task)
+
+    # Build only the placeholders this template uses
     try:
-        payload = GenerateContractRequest(**body)
-    except ValidationError as exc:
-        return func.HttpResponse(exc.json(), status_code=400, mimetype="application/json")
-
-    # Build contract context
-    try:
-        context = build_contract_context(payload.maskA, payload.maskB)
+        context = await asyncio.to_thread(
+            _build_template_context, payload, extension, template_bytes, timer
+        )
     except ContractContextError as exc:
-        return _error_response(str(exc), 400)
-
-    try:
-        storage_settings = StorageSettings.from_env(payload.templatePath)
-    except TemplateProcessingError as exc:
-        return _error_response(str(exc), 400)
-
-    # Load template
-    try:
-        extension, template_bytes = _load_template(
-            storage_settings.template_path,
-            storage_settings.template_connection,
-            storage_settings.template_container,
+        return error_response(str(exc), 400)
+    except (ArithmeticError, TypeError, ValueError) as exc:
+        return error_response(f"Invalid value: {exc}", 400)
+
+    if async_mode:
+        return await _enqueue_generation(storage_settings, context, timer)
+
+    # Reuse an identical, previously generated contract
+    blob_name: Optional[str] = None
+    if deduplication_enabled():
+        blob_name = contract_blob_name(
+            contract_fingerprint(extension, template_bytes, context)
         )
-    except TemplateProcessingError as exc:
-        return _error_response(str(exc), 400)
+        existing_url = await timer.measure(
+            "dedup",
+            find_existing_contract(
+                blob_name,
+                storage_settings.contracts_connection,
+                storage_settings.contracts_container,
+            ),
+        )
+        if existing_url:
+            return func.HttpResponse(
+                json.dumps({"downloadUrl": existing_url, "deduplicated": True}, ensure_ascii=False),
+                status_code=200,
+                mimetype="application/json",
+            )
 
     # Render contract
     try:
-        if extension == ".docx":
-            contract_bytes = _render_docx_template(template_bytes, context)
-        else:
-            contract_bytes = _render_html_template(template_bytes, context)
-    except TemplateProcessingError as exc:
-        return _error_response(str(exc), 400)
-
-    # Upload
-    try:
-        _, download_url = _upload_contract(
-            contract_bytes,
-            storage_settings.contracts_connection,
-            storage_settings.contracts_container,
-        )
+        with timer.stage("render"):
+            contract = await RENDER_EXECUTOR.render(
+                extension, template_bytes, context, timer=timer
+            )
+    except RenderQueueFull as exc:
+        return busy_response(exc)
     except TemplateProcessingError as exc:
-        return _error_response(str(exc), 500)
+        return error_response(str(exc), 400)
+
+    # Upload straight from the render buffer
+    with contract:
+        timer.size("contract", buffer_size(contract))
+        try:
+            with timer.stage("upload"):
+                _, download_url = await upload_contract(
+                    contract,
+                    storage_settings.contracts_connection,
+                    storage_settings.contracts_container,
+                    blob_name=blob_name,
+                )
+        except TemplateProcessingError as exc:
+            return error_response(str(exc), 500)
 
     return func.HttpResponse(
         json.dumps({"downloadUrl": download_url}, ensure_ascii=False),
         status_code=200,
         mimetype="application/json",
     )
-
@@ -0,0 +1,12 @@
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+
+class GenerateContractRequest(BaseModel):
+    maskA: Dict[str, Any]
+    maskB: Dict[str, Any]
+    templatePath: Optional[str] = None
+
+    class Config:
+        extra = "forbid"
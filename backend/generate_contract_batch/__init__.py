@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import azure.functions as func
+
+from domain.contract_context import build_contract_context, ContractContextError
+from shared_code.contracts import (
+    contract_blob_name,
+    contract_fingerprint,
+    deduplication_enabled,
+    find_existing_contract,
+    upload_contract,
+)
+from shared_code.render_executor import RENDER_EXECUTOR, RenderQueueFull
+from shared_code.rendering import compile_docx_template, template_placeholders
+from shared_code.responses import error_response
+from shared_code.settings import env_number
+from shared_code.templates import StorageSettings, TemplateProcessingError, load_template
+
+
+# ============================================================
+# Helpers
+# ============================================================
+
+
+def _max_batch_items() -> int:
+    return int(env_number("BatchMaxItems", 100))
+
+
+def _batch_concurrency() -> int:
+    # Items of one batch in flight at once; each render still passes the
+    # shared executor's admission limit.
+    return max(1, int(env_number("BatchRenderWorkers", RENDER_EXECUTOR.workers)))
+
+
+def _item_context(
+    index: int, item: Any, extension: str, template_bytes: bytes
+) -> Tuple[Optional[Dict[str, str]], Optional[Dict[str, Any]]]:
+    """Return ``(context, None)`` for a valid item or ``(None, error_result)``."""
+    from pydantic import ValidationError
+
+    from .models import BatchItem
+
+    try:
+        parsed = BatchItem.model_validate(item)
+    except ValidationError as exc:
+        return None, {"index": index, "status": 400, "errors": json.loads(exc.json())}
+
+    try:
+        context = build_contract_context(
+            parsed.maskA, parsed.maskB, template_placeholders(extension, template_bytes)
+        )
+    except ContractContextError as exc:
+        return None, {"index": index, "status": 400, "message": str(exc)}
+    except (ArithmeticError, TypeError, ValueError) as exc:
+        # Malformed mask values, e.g. a non-numeric wohnflaeche; fail only this item.
+        return None, {"index": index, "status": 400, "message": f"Invalid value: {exc}"}
+    return context, None
+
+
+async def _generate_item(
+    index: int,
+    item: Any,
+    extension: str,
+    template_bytes: bytes,
+    storage_settings: StorageSettings,
+    limit: asyncio.Semaphore,
+) -> Dict[str, Any]:
+    async with limit:
+        context, error = await asyncio.to_thread(
+            _item_context, index, item, extension, template_bytes
+        )
+        if error is not None:
+            return error
+
+        # Reuse an identical, previously generated contract before rendering
+        blob_name = None
+        if deduplication_enabled():
+            blob_name = contract_blob_name(contract_fingerprint(extension, template_bytes, context))
+            existing_url = await find_existing_contract(
+                blob_name,
+                storage_settings.contracts_connection,
+                storage_settings.contracts_container,
+            )
+            if existing_url:
+                return {"index": index, "status": 200, "downloadUrl": existing_url, "deduplicated": True}
+
+        try:
+            contract = await RENDER_EXECUTOR.render(extension, template_bytes, context)
+        except RenderQueueFull as exc:
+            return {"index": index, "status": 503, "message": str(exc), "retryAfter": exc.retry_after}
+        except TemplateProcessingError as exc:
+            return {"index": index, "status": 400, "message": str(exc)}
+
+        try:
+            with contract:
+                _, download_url = await upload_contract(
+                    contract,
+                    storage_settings.contracts_connection,
+                    storage_settings.contracts_container,
+                    blob_name=blob_name,
+                )
+        except TemplateProcessingError as exc:
+            return {"index": index, "status": 500, "message": str(exc)}
+
+    return {"index": index, "status": 200, "downloadUrl": download_url}
+
+
+# ============================================================
+# Azure Function Entry Point
+# ============================================================
+
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    from pydantic import ValidationError
+
+    from .models import GenerateContractBatchRequest
+
+    try:
+        body = req.get_json()
+    except ValueError:
+        return error_response("Invalid JSON body.", 400)
+
+    try:
+        payload = GenerateContractBatchRequest.model_validate(body)
+    except ValidationError as exc:
+        return func.HttpResponse(exc.json(), status_code=400, mimetype="application/json")
+
+    if not payload.items:
+        return error_response("Batch must contain at least one item.", 400)
+
+    limit = _max_batch_items()
+    if len(payload.items) > limit:
+        return error_response(f"Batch exceeds the maximum of {limit} items.", 400)
+
+    try:
+        storage_settings = StorageSettings.from_env(payload.templatePath)
+    except TemplateProcessingError as exc:
+        return error_response(str(exc), 400)
+
+    # Load (and compile) the template once for the whole batch
+    try:
+        extension, template_bytes = await load_template(
+            storage_settings.template_path,
+            storage_settings.template_connection,
+            storage_settings.template_container,
+        )
+        if extension == ".docx":
+            await asyncio.to_thread(compile_docx_template, template_bytes)
+    except TemplateProcessingError as exc:
+        return error_response(str(exc), 400)
+
+    # Renders go through the shared executor, so concurrent batches and single
+    # requests share one admission limit.
+    in_flight = asyncio.Semaphore(_batch_concurrency())
+    results = await asyncio.gather(
+        *(
+            _generate_item(index, item, extension, template_bytes, storage_settings, in_flight)
+            for index, item in enumerate(payload.items)
+        )
+    )
+
+    failed = sum(1 for result in results if result["status"] != 200)
+    if failed:
+        logging.warning("Batch generation finished with %d of %d items failing", failed, len(results))
+
+    retry_after = max((result.get("retryAfter", 0) for result in results), default=0)
+    return func.HttpResponse(
+        json.dumps(
+            {"succeeded": len(results) - failed, "failed": failed, "results": results},
+            ensure_ascii=False,
+        ),
+        status_code=200,
+        mimetype="application/json",
+        headers={"Retry-After": str(retry_after)} if retry_after else None,
+    )
@@ -0,0 +1,17 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class BatchItem(BaseModel):
+    maskA: Dict[str, Any]
+    maskB: Dict[str, Any]
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class GenerateContractBatchRequest(BaseModel):
+    items: List[Any]
+    templatePath: Optional[str] = None
+
+    model_config = ConfigDict(extra="forbid")
@@ -0,0 +1,99 @@
+import json
+import logging
+from typing import Any, Dict
+
+import azure.functions as func
+
+from shared_code.contracts import (
+    contract_blob_name,
+    contract_fingerprint,
+    deduplication_enabled,
+    find_existing_contract,
+    upload_contract,
+)
+from shared_code.jobs import mark_failed, mark_running, mark_succeeded
+from shared_code.render_executor import RENDER_EXECUTOR
+from shared_code.settings import env_number
+from shared_code.templates import (
+    StorageSettings,
+    TemplateProcessingError,
+    TemplateStorageError,
+    load_template,
+)
+
+
+def _max_attempts() -> int:
+    # Matches the queue trigger's default maxDequeueCount before a message is poisoned.
+    return int(env_number("JobMaxAttempts", 5))
+
+
+async def process_job(message: Dict[str, Any], attempt: int = 1) -> None:
+    """Render and upload one queued contract, recording the outcome on the job.
+
+    Template and rendering errors fail the job at once. Any other failure, such
+    as a storage error or a full render queue, is raised so the queue redelivers
+    the message. On the last attempt the job is marked failed first, so it never
+    stays ``running`` once the message is poisoned.
+    """
+    job_id = message["jobId"]
+    await mark_running(job_id)
+
+    try:
+        await _render_and_upload(job_id, message)
+    except TemplateProcessingError as exc:
+        # Storage failures; nothing is left to retry after the last attempt.
+        if attempt < _max_attempts():
+            raise
+        await mark_failed(job_id, str(exc))
+    except Exception as exc:
+        if attempt >= _max_attempts():
+            await mark_failed(job_id, str(exc) or type(exc).__name__)
+        raise
+
+
+async def _render_and_upload(job_id: str, message: Dict[str, Any]) -> None:
+    try:
+        storage_settings = StorageSettings.from_env(message["templatePath"])
+        extension, template_bytes = await load_template(
+            storage_settings.template_path,
+            storage_settings.template_connection,
+            storage_settings.template_container,
+        )
+        context = message["context"]
+
+        blob_name = None
+        if deduplication_enabled():
+            blob_name = contract_blob_name(
+                contract_fingerprint(extension, template_bytes, context)
+            )
+            existing_url = await find_existing_contract(
+                blob_name,
+                storage_settings.contracts_connection,
+                storage_settings.contracts_container,
+            )
+            if existing_url:
+                await mark_succeeded(job_id, existing_url)
+                return
+
+        contract = await RENDER_EXECUTOR.render(extension, template_bytes, context)
+    except TemplateStorageError:
+        raise
+    except TemplateProcessingError as exc:
+        await mark_failed(job_id, str(exc))
+        return
+
+    with contract:
+        _, download_url = await upload_contract(
+            contract,
+            storage_settings.contracts_connection,
+            storage_settings.contracts_container,
+            blob_name=blob_name,
+        )
+
+    await mark_succeeded(job_id, download_url)
+
+
+async def main(msg: func.QueueMessage) -> None:
+    message = json.loads(msg.get_body().decode("utf-8"))
+    logging.info("Processing contract job %s (attempt %s)", message.get("jobId"), msg.dequeue_count)
+    await process_job(message, attempt=msg.dequeue_count or 1)
@@ -0,0 +1,114 @@
+import html
+import json
+from typing import List
+
+import azure.functions as func
+
+from domain.contract_context import build_contract_context, ContractContextError
+from shared_code.rendering import PreviewSection, preview_sections, template_placeholders
+from shared_code.responses import error_response
+from shared_code.templates import StorageSettings, TemplateProcessingError, load_template
+from shared_code.timing import StageTimer, request_body_size
+
+
+# ============================================================
+# HTML Rendering
+# ============================================================
+
+
+def _section_html(section: PreviewSection) -> str:
+    if section.kind == "table":
+        rows = "".join(
+            "<tr>" + "".join(f"<td>{_text_html(cell)}</td>" for cell in row) + "</tr>"
+            for row in section.rows
+        )
+        return f"<table>{rows}</table>"
+    if section.kind == "heading":
+        return f"<h{section.level}>{_text_html(section.text)}</h{section.level}>"
+    return f"<p>{_text_html(section.text)}</p>"
+
+
+def _text_html(text: str) -> str:
+    return html.escape(text).replace("\n", "<br>")
+
+
+def _preview_html(sections: List[PreviewSection]) -> str:
+    return "\n".join(_section_html(section) for section in sections)
+
+
+# ============================================================
+# Azure Function Entry Point
+# ============================================================
+
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    timer = StageTimer("preview_contract")
+    timer.size("request", request_body_size(req))
+    response = await _preview(req, timer)
+    return timer.finish(response)
+
+
+async def _preview(req: func.HttpRequest, timer: StageTimer) -> func.HttpResponse:
+    """Resolve the contract text for a live preview.
+
+    Shares context building and template loading with ``generate_contract`` but
+    never builds a DOCX package or writes to storage; the template comes from
+    the process-wide template cache after the first request.
+    """
+    from pydantic import ValidationError
+
+    from .models import PreviewContractRequest
+
+    try:
+        with timer.stage("parse"):
+            body = req.get_json()
+    except ValueError:
+        return error_response("Invalid JSON body.", 400)
+
+    try:
+        with timer.stage("validate"):
+            payload = PreviewContractRequest.model_validate(body)
+    except ValidationError as exc:
+        return func.HttpResponse(exc.json(), status_code=400, mimetype="application/json")
+
+    try:
+        storage_settings = StorageSettings.from_env(payload.templatePath)
+        extension, template_bytes = await timer.measure(
+            "template",
+            load_template(
+                storage_settings.template_path,
+                storage_settings.template_connection,
+                storage_settings.template_container,
+            ),
+        )
+        with timer.stage("compile"):
+            placeholders = template_placeholders(extension, template_bytes)
+    except TemplateProcessingError as exc:
+        return error_response(str(exc), 400)
+
+    try:
+        with timer.stage("context"):
+            context = build_contract_context(payload.maskA, payload.maskB, placeholders)
+    except ContractContextError as exc:
+        return error_response(str(exc), 400)
+    except (ArithmeticError, TypeError, ValueError) as exc:
+        return error_response(f"Invalid value: {exc}", 400)
+
+    try:
+        with timer.stage("preview"):
+            sections = preview_sections(extension, template_bytes, context)
+    except TemplateProcessingError as exc:
+        return error_response(str(exc), 400)
+
+    headers = {"Cache-Control": "no-store"}
+    if payload.format == "html":
+        return func.HttpResponse(
+            _preview_html(sections), status_code=200, mimetype="text/html", headers=headers
+        )
+
+    return func.HttpResponse(
+        json.dumps({"sections": [section.to_dict() for section in sections]}, ensure_ascii=False),
+        status_code=200,
+        mimetype="application/json",
+        headers=headers,
+    )
@@ -0,0 +1,12 @@
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class PreviewContractRequest(BaseModel):
+    maskA: Dict[str, Any]
+    maskB: Dict[str, Any]
+    templatePath: Optional[str] = None
+    format: Literal["html", "json"] = "html"
+
+    model_config = ConfigDict(extra="forbid")
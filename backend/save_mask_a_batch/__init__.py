@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+import azure.functions as func
+
+from shared_code.mask_a import (
+    MASK_A_TABLE,
+    build_entity,
+    collect_caller_metadata,
+    get_mask_a_store,
+    merge_legacy_fields,
+)
+from shared_code.responses import error_response
+from shared_code.settings import env_number
+from shared_code.storage import MAX_TRANSACTION_ENTITIES, StorageError, TableStore
+from shared_code.timing import StageTimer, request_body_size
+
+
+# ============================================================
+# Helpers
+# ============================================================
+
+
+def _max_batch_items() -> int:
+    return int(env_number("MaskABatchMaxItems", 500))
+
+
+def _validate_item(index: int, item: Any, caller_metadata: Dict[str, str]) -> Dict[str, Any]:
+    """Return ``{"index", "entity"}`` for a valid item or its per-item error result."""
+    from pydantic import ValidationError
+
+    from save_mask_a.models import MaskAClientPayload
+
+    if not isinstance(item, dict):
+        return {"index": index, "status": 400, "message": "Item must be a JSON object."}
+    try:
+        payload = MaskAClientPayload(**merge_legacy_fields(item))
+    except ValidationError as exc:
+        return {"index": index, "status": 400, "errors": json.loads(exc.json())}
+
+    entity, _ = build_entity(payload.model_dump(exclude_none=True), caller_metadata)
+    return {"index": index, "entity": entity}
+
+
+def _validate_items(items: List[Any], caller_metadata: Dict[str, str]) -> List[Dict[str, Any]]:
+    return [_validate_item(index, item, caller_metadata) for index, item in enumerate(items)]
+
+
+def _transactions(entities: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group entities by partition and split each group into transaction-sized chunks."""
+    partitions: Dict[str, List[Dict[str, Any]]] = {}
+    for entity in entities:
+        partitions.setdefault(entity["PartitionKey"], []).append(entity)
+    return [
+        group[start:start + MAX_TRANSACTION_ENTITIES]
+        for group in partitions.values()
+        for start in range(0, len(group), MAX_TRANSACTION_ENTITIES)
+    ]
+
+
+async def _submit(table_store: TableStore, chunk: List[Dict[str, Any]]) -> bool:
+    try:
+        await table_store.create_entities(MASK_A_TABLE, chunk)
+    except StorageError as exc:
+        logging.exception("Failed to store %d Mask A payloads: %s", len(chunk), exc)
+        return False
+    return True
+
+
+# ============================================================
+# Azure Function Entry Point
+# ============================================================
+
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    timer = StageTimer("save_mask_a_batch")
+    timer.size("request", request_body_size(req))
+    response, items, transactions = await _save_batch(req, timer)
+    return timer.finish(response, items=items, transactions=transactions)
+
+
+async def _save_batch(
+    req: func.HttpRequest, timer: StageTimer
+) -> Tuple[func.HttpResponse, int, int]:
+    try:
+        with timer.stage("parse"):
+            body = req.get_json()
+    except ValueError:
+        return error_response("Invalid JSON body.", 400), 0, 0
+
+    if not isinstance(body, dict) or not isinstance(body.get("items"), list):
+        return error_response("Request body must be a JSON object with an 'items' list.", 400), 0, 0
+
+    items = body["items"]
+    if not items:
+        return error_response("Batch must contain at least one item.", 400), 0, 0
+
+    limit = _max_batch_items()
+    if len(items) > limit:
+        return error_response(f"Batch exceeds the maximum of {limit} items.", 400), len(items), 0
+
+    # Validating hundreds of items is CPU-bound, so it runs off the event loop.
+    with timer.stage("validate"):
+        results = await asyncio.to_thread(_validate_items, items, collect_caller_metadata(req))
+
+    valid = [result for result in results if "entity" in result]
+    chunks = _transactions([result["entity"] for result in valid])
+    stored_rows = set()
+    if chunks:
+        try:
+            with timer.stage("table_setup"):
+                table_store = get_mask_a_store()
+            async with table_store:
+                with timer.stage("table_setup"):
+                    await table_store.create_table_if_not_exists(MASK_A_TABLE)
+                # Transactions are per partition, so the chunks commit independently.
+                with timer.stage("create_entities"):
+                    outcomes = await asyncio.gather(*(_submit(table_store, chunk) for chunk in chunks))
+            stored_rows = {
+                entity["RowKey"] for chunk, ok in zip(chunks, outcomes) if ok for entity in chunk
+            }
+        except (StorageError, RuntimeError) as exc:
+            logging.exception("Failed to store Mask A batch: %s", exc)
+
+    for result in valid:
+        entity = result.pop("entity")
+        if entity["RowKey"] in stored_rows:
+            result.update(status=201, partitionKey=entity["PartitionKey"], rowKey=entity["RowKey"])
+        else:
+            result.update(status=500, message="Failed to persist payload.")
+
+    failed = sum(1 for result in results if result["status"] != 201)
+    if failed:
+        logging.warning("Mask A batch finished with %d of %d items failing", failed, len(results))
+
+    response = func.HttpResponse(
+        json.dumps(
+            {"stored": len(results) - failed, "failed": failed, "results": results},
+            ensure_ascii=False,
+        ),
+        status_code=200,
+        mimetype="application/json",
+    )
+    return response, len(items), len(chunks)
@@ -0,0 +1,109 @@
+"""Uploading generated contracts and finding identical ones already stored."""
+import functools
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from typing import IO, Dict, Optional, Tuple, Union
+from uuid import uuid4
+
+from shared_code.rendering import DOCX_CONTENT_TYPE, docx_render_mode
+from shared_code.settings import clean, env_number
+from shared_code.storage import BlobExistsError, StorageError, get_blob_store
+from shared_code.templates import StorageSettings, TemplateProcessingError, TemplateStorageError
+
+
+# ============================================================
+# Contract Upload
+# ============================================================
+
+
+async def upload_contract(
+    contract: Union[bytes, IO[bytes]],
+    connection_string: str,
+    container: str,
+    blob_name: Optional[str] = None,
+) -> Tuple[str, str]:
+    try:
+        if not connection_string:
+            raise TemplateProcessingError(
+                f"Contract storage connection not configured. {StorageSettings.contract_hint()}"
+            )
+
+        store = get_blob_store(connection_string)
+
+        # Content-addressed names are never overwritten: an existing blob
+        # already holds identical bytes.
+        content_addressed = blob_name is not None
+        if blob_name is None:
+            blob_name = f"contract-{datetime.utcnow():%Y%m%d%H%M%S}-{uuid4()}.docx"
+
+        try:
+            url = await store.upload(
+                container,
+                blob_name,
+                contract,
+                overwrite=not content_addressed,
+                content_type=DOCX_CONTENT_TYPE,
+            )
+        except BlobExistsError:
+            if not content_addressed:
+                raise
+            url = store.url(container, blob_name)
+
+        return blob_name, url
+
+    except TemplateProcessingError:
+        raise
+    except (StorageError, ValueError) as exc:
+        logging.exception("Blob upload failed")
+        raise TemplateStorageError(
+            f"Failed to upload generated contract to container '{container}'. {StorageSettings.contract_hint()}"
+        ) from exc
+
+
+# ============================================================
+# Contract Deduplication
+# ============================================================
+
+
+# Bump when rendering changes so old blobs are no longer matched.
+_FINGERPRINT_VERSION = "1"
+
+
+def deduplication_enabled() -> bool:
+    flag = (clean(os.getenv("ContractDeduplication")) or "true").lower()
+    return flag not in ("false", "0", "no", "off")
+
+
+@functools.lru_cache(maxsize=int(env_number("TemplateCacheMaxEntries", 8)))
+def _template_digest(template_bytes: bytes) -> str:
+    return hashlib.sha256(template_bytes).hexdigest()
+
+
+def contract_fingerprint(extension: str, template_bytes: bytes, context: Dict[str, str]) -> str:
+    mode = docx_render_mode() if extension == ".docx" else "html"
+    digest = hashlib.sha256(
+        f"v{_FINGERPRINT_VERSION}|{extension}|{mode}|{_template_digest(template_bytes)}|".encode()
+    )
+    digest.update(
+        json.dumps(context, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
+def contract_blob_name(fingerprint: str) -> str:
+    return f"contract-{fingerprint}.docx"
+
+
+async def find_existing_contract(
+    blob_name: str, connection_string: str, container: str
+) -> Optional[str]:
+    try:
+        store = get_blob_store(connection_string)
+        if await store.exists(container, blob_name):
+            return store.url(container, blob_name)
+    except (StorageError, ValueError):
+        logging.warning("Could not check for existing contract '%s'", blob_name, exc_info=True)
+    return None
@@ -0,0 +1,108 @@
+"""Asynchronous contract generation jobs.
+
+``generate_contract`` in async mode records a job and enqueues it on
+``JOBS_QUEUE``; ``generate_contract_worker`` renders and uploads it and
+``contract_job_status`` reports its state. Jobs live in the ``JOBS_TABLE``
+table, one entity per job, in the storage account named by ``JobsConnection``,
+which is also the connection of the worker's queue trigger.
+"""
+import json
+import os
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from shared_code.storage import get_queue_store, get_table_store, storage_backend
+
+JOBS_QUEUE = "contract-jobs"
+JOBS_TABLE = "ContractJobs"
+JOB_ROW_KEY = "job"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+@dataclass
+class ContractJob:
+    job_id: str
+    status: str
+    created_at: str
+    updated_at: str
+    download_url: Optional[str] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_entity(cls, entity: Dict[str, Any]) -> "ContractJob":
+        return cls(
+            job_id=entity["PartitionKey"],
+            status=entity["status"],
+            created_at=entity["created_at"],
+            updated_at=entity["updated_at"],
+            download_url=entity.get("download_url") or None,
+            error=entity.get("error") or None,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "jobId": self.job_id,
+            "status": self.status,
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+        }
+        if self.download_url:
+            body["downloadUrl"] = self.download_url
+        if self.error:
+            body["message"] = self.error
+        return body
+
+
+def jobs_connection() -> str:
+    connection_string = (os.getenv("JobsConnection") or "").strip()
+    if not connection_string and storage_backend() == "azure":
+        raise RuntimeError("JobsConnection connection string is not configured.")
+    return connection_string
+
+
+def _now() -> str:
+    return datetime.now(UTC).isoformat()
+
+
+async def _write(job_id: str, **fields: Any) -> None:
+    async with get_table_store(jobs_connection()) as store:
+        await store.create_table_if_not_exists(JOBS_TABLE)
+        await store.upsert_entity(
+            JOBS_TABLE,
+            {"PartitionKey": job_id, "RowKey": JOB_ROW_KEY, "updated_at": _now(), **fields},
+        )
+
+
+async def enqueue_job(payload: Dict[str, Any]) -> ContractJob:
+    """Record a queued job and send ``payload`` (plus its ``jobId``) to the worker queue."""
+    job_id = str(uuid4())
+    now = _now()
+    await _write(job_id, status=QUEUED, created_at=now)
+    await get_queue_store(jobs_connection()).send(
+        JOBS_QUEUE, json.dumps({**payload, "jobId": job_id}, ensure_ascii=False)
+    )
+    return ContractJob(job_id, QUEUED, now, now)
+
+
+async def mark_running(job_id: str) -> None:
+    await _write(job_id, status=RUNNING)
+
+
+async def mark_succeeded(job_id: str, download_url: str) -> None:
+    await _write(job_id, status=SUCCEEDED, download_url=download_url, error="")
+
+
+async def mark_failed(job_id: str, error: str) -> None:
+    await _write(job_id, status=FAILED, error=error)
+
+
+async def get_job(job_id: str) -> Optional[ContractJob]:
+    async with get_table_store(jobs_connection()) as store:
+        entity = await store.get_entity(JOBS_TABLE, job_id, JOB_ROW_KEY)
+    return ContractJob.from_entity(entity) if entity else None
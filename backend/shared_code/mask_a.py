@@ -0,0 +1,275 @@
+"""Stored Mask A submissions.
+
+``save_mask_a`` and ``save_mask_a_batch`` write one entity per submission to
+``MASK_A_TABLE``. The validated payload is kept in the ``payload`` column in
+one of two formats, recorded in ``payload_format``:
+
+* ``1`` (rows without ``payload_format``): the enriched payload as a JSON
+  string, including timestamps and caller metadata.
+* ``2``: compact JSON compressed with zlib, stored as binary. Timestamps and
+  caller metadata are left out because they already have their own columns.
+  A payload over ``PAYLOAD_CHUNK_BYTES`` continues in ``payload_1``,
+  ``payload_2``, … and ``payload_chunks`` holds the number of parts.
+
+:func:`decode_payload` reads both formats and returns the enriched payload.
+
+Rows are partitioned by UTC submission date. With ``MaskAPartitionBuckets``
+above 1 (at most ``MAX_PARTITION_BUCKETS``) the key becomes ``<date>_<bucket>``,
+the bucket being a two-digit hash of the row key, so a busy day's writes spread
+over that many partitions.
+:func:`list_mask_a` reads a day back from the date-only partition and every
+bucket in parallel.
+"""
+import asyncio
+import json
+import logging
+import os
+import zlib
+from datetime import UTC, date, datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
+
+import azure.functions as func
+
+from shared_code.settings import clean, env_number
+from shared_code.storage import TableStore, get_table_store, storage_backend
+
+MASK_A_TABLE = "MaskAInput"
+
+PAYLOAD_FORMAT_JSON = 1
+PAYLOAD_FORMAT_COMPRESSED = 2
+PAYLOAD_FORMATS = (PAYLOAD_FORMAT_JSON, PAYLOAD_FORMAT_COMPRESSED)
+# Table Storage limits a binary property to 64 KiB.
+PAYLOAD_CHUNK_BYTES = 64 * 1024
+# Bucket suffixes are always two digits, so the key of a bucket never depends on
+# the configured count and raising it keeps every existing partition readable.
+MAX_PARTITION_BUCKETS = 100
+
+# Kept in their own columns, so the compressed payload leaves them out.
+_COLUMN_FIELDS = ("created_at", "updated_at", "caller_metadata")
+_CALLER_METADATA_COLUMNS = ("source_ip", "user_agent")
+
+
+def payload_format() -> int:
+    """Format for new rows, from ``MaskAPayloadFormat`` (default ``2``)."""
+    raw = clean(os.getenv("MaskAPayloadFormat")) or ""
+    if raw in ("1", "2"):
+        return int(raw)
+    if raw:
+        logging.warning("Ignoring unsupported MaskAPayloadFormat=%r", raw)
+    return PAYLOAD_FORMAT_COMPRESSED
+
+
+def partition_buckets() -> int:
+    """Number of partitions per day, from ``MaskAPartitionBuckets`` (default ``1``: date only)."""
+    buckets = max(1, int(env_number("MaskAPartitionBuckets", 1)))
+    if buckets > MAX_PARTITION_BUCKETS:
+        logging.warning(
+            "Capping MaskAPartitionBuckets=%d at %d", buckets, MAX_PARTITION_BUCKETS
+        )
+        return MAX_PARTITION_BUCKETS
+    return buckets
+
+
+def _bucket_count(buckets: Optional[int]) -> int:
+    if buckets is None:
+        return partition_buckets()
+    if buckets > MAX_PARTITION_BUCKETS:
+        raise ValueError(f"At most {MAX_PARTITION_BUCKETS} partition buckets are supported.")
+    return buckets
+
+
+def _bucket_key(day: str, bucket: int) -> str:
+    return f"{day}_{bucket:02d}"
+
+
+def partition_key(row_key: str, day: Optional[date] = None, buckets: Optional[int] = None) -> str:
+    """Partition for a new row: the UTC date, plus a row-key hash bucket when sharded."""
+    day_text = (day or datetime.now(UTC).date()).isoformat()
+    buckets = _bucket_count(buckets)
+    if buckets <= 1:
+        return day_text
+    # crc32 is stable across processes, unlike hash().
+    return _bucket_key(day_text, zlib.crc32(row_key.encode("utf-8")) % buckets)
+
+
+def day_partitions(day: Union[date, str], buckets: Optional[int] = None) -> List[str]:
+    """Every partition that may hold rows for ``day``, date-only rows first."""
+    day_text = day if isinstance(day, str) else day.isoformat()
+    buckets = _bucket_count(buckets)
+    if buckets <= 1:
+        return [day_text]
+    return [day_text] + [_bucket_key(day_text, bucket) for bucket in range(buckets)]
+
+
+def _chunk_property(index: int) -> str:
+    return "payload" if index == 0 else f"payload_{index}"
+
+
+def encode_payload(enriched_payload: Dict[str, Any], fmt: Optional[int] = None) -> Dict[str, Any]:
+    """Return the entity properties that store ``enriched_payload`` in format ``fmt``."""
+    fmt = payload_format() if fmt is None else fmt
+    if fmt == PAYLOAD_FORMAT_JSON:
+        return {"payload": json.dumps(enriched_payload, ensure_ascii=False)}
+
+    stored = {key: value for key, value in enriched_payload.items() if key not in _COLUMN_FIELDS}
+    data = zlib.compress(
+        json.dumps(stored, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    )
+    chunks = [data[start:start + PAYLOAD_CHUNK_BYTES] for start in range(0, len(data), PAYLOAD_CHUNK_BYTES)]
+    properties: Dict[str, Any] = {"payload_format": PAYLOAD_FORMAT_COMPRESSED}
+    properties.update((_chunk_property(index), chunk) for index, chunk in enumerate(chunks))
+    if len(chunks) > 1:
+        properties["payload_chunks"] = len(chunks)
+    return properties
+
+
+def decode_payload(entity: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the enriched payload stored in ``entity``, whatever its format."""
+    fmt = entity.get("payload_format") or PAYLOAD_FORMAT_JSON
+    if fmt == PAYLOAD_FORMAT_JSON:
+        return json.loads(entity["payload"])
+    if fmt != PAYLOAD_FORMAT_COMPRESSED:
+        raise ValueError(f"Unsupported Mask A payload format {fmt!r}.")
+
+    data = b"".join(entity[_chunk_property(index)] for index in range(entity.get("payload_chunks") or 1))
+    payload = json.loads(zlib.decompress(data))
+    caller_metadata = {
+        column: entity[column] for column in _CALLER_METADATA_COLUMNS if entity.get(column)
+    }
+    return {
+        **payload,
+        "created_at": entity.get("created_at"),
+        "updated_at": entity.get("updated_at"),
+        "caller_metadata": caller_metadata or None,
+    }
+
+
+def stored_payload_size(entity: Dict[str, Any]) -> int:
+    """Bytes the payload columns of ``entity`` take up."""
+    size = 0
+    for index in range(entity.get("payload_chunks") or 1):
+        value = entity[_chunk_property(index)]
+        size += len(value.encode("utf-8") if isinstance(value, str) else value)
+    return size
+
+
+def merge_legacy_fields(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy legacy camelCase fields of a submission to their canonical names."""
+    legacy_to_canonical = {
+        "ustId": "ust_id",
+        "gegenparteiBekannt": "gegenpartei_bekannt",
+        "gegenpartei": "gegenpartei_bekannt",
+        "gegenparteiName": "gegenpartei_name",
+        "gegenparteiAnschrift": "gegenpartei_anschrift",
+        "gegenparteiEmail": "gegenpartei_email",
+        "gegenparteiTelefon": "gegenpartei_telefon",
+        "stellplatzNummer": "stellplatz_nr",
+        "mitvermieteteAusstattung": "ausstattung",
+        "miteigentumsanteile": "mea",
+        "grundrissDatei": "grundriss_datei",
+        "wegDokument": "weg_dokument",
+        "zuschlagMoebliert": "zuschlag_moeblierung",
+        "zuschlagGewerbe": "zuschlag_teilgewerbe",
+        "zuschlagUntervermietung": "zuschlag_unterverm",
+        "zahlerIban": "zahler_iban",
+        "abrechnungszeitraum": "abrz",
+        "bkweg": "bk_weg",
+        "haustiere": "tiere",
+        "kautionZahlweise": "kaution_zahlweise",
+        "vollmacht": "vollmacht_vorhanden",
+    }
+
+    merged = dict(payload)
+    for legacy_key, canonical_key in legacy_to_canonical.items():
+        if canonical_key not in merged and legacy_key in merged:
+            merged[canonical_key] = merged[legacy_key]
+
+    if "gegenpartei" in merged:
+        merged.pop("gegenpartei", None)
+
+    return merged
+
+
+def collect_caller_metadata(req: func.HttpRequest) -> Dict[str, str]:
+    """The caller's IP and user agent from the request headers, where present."""
+    caller_metadata = {
+        "source_ip": req.headers.get("x-forwarded-for")
+        or req.headers.get("x-client-ip")
+        or req.headers.get("x-real-ip"),
+        "user_agent": req.headers.get("user-agent"),
+    }
+
+    return {key: value for key, value in caller_metadata.items() if value}
+
+
+def get_mask_a_store() -> TableStore:
+    """The table store for the ``MaskAInput`` connection."""
+    connection_string = os.getenv("MaskAInput") or ""
+    if not connection_string and storage_backend() == "azure":
+        raise RuntimeError("MaskAInput connection string is not configured.")
+
+    return get_table_store(connection_string)
+
+
+def build_entity(
+    sanitized_payload: Dict[str, Any], caller_metadata: Dict[str, str]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Return the table entity for a validated payload and the enriched payload it stores."""
+    now = datetime.now(UTC).isoformat()
+
+    enriched_payload = {
+        **sanitized_payload,
+        "created_at": now,
+        "updated_at": now,
+        "caller_metadata": caller_metadata or None,
+    }
+
+    row_key = str(uuid4())
+    entity = {
+        "PartitionKey": partition_key(row_key),
+        "RowKey": row_key,
+        **encode_payload(enriched_payload),
+        "created_at": now,
+        "updated_at": now,
+    }
+    if caller_metadata.get("source_ip"):
+        entity["source_ip"] = caller_metadata["source_ip"]
+    if caller_metadata.get("user_agent"):
+        entity["user_agent"] = caller_metadata["user_agent"]
+
+    return entity, enriched_payload
+
+
+async def get_mask_a(
+    store: TableStore, partition_key: str, row_key: str
+) -> Optional[Dict[str, Any]]:
+    """Return the decoded payload of one stored submission, or ``None``."""
+    entity = await store.get_entity(MASK_A_TABLE, partition_key, row_key)
+    return decode_payload(entity) if entity else None
+
+
+async def list_mask_a(
+    store: TableStore, day: Union[date, str], buckets: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Return every submission for ``day`` as ``{"partitionKey", "rowKey", "payload"}``, oldest first.
+
+    The partitions are queried concurrently. Pass the largest bucket count
+    ever configured as ``buckets`` when reading days written before it was
+    lowered.
+    """
+    partitions = await asyncio.gather(
+        *(store.query_partition(MASK_A_TABLE, key) for key in day_partitions(day, buckets))
+    )
+    entities = sorted(
+        (entity for partition in partitions for entity in partition),
+        key=lambda entity: (entity.get("created_at") or "", entity["RowKey"]),
+    )
+    return [
+        {
+            "partitionKey": entity["PartitionKey"],
+            "rowKey": entity["RowKey"],
+            "payload": decode_payload(entity),
+        }
+        for entity in entities
+    ]
@@ -0,0 +1,158 @@
+"""Bounded pool that runs contract renders off the event loop."""
+import asyncio
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import IO, Any, Dict, Optional, Tuple
+
+import azure.functions as func
+
+from shared_code.rendering import render_template, render_to_buffer
+from shared_code.settings import clean, env_number
+from shared_code.timing import StageTimer
+
+
+class RenderQueueFull(RuntimeError):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Contract rendering is at capacity. Retry later.")
+        self.retry_after = retry_after
+
+
+def _run_render_job(
+    submitted_at: float, extension: str, template_bytes: bytes, context: Dict[str, str]
+) -> Tuple[float, IO[bytes]]:
+    # time.monotonic is system-wide, so the wait is comparable across processes.
+    waited = time.monotonic() - submitted_at
+    return waited, render_to_buffer(extension, template_bytes, context)
+
+
+def _run_render_job_in_process(
+    submitted_at: float, extension: str, template_bytes: bytes, context: Dict[str, str]
+) -> Tuple[float, bytes]:
+    # Buffers cannot cross the process boundary, so the result is returned as bytes.
+    waited = time.monotonic() - submitted_at
+    return waited, render_template(extension, template_bytes, context)
+
+
+class RenderExecutor:
+    """Runs renders off the event loop on a bounded thread or process pool.
+
+    At most ``queue_limit`` renders are admitted at once (running plus waiting);
+    further requests are rejected with :class:`RenderQueueFull` instead of
+    queueing without bound.
+    """
+
+    def __init__(
+        self, kind: str = "thread", workers: int = 2, queue_limit: int = 16, retry_after: int = 1
+    ) -> None:
+        self.kind = kind if kind in ("thread", "process") else "thread"
+        self.workers = max(1, int(workers))
+        self.queue_limit = max(self.workers, int(queue_limit))
+        self.retry_after = max(1, int(retry_after))
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @classmethod
+    def from_env(cls) -> "RenderExecutor":
+        return cls(
+            kind=(clean(os.getenv("RenderPoolKind")) or "thread").lower(),
+            workers=int(env_number("RenderPoolWorkers", min(4, os.cpu_count() or 1))),
+            queue_limit=int(env_number("RenderQueueLimit", 16)),
+            retry_after=int(env_number("RenderRetryAfterSeconds", 1)),
+        )
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                # multiprocessing is only imported when a process pool is configured.
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="contract-render"
+                )
+        return self._pool
+
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    async def render(
+        self,
+        extension: str,
+        template_bytes: bytes,
+        context: Dict[str, str],
+        timer: Optional[StageTimer] = None,
+    ) -> IO[bytes]:
+        """Render on the pool and return the contract as a rewound buffer the caller closes."""
+        with self._lock:
+            if self.in_flight >= self.queue_limit:
+                self.rejected += 1
+                raise RenderQueueFull(self.retry_after)
+            self.in_flight += 1
+            depth = self.queue_depth()
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+        job = _run_render_job_in_process if self.kind == "process" else _run_render_job
+        try:
+            future = self._get_pool().submit(job, time.monotonic(), extension, template_bytes, context)
+        except BaseException:
+            self._release()
+            raise
+        # A cancelled caller stops waiting, but the pool keeps rendering; the
+        # slot is only freed once the render itself is done.
+        future.add_done_callback(self._release)
+        waited, contract = await asyncio.wrap_future(future)
+
+        with self._lock:
+            self.completed += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        if timer is not None:
+            timer.record("render_queue", waited)
+        logging.info(
+            "Render finished: queue_depth=%d wait_ms=%.1f in_flight=%d",
+            depth, waited * 1000, self.in_flight,
+        )
+        return io.BytesIO(contract) if isinstance(contract, bytes) else contract
+
+    def _release(self, future: Optional[Future] = None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth(),
+                "max_queue_depth": self.max_queue_depth,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": (self.total_wait / self.completed * 1000) if self.completed else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+RENDER_EXECUTOR = RenderExecutor.from_env()
+
+
+def busy_response(exc: RenderQueueFull) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps({"message": str(exc)}, ensure_ascii=False),
+        status_code=503,
+        mimetype="application/json",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
@@ -0,0 +1,555 @@
+"""Rendering contracts from DOCX and HTML templates.
+
+python-docx (and lxml with it) is imported on first use to keep cold starts
+short; see benchmarks/startup.py.
+"""
+import copy
+import functools
+import io
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+from dataclasses import dataclass
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from shared_code.settings import clean, env_number
+from shared_code.templates import TemplateProcessingError
+
+if TYPE_CHECKING:
+    from docx.document import Document
+
+
+PLACEHOLDER_PATTERN = re.compile(r"\[([A-Z0-9_]+)\]")
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+# ============================================================
+# Placeholders
+# ============================================================
+
+
+def _apply_placeholders_to_runs(
+    runs: Iterable[Any], placeholders: Dict[str, str], used: set[str]
+) -> None:
+    def substitute(match: "re.Match[str]") -> str:
+        key = match.group(1)
+        value = placeholders.get(key)
+        if value is None:
+            return match.group(0)
+        used.add(key)
+        return value
+
+    # One regex scan per run replaces every marker at once; values are
+    # inserted verbatim and never rescanned.
+    for run in runs:
+        text = run.text
+        if "[" not in text:
+            continue
+        replaced = PLACEHOLDER_PATTERN.sub(substitute, text)
+        if replaced != text:
+            run.text = replaced
+
+
+def _extract_placeholders(text: str) -> set[str]:
+    return set(PLACEHOLDER_PATTERN.findall(text or ""))
+
+
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+_RUN_CONTROL_PATTERN = re.compile(r"([\t\n\r])")
+
+
+def _text_parts(document: "Document") -> List[Any]:
+    """The main document part followed by each header and footer part, once each."""
+    from docx.opc.constants import RELATIONSHIP_TYPE as RT
+
+    parts = {str(document.part.partname): document.part}
+    for rel in document.part.rels.values():
+        if not rel.is_external and rel.reltype in (RT.HEADER, RT.FOOTER):
+            parts.setdefault(str(rel.target_part.partname), rel.target_part)
+    return list(parts.values())
+
+
+def _node_path(node: Any, root: Any) -> Tuple[int, ...]:
+    path: List[int] = []
+    while node is not root:
+        parent = node.getparent()
+        path.append(parent.index(node))
+        node = parent
+    return tuple(reversed(path))
+
+
+def _resolve_path(root: Any, path: Tuple[int, ...]) -> Any:
+    node = root
+    for index in path:
+        node = node[index]
+    return node
+
+
+def _preserve_space(node: Any) -> None:
+    text = node.text or ""
+    if text != text.strip():
+        node.set(_XML_SPACE, "preserve")
+
+
+def _normalize_text_node(node: Any) -> None:
+    """Give a patched ``w:t`` the markup ``Run.text`` would write for the same string.
+
+    Edge whitespace is preserved, and tabs and line breaks become ``w:tab`` and
+    ``w:br`` siblings because Word does not honour them inside ``w:t``.
+    """
+    text = node.text or ""
+    if _RUN_CONTROL_PATTERN.search(text) is None:
+        _preserve_space(node)
+        return
+
+    from docx.oxml import OxmlElement
+
+    pieces = _RUN_CONTROL_PATTERN.split(text)
+    node.text = pieces[0]
+    _preserve_space(node)
+    anchor = node
+    for control, piece in zip(pieces[1::2], pieces[2::2]):
+        anchor.addnext(OxmlElement("w:tab" if control == "\t" else "w:br"))
+        anchor = anchor.getnext()
+        if piece:
+            text_node = OxmlElement("w:t")
+            text_node.text = piece
+            _preserve_space(text_node)
+            anchor.addnext(text_node)
+            anchor = text_node
+
+
+# ============================================================
+# DOCX Package Writer
+# ============================================================
+
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_CENTRAL_HEADER = struct.Struct("<4s4B4H3L5H2L")
+_END_OF_CENTRAL_DIR = struct.Struct("<4s4H2LH")
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+
+def _dos_timestamp(date_time: Tuple[int, ...]) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    return (
+        (hour << 11) | (minute << 5) | (second // 2),
+        ((year - 1980) << 9) | (month << 5) | day,
+    )
+
+
+def _raw_member_data(source: memoryview, info: zipfile.ZipInfo) -> memoryview:
+    header = _LOCAL_HEADER.unpack_from(source, info.header_offset)
+    name_length, extra_length = header[-2], header[-1]
+    start = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+    return source[start : start + info.compress_size]
+
+
+def _write_docx_package(
+    template: "bytes | io.BytesIO",
+    replacements: Dict[str, bytes],
+    out: IO[bytes],
+    date_time: Optional[Tuple[int, ...]] = None,
+) -> None:
+    """Write ``template`` to ``out`` with only the ``replacements`` members re-encoded.
+
+    Every other member is copied as its stored compressed bytes without being
+    inflated or deflated again. Member order and timestamps follow the template
+    unless ``date_time`` pins every member to one timestamp. ``template`` may be
+    a ``BytesIO``, whose buffer is then read in place.
+    """
+    if isinstance(template, io.BytesIO):
+        package_file, source = template, template.getbuffer()
+    else:
+        # BytesIO shares an immutable bytes object until it is written to.
+        package_file, source = io.BytesIO(template), memoryview(template)
+    central: list[bytes] = []
+    offset = 0
+
+    with zipfile.ZipFile(package_file) as package:
+        members = package.infolist()
+
+    for info in members:
+        flags = info.flag_bits & ~_DATA_DESCRIPTOR_FLAG
+        if info.filename in replacements:
+            data = replacements[info.filename]
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            payload: Any = compressor.compress(data) + compressor.flush()
+            method, crc, size = zipfile.ZIP_DEFLATED, zlib.crc32(data), len(data)
+            flags &= 0x800
+        else:
+            payload = _raw_member_data(source, info)
+            method, crc, size = info.compress_type, info.CRC, info.file_size
+
+        name = info.filename.encode("utf-8" if flags & 0x800 else "cp437")
+        dos_time, dos_date = _dos_timestamp(date_time or info.date_time)
+        local = _LOCAL_HEADER.pack(
+            b"PK\x03\x04", info.extract_version, flags, method, dos_time, dos_date,
+            crc, len(payload), size, len(name), 0,
+        )
+        out.write(local)
+        out.write(name)
+        out.write(payload)
+
+        central.append(
+            _CENTRAL_HEADER.pack(
+                b"PK\x01\x02", info.create_version, info.create_system,
+                info.extract_version, 0, flags, method, dos_time, dos_date,
+                crc, len(payload), size, len(name), 0, 0, 0,
+                info.internal_attr, info.external_attr, offset,
+            )
+            + name
+        )
+        offset += len(local) + len(name) + len(payload)
+
+    directory = b"".join(central)
+    out.write(directory)
+    out.write(
+        _END_OF_CENTRAL_DIR.pack(
+            b"PK\x05\x06", 0, 0, len(central), len(central), len(directory), offset, 0
+        )
+    )
+
+
+# Fixed member timestamp so identical inputs produce byte-identical packages.
+_FIXED_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def _save_document_to(document: "Document", out: IO[bytes]) -> None:
+    saved = io.BytesIO()
+    document.save(saved)
+    _write_docx_package(saved, {}, out, date_time=_FIXED_ZIP_DATE_TIME)
+
+
+def _save_document(document: "Document") -> bytes:
+    out = io.BytesIO()
+    _save_document_to(document, out)
+    return out.getvalue()
+
+
+# ============================================================
+# Output Buffers
+# ============================================================
+
+
+def _spool_threshold() -> int:
+    return int(env_number("RenderSpoolThresholdBytes", 4 * 1024 * 1024))
+
+
+def _output_buffer() -> IO[bytes]:
+    """Return a buffer for one rendered contract that moves to disk past the spool threshold."""
+    return tempfile.SpooledTemporaryFile(max_size=_spool_threshold(), mode="w+b")
+
+
+def buffer_size(buffer: IO[bytes]) -> int:
+    size = buffer.seek(0, io.SEEK_END)
+    buffer.seek(0)
+    return size
+
+
+# ============================================================
+# Compiled DOCX Templates
+# ============================================================
+
+
+@dataclass(frozen=True)
+class PlaceholderLocation:
+    part: str
+    # Position of the ``w:t`` among the part's text nodes, and its child-index path.
+    node: int
+    path: Tuple[int, ...]
+    keys: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class PreviewSection:
+    """One block of a contract preview: a ``heading``, a ``paragraph`` or a ``table``."""
+
+    kind: str
+    text: str = ""
+    level: int = 0
+    rows: Tuple[Tuple[str, ...], ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.kind == "table":
+            return {"type": "table", "rows": [list(row) for row in self.rows]}
+        section: Dict[str, Any] = {"type": self.kind, "text": self.text}
+        if self.kind == "heading":
+            section["level"] = self.level
+        return section
+
+
+def _heading_level(style_name: str) -> int:
+    if style_name == "Title":
+        return 1
+    match = re.fullmatch(r"Heading (\d)", style_name)
+    return min(int(match.group(1)), 6) if match else 0
+
+
+class CompiledDocxTemplate:
+    """A DOCX template parsed once, with every ``w:t`` text node holding a placeholder indexed.
+
+    Indexing walks the raw ``w:t`` elements of the body, tables (nested ones
+    included), headers and footers with lxml, so each node is visited once and
+    merged cells are not revisited. ``render`` deep-copies the pristine XML of
+    the parts holding placeholders, patches only the indexed nodes and
+    serializes the copies, so the shared parsed document is never mutated. In
+    the default ``zip`` mode only the patched parts are re-encoded; ``package``
+    mode saves the whole package through python-docx.
+    """
+
+    def __init__(self, template_bytes: bytes) -> None:
+        from docx import Document
+        from docx.oxml.ns import qn
+
+        self._template_bytes = template_bytes
+        self._paragraph_tag = qn("w:p")
+        self._text_tag = qn("w:t")
+        self._document = Document(io.BytesIO(template_bytes))
+        self._part = self._document.part
+        self._pristine = self._part.element
+        self._parts = {str(part.partname): part for part in _text_parts(self._document)}
+        self._pristine_elements = {name: part.element for name, part in self._parts.items()}
+        self._save_lock = threading.Lock()
+
+        placeholders: set[str] = set()
+        locations: List[PlaceholderLocation] = []
+        for partname, element in self._pristine_elements.items():
+            locations.extend(self._index_part(partname, element, placeholders))
+
+        self.placeholders: frozenset[str] = frozenset(placeholders)
+        self.locations: Tuple[PlaceholderLocation, ...] = tuple(locations)
+        self.run_placeholders: frozenset[str] = frozenset(
+            key for location in self.locations for key in location.keys
+        )
+        targets: Dict[str, List[Tuple[int, ...]]] = {}
+        for location in self.locations:
+            targets.setdefault(location.part, []).append(location.path)
+        self._targets = {name: tuple(paths) for name, paths in targets.items()}
+
+    def _index_part(
+        self, partname: str, element: Any, placeholders: set[str]
+    ) -> List[PlaceholderLocation]:
+        # Placeholders are collected per paragraph, so a marker split across runs
+        # still counts as a template placeholder and is reported as unreplaced.
+        locations: List[PlaceholderLocation] = []
+        paragraph_texts: Dict[Any, List[str]] = {}
+
+        for index, node in enumerate(element.iter(self._text_tag)):
+            text = node.text or ""
+            paragraph = next(node.iterancestors(self._paragraph_tag), None)
+            paragraph_texts.setdefault(paragraph, []).append(text)
+            if "[" not in text:
+                continue
+            keys = tuple(dict.fromkeys(PLACEHOLDER_PATTERN.findall(text)))
+            if keys:
+                locations.append(
+                    PlaceholderLocation(partname, index, _node_path(node, element), keys)
+                )
+
+        for texts in paragraph_texts.values():
+            placeholders.update(_extract_placeholders("".join(texts)))
+        return locations
+
+    def check_context(self, context: Dict[str, str]) -> None:
+        context_keys = set(context.keys())
+
+        missing = self.placeholders - context_keys
+        if missing:
+            raise TemplateProcessingError(
+                "Missing placeholders in context: " + ", ".join(sorted(missing))
+            )
+
+        unexpected = context_keys - self.placeholders
+        if unexpected:
+            raise TemplateProcessingError(
+                "Unexpected placeholders not in template: " + ", ".join(sorted(unexpected))
+            )
+
+    def _patch(self, context: Dict[str, str]) -> Dict[str, Any]:
+        self.check_context(context)
+
+        used: set[str] = set()
+        patched: Dict[str, Any] = {}
+        for partname, paths in self._targets.items():
+            element = copy.deepcopy(self._pristine_elements[partname])
+            nodes = [_resolve_path(element, path) for path in paths]
+            _apply_placeholders_to_runs(nodes, context, used)
+            for node in nodes:
+                _normalize_text_node(node)
+            patched[partname] = element
+
+        missing = set(context.keys()) - used
+        if missing:
+            raise TemplateProcessingError(
+                "Unreplaced placeholders in template: " + ", ".join(sorted(missing))
+            )
+
+        return patched
+
+    @functools.cached_property
+    def _preview_outline(self) -> Tuple[PreviewSection, ...]:
+        from docx.table import Table
+
+        outline: List[PreviewSection] = []
+        # A package-mode render swaps the part element while holding this lock.
+        with self._save_lock:
+            for block in self._document.iter_inner_content():
+                if isinstance(block, Table):
+                    rows = []
+                    for row in block.rows:
+                        cells: Dict[Any, str] = {}
+                        for cell in row.cells:
+                            # Merged cells are returned once per grid column.
+                            cells.setdefault(cell._tc, cell.text)
+                        rows.append(tuple(cells.values()))
+                    outline.append(PreviewSection("table", rows=tuple(rows)))
+                elif block.text.strip():
+                    level = _heading_level(block.style.name if block.style is not None else "")
+                    outline.append(PreviewSection("heading" if level else "paragraph", block.text, level))
+        return tuple(outline)
+
+    def preview(self, context: Dict[str, str]) -> List[PreviewSection]:
+        """Resolve the template text against ``context`` without touching any XML."""
+        self.check_context(context)
+
+        def fill(text: str) -> str:
+            return PLACEHOLDER_PATTERN.sub(lambda m: context.get(m.group(1), m.group(0)), text)
+
+        sections = []
+        for section in self._preview_outline:
+            text = fill(section.text)
+            # Paragraphs holding only an empty optional clause are dropped.
+            if section.kind != "table" and not text.strip():
+                continue
+            rows = tuple(tuple(fill(cell) for cell in row) for row in section.rows)
+            sections.append(PreviewSection(section.kind, text, section.level, rows))
+        return sections
+
+    def render(self, context: Dict[str, str], mode: Optional[str] = None) -> bytes:
+        patched = self._patch(context)
+
+        out = io.BytesIO()
+        self._write(patched, out, mode)
+        return out.getvalue()
+
+    def render_to(self, context: Dict[str, str], out: IO[bytes], mode: Optional[str] = None) -> None:
+        """Render into ``out`` without materializing the package as one ``bytes`` object."""
+        self._write(self._patch(context), out, mode)
+
+    def _write(self, patched: Dict[str, Any], out: IO[bytes], mode: Optional[str]) -> None:
+        if (mode or docx_render_mode()) == "package":
+            with self._save_lock:
+                for partname, element in patched.items():
+                    self._parts[partname]._element = element
+                try:
+                    _save_document_to(self._document, out)
+                finally:
+                    for partname in patched:
+                        self._parts[partname]._element = self._pristine_elements[partname]
+            return
+
+        from docx.opc.oxml import serialize_part_xml
+
+        replacements = {
+            partname.lstrip("/"): serialize_part_xml(element) for partname, element in patched.items()
+        }
+        _write_docx_package(self._template_bytes, replacements, out)
+
+
+def docx_render_mode() -> str:
+    mode = (clean(os.getenv("DocxRenderMode")) or "zip").lower()
+    if mode not in ("zip", "package"):
+        logging.warning("Unknown DocxRenderMode=%r, falling back to 'zip'", mode)
+        return "zip"
+    return mode
+
+
+@functools.lru_cache(maxsize=int(env_number("TemplateCacheMaxEntries", 8)))
+def compile_docx_template(template_bytes: bytes) -> CompiledDocxTemplate:
+    # Cached templates hand back the same bytes object, so repeat lookups hash once.
+    return CompiledDocxTemplate(template_bytes)
+
+
+# ============================================================
+# Rendering
+# ============================================================
+
+
+def render_docx_template(template_bytes: bytes, context: Dict[str, str]) -> bytes:
+    return compile_docx_template(template_bytes).render(context)
+
+
+def _html_template_blocks(html_bytes: bytes, context: Dict[str, str]) -> List[str]:
+    html = html_bytes.decode("utf-8", errors="ignore")
+
+    for key, value in context.items():
+        html = html.replace(f"[{key}]", value)
+
+    unresolved = re.findall(r"\[[A-Z0-9_]+\]", html)
+    if unresolved:
+        raise TemplateProcessingError(
+            "Unreplaced placeholders in template: " + ", ".join(sorted(set(unresolved)))
+        )
+
+    text = re.sub(r"<[^>]+>", "", html)
+    return [block for block in (b.strip() for b in text.split("\n\n")) if block]
+
+
+def _html_document(html_bytes: bytes, context: Dict[str, str]) -> "Document":
+    from docx import Document
+
+    document = Document()
+    for block in _html_template_blocks(html_bytes, context):
+        document.add_paragraph(block)
+    return document
+
+
+def render_html_template(html_bytes: bytes, context: Dict[str, str]) -> bytes:
+    return _save_document(_html_document(html_bytes, context))
+
+
+def template_placeholders(extension: str, template_bytes: bytes) -> frozenset[str]:
+    """The placeholders a template uses, i.e. the keys its context must hold."""
+    if extension == ".docx":
+        return compile_docx_template(template_bytes).placeholders
+    return frozenset(_extract_placeholders(template_bytes.decode("utf-8", errors="ignore")))
+
+
+def render_template(extension: str, template_bytes: bytes, context: Dict[str, str]) -> bytes:
+    if extension == ".docx":
+        return render_docx_template(template_bytes, context)
+    return render_html_template(template_bytes, context)
+
+
+def render_template_to(
+    extension: str, template_bytes: bytes, context: Dict[str, str], out: IO[bytes]
+) -> None:
+    if extension == ".docx":
+        compile_docx_template(template_bytes).render_to(context, out)
+    else:
+        _save_document_to(_html_document(template_bytes, context), out)
+
+
+def render_to_buffer(extension: str, template_bytes: bytes, context: Dict[str, str]) -> IO[bytes]:
+    out = _output_buffer()
+    try:
+        render_template_to(extension, template_bytes, context, out)
+    except BaseException:
+        out.close()
+        raise
+    out.seek(0)
+    return out
+
+
+def preview_sections(
+    extension: str, template_bytes: bytes, context: Dict[str, str]
+) -> List[PreviewSection]:
+    if extension == ".docx":
+        return compile_docx_template(template_bytes).preview(context)
+    return [PreviewSection("paragraph", block) for block in _html_template_blocks(template_bytes, context)]
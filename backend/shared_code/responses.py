@@ -0,0 +1,11 @@
+import json
+
+import azure.functions as func
+
+
+def error_response(message: str, status_code: int) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps({"message": message}, ensure_ascii=False),
+        status_code=status_code,
+        mimetype="application/json",
+    )
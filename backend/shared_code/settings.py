@@ -0,0 +1,22 @@
+import logging
+import os
+from typing import Optional
+
+
+def clean(value: Optional[str]) -> Optional[str]:
+    """``value`` stripped, or ``None`` when it is unset or blank."""
+    if value and value.strip():
+        return value.strip()
+    return None
+
+
+def env_number(name: str, default: float) -> float:
+    """The numeric app setting ``name``, or ``default`` when it is unset or not a number."""
+    raw = clean(os.getenv(name))
+    if raw is None:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        logging.warning("Ignoring non-numeric %s=%r", name, raw)
+        return default
@@ -0,0 +1,837 @@
+"""Blob, table and queue storage backends shared by the functions.
+
+``StorageBackend`` selects the implementation: ``azure`` (default) talks to
+Azure Storage through the async SDK clients, ``filesystem`` keeps blobs,
+entities and queue messages as files under ``StorageRoot`` and ``memory``
+keeps everything in process. The local backends need no emulator, which keeps
+tests and load runs fast.
+"""
+import asyncio
+import base64
+import importlib
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Deque, Dict, Iterator, List, Optional, Tuple, Union
+from uuid import uuid4
+
+BACKENDS = ("azure", "filesystem", "memory")
+# Table Storage accepts at most this many operations, all in one partition, per transaction.
+MAX_TRANSACTION_ENTITIES = 100
+DEFAULT_STORAGE_ROOT = Path(__file__).resolve().parents[1] / ".storage"
+
+
+# ============================================================
+# Errors
+# ============================================================
+
+
+class StorageError(RuntimeError):
+    pass
+
+
+class ContainerNotFoundError(StorageError):
+    pass
+
+
+class BlobNotFoundError(StorageError):
+    pass
+
+
+class BlobNotModifiedError(StorageError):
+    pass
+
+
+class BlobExistsError(StorageError):
+    pass
+
+
+class EntityExistsError(StorageError):
+    pass
+
+
+# ============================================================
+# Interfaces
+# ============================================================
+
+
+BlobData = Union[bytes, memoryview, IO[bytes]]
+
+
+def _is_stream(data: BlobData) -> bool:
+    return hasattr(data, "read")
+
+
+@dataclass
+class BlobDownload:
+    data: bytes
+    etag: Optional[str]
+
+
+class BlobStore(ABC):
+    @abstractmethod
+    async def download(
+        self, container: str, blob: str, if_none_match: Optional[str] = None
+    ) -> BlobDownload:
+        """Return the blob, or raise :class:`BlobNotModifiedError` if its ETag equals ``if_none_match``."""
+
+    @abstractmethod
+    async def exists(self, container: str, blob: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def upload(
+        self,
+        container: str,
+        blob: str,
+        data: BlobData,
+        overwrite: bool = True,
+        content_type: Optional[str] = None,
+    ) -> str:
+        """Store ``data`` (creating the container if needed) and return the blob URL.
+
+        A stream is read from its current position without being buffered whole.
+        """
+
+    @abstractmethod
+    def url(self, container: str, blob: str) -> str:
+        ...
+
+
+class TableStore(ABC):
+    async def __aenter__(self) -> "TableStore":
+        return self
+
+    @property
+    def identity(self) -> Any:
+        """Equal for stores that write to the same tables, even as separate instances."""
+        return id(self)
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        return None
+
+    @abstractmethod
+    async def create_table_if_not_exists(self, table: str) -> None:
+        ...
+
+    @abstractmethod
+    async def create_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        """Insert ``entity``; raise :class:`EntityExistsError` on a duplicate key."""
+
+    @abstractmethod
+    async def create_entities(self, table: str, entities: List[Dict[str, Any]]) -> None:
+        """Insert ``entities`` as one all-or-nothing transaction.
+
+        They must share a partition key and number at most
+        ``MAX_TRANSACTION_ENTITIES``; a duplicate key raises
+        :class:`EntityExistsError` and stores none of them.
+        """
+
+    @abstractmethod
+    async def upsert_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        """Insert ``entity`` or merge its properties into the stored one."""
+
+    @abstractmethod
+    async def get_entity(
+        self, table: str, partition_key: str, row_key: str
+    ) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def query_partition(self, table: str, partition_key: str) -> List[Dict[str, Any]]:
+        """Return every entity in one partition; an unknown table or partition yields ``[]``."""
+
+
+def _check_transaction(entities: List[Dict[str, Any]]) -> None:
+    if len(entities) > MAX_TRANSACTION_ENTITIES:
+        raise ValueError(f"A transaction holds at most {MAX_TRANSACTION_ENTITIES} entities.")
+    if len({entity["PartitionKey"] for entity in entities}) > 1:
+        raise ValueError("All entities in a transaction must share one partition key.")
+
+
+class QueueStore(ABC):
+    @abstractmethod
+    async def send(self, queue: str, message: str) -> None:
+        """Append ``message`` to ``queue``, creating the queue if needed."""
+
+
+# ============================================================
+# Azure
+# ============================================================
+
+# The Azure SDKs add several hundred milliseconds to a cold start, so they are
+# imported when the azure backend is first used rather than with this module.
+_AZURE_NAMES = {
+    "AzureError": "azure.core.exceptions",
+    "HttpResponseError": "azure.core.exceptions",
+    "ResourceExistsError": "azure.core.exceptions",
+    "MatchConditions": "azure.core",
+    "BlobServiceClient": "azure.storage.blob.aio",
+    "ResourceNotFoundError": "azure.core.exceptions",
+    "TableServiceClient": "azure.data.tables.aio",
+    "TableTransactionError": "azure.data.tables",
+    "QueueClient": "azure.storage.queue.aio",
+    "TextBase64EncodePolicy": "azure.storage.queue",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _AZURE_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def _azure(name: str) -> Any:
+    # Read through globals() so a patched module attribute wins.
+    return globals()[name] if name in globals() else __getattr__(name)
+
+
+@contextmanager
+def _azure_errors() -> Iterator[None]:
+    """Re-raise SDK failures as :class:`StorageError` so callers stay backend-neutral."""
+    try:
+        yield
+    except _azure("AzureError") as exc:
+        raise StorageError(str(exc) or type(exc).__name__) from exc
+
+
+class AzureBlobStore(BlobStore):
+    """Blob access through one pooled async client per connection string."""
+
+    def __init__(self, connection_string: str) -> None:
+        self.connection_string = connection_string
+        with _azure_errors():
+            self.service = _azure("BlobServiceClient").from_connection_string(connection_string)
+
+    async def download(
+        self, container: str, blob: str, if_none_match: Optional[str] = None
+    ) -> BlobDownload:
+        conditions: Dict[str, Any] = {}
+        if if_none_match:
+            conditions = {"etag": if_none_match, "match_condition": _azure("MatchConditions").IfModified}
+
+        with _azure_errors():
+            try:
+                downloader = await self.service.get_blob_client(container, blob).download_blob(**conditions)
+            except _azure("HttpResponseError") as exc:
+                if exc.status_code == 304:
+                    raise BlobNotModifiedError(blob) from exc
+                if exc.status_code == 404 and exc.error_code == "ContainerNotFound":
+                    raise ContainerNotFoundError(container) from exc
+                if exc.status_code == 404:
+                    raise BlobNotFoundError(blob) from exc
+                raise
+
+            return BlobDownload(await downloader.readall(), downloader.properties.etag)
+
+    async def exists(self, container: str, blob: str) -> bool:
+        with _azure_errors():
+            return await self.service.get_blob_client(container, blob).exists()
+
+    async def _ensure_container(self, container: str) -> None:
+        # A concurrent upload may create it first.
+        try:
+            await self.service.create_container(container)
+        except _azure("ResourceExistsError"):
+            pass
+
+    async def upload(
+        self,
+        container: str,
+        blob: str,
+        data: BlobData,
+        overwrite: bool = True,
+        content_type: Optional[str] = None,
+    ) -> str:
+        http_response_error = _azure("HttpResponseError")
+        resource_exists_error = _azure("ResourceExistsError")
+
+        with _azure_errors():
+            # The container is only created when an upload reports it missing.
+            blob_client = self.service.get_container_client(container).get_blob_client(blob)
+            options: Dict[str, Any] = {"overwrite": overwrite}
+            if content_type:
+                options["content_type"] = content_type
+            start = data.tell() if _is_stream(data) else 0
+            if _is_stream(data):
+                options["length"] = data.seek(0, io.SEEK_END) - start
+                data.seek(start)
+
+            try:
+                try:
+                    await blob_client.upload_blob(data, **options)
+                except http_response_error as exc:
+                    if exc.status_code != 404:
+                        raise
+                    # The container does not exist yet or was removed; create it and retry once.
+                    await self._ensure_container(container)
+                    if _is_stream(data):
+                        data.seek(start)
+                    await blob_client.upload_blob(data, **options)
+            except resource_exists_error as exc:
+                raise BlobExistsError(blob) from exc
+
+            return blob_client.url
+
+    def url(self, container: str, blob: str) -> str:
+        return self.service.get_blob_client(container, blob).url
+
+    async def dispose(self) -> None:
+        await self.service.close()
+
+
+class AzureTableStore(TableStore):
+    """Table access through one pooled async client per connection string.
+
+    Table clients are cached and each table is created at most once per
+    process; should a known table disappear, the write recreates it and is
+    retried once. The store outlives ``async with`` blocks, so ``close`` is a
+    no-op like the base class.
+    """
+
+    def __init__(self, connection_string: str) -> None:
+        self.connection_string = connection_string
+        with _azure_errors():
+            self.service = _azure("TableServiceClient").from_connection_string(connection_string)
+        self._table_clients: Dict[str, Any] = {}
+        self._known_tables: set[str] = set()
+
+    @property
+    def identity(self) -> Any:
+        return ("azure", self.connection_string)
+
+    async def dispose(self) -> None:
+        for client in self._table_clients.values():
+            await client.close()
+        await self.service.close()
+
+    def _table(self, table: str) -> Any:
+        client = self._table_clients.get(table)
+        if client is None:
+            client = self._table_clients[table] = self.service.get_table_client(table_name=table)
+        return client
+
+    async def create_table_if_not_exists(self, table: str) -> None:
+        if table in self._known_tables:
+            return
+        with _azure_errors():
+            await self.service.create_table_if_not_exists(table_name=table)
+        self._known_tables.add(table)
+
+    async def _write(self, table: str, operation: str, argument: Any) -> None:
+        try:
+            await getattr(self._table(table), operation)(argument)
+        except _azure("HttpResponseError") as exc:
+            # A transaction reports a missing table through its error code.
+            if not isinstance(exc, _azure("ResourceNotFoundError")) and exc.error_code != "TableNotFound":
+                raise
+            # The table was removed after we recorded it; recreate and retry once.
+            self._known_tables.discard(table)
+            await self.create_table_if_not_exists(table)
+            await getattr(self._table(table), operation)(argument)
+
+    async def create_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        with _azure_errors():
+            try:
+                await self._write(table, "create_entity", entity)
+            except _azure("ResourceExistsError") as exc:
+                raise EntityExistsError(f"{entity.get('PartitionKey')}/{entity.get('RowKey')}") from exc
+
+    async def create_entities(self, table: str, entities: List[Dict[str, Any]]) -> None:
+        _check_transaction(entities)
+        with _azure_errors():
+            try:
+                await self._write(table, "submit_transaction", [("create", entity) for entity in entities])
+            except _azure("TableTransactionError") as exc:
+                if exc.error_code == "EntityAlreadyExists":
+                    raise EntityExistsError(str(exc)) from exc
+                raise
+
+    async def upsert_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        with _azure_errors():
+            await self._write(table, "upsert_entity", entity)
+
+    async def get_entity(
+        self, table: str, partition_key: str, row_key: str
+    ) -> Optional[Dict[str, Any]]:
+        with _azure_errors():
+            try:
+                entity = await self._table(table).get_entity(partition_key, row_key)
+            except _azure("ResourceNotFoundError"):
+                return None
+            return dict(entity)
+
+    async def query_partition(self, table: str, partition_key: str) -> List[Dict[str, Any]]:
+        with _azure_errors():
+            try:
+                return [
+                    dict(entity)
+                    async for entity in self._table(table).query_entities(
+                        "PartitionKey eq @partition_key", parameters={"partition_key": partition_key}
+                    )
+                ]
+            except _azure("ResourceNotFoundError"):
+                return []
+
+
+class AzureQueueStore(QueueStore):
+    """Queue access with Base64 message encoding, as queue triggers expect by default."""
+
+    def __init__(self, connection_string: str) -> None:
+        self.connection_string = connection_string
+        self._clients: Dict[str, Any] = {}
+
+    async def dispose(self) -> None:
+        for client in self._clients.values():
+            await client.close()
+
+    async def _get_client(self, queue: str) -> Any:
+        client = self._clients.get(queue)
+        if client is None:
+            client = _azure("QueueClient").from_connection_string(
+                self.connection_string,
+                queue,
+                message_encode_policy=_azure("TextBase64EncodePolicy")(),
+            )
+            try:
+                await client.create_queue()
+            except _azure("ResourceExistsError"):
+                pass
+            self._clients[queue] = client
+        return client
+
+    async def send(self, queue: str, message: str) -> None:
+        with _azure_errors():
+            client = await self._get_client(queue)
+            await client.send_message(message)
+
+
+# ============================================================
+# Filesystem
+# ============================================================
+
+
+def _file_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _write_blob_data(handle: IO[bytes], data: BlobData) -> None:
+    if _is_stream(data):
+        shutil.copyfileobj(data, handle)
+    else:
+        handle.write(data)
+
+
+def _safe_segment(value: str) -> str:
+    if not value or value in (".", "..") or "\x00" in value:
+        raise StorageError(f"Invalid storage name {value!r}")
+    return value
+
+
+class FileSystemBlobStore(BlobStore):
+    """Blobs stored as ``<root>/<container>/<blob>`` files."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def _path(self, container: str, blob: str) -> Path:
+        parts = [_safe_segment(part) for part in blob.split("/")]
+        return self.root.joinpath(_safe_segment(container), *parts)
+
+    def _download(self, container: str, blob: str, if_none_match: Optional[str]) -> BlobDownload:
+        path = self._path(container, blob)
+        if not (self.root / container).is_dir():
+            raise ContainerNotFoundError(container)
+        try:
+            etag = _file_etag(path.stat())
+            if if_none_match and if_none_match == etag:
+                raise BlobNotModifiedError(blob)
+            return BlobDownload(path.read_bytes(), etag)
+        except FileNotFoundError as exc:
+            raise BlobNotFoundError(blob) from exc
+
+    async def download(
+        self, container: str, blob: str, if_none_match: Optional[str] = None
+    ) -> BlobDownload:
+        return await asyncio.to_thread(self._download, container, blob, if_none_match)
+
+    async def exists(self, container: str, blob: str) -> bool:
+        return await asyncio.to_thread(self._path(container, blob).is_file)
+
+    def _upload(self, container: str, blob: str, data: BlobData, overwrite: bool) -> None:
+        path = self._path(container, blob)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not overwrite:
+            try:
+                with open(path, "xb") as handle:
+                    _write_blob_data(handle, data)
+            except FileExistsError as exc:
+                raise BlobExistsError(blob) from exc
+            return
+
+        temporary = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+        with open(temporary, "wb") as handle:
+            _write_blob_data(handle, data)
+        os.replace(temporary, path)
+
+    async def upload(
+        self,
+        container: str,
+        blob: str,
+        data: BlobData,
+        overwrite: bool = True,
+        content_type: Optional[str] = None,
+    ) -> str:
+        await asyncio.to_thread(self._upload, container, blob, data, overwrite)
+        return self.url(container, blob)
+
+    def url(self, container: str, blob: str) -> str:
+        return self._path(container, blob).resolve().as_uri()
+
+
+def _encode_binary(value: Any) -> Dict[str, str]:
+    # JSON has no bytes type; binary properties are kept as base64 like Edm.Binary values.
+    if isinstance(value, (bytes, bytearray)):
+        return {"Edm.Binary": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Entity property of type {type(value).__name__} is not supported.")
+
+
+def _decode_binary(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and "Edm.Binary" in value:
+        return base64.b64decode(value["Edm.Binary"])
+    return value
+
+
+class FileSystemTableStore(TableStore):
+    """Entities stored as ``<root>/tables/<table>/<PartitionKey>/<RowKey>.json``."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root) / "tables"
+
+    @property
+    def identity(self) -> Any:
+        # A new instance is created per call; its root names the tables it writes.
+        return ("filesystem", str(self.root.resolve()))
+
+    async def create_table_if_not_exists(self, table: str) -> None:
+        await asyncio.to_thread(
+            (self.root / _safe_segment(table)).mkdir, parents=True, exist_ok=True
+        )
+
+    def _create_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        partition = self.root / _safe_segment(table) / _safe_segment(entity["PartitionKey"])
+        partition.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(partition / f"{_safe_segment(entity['RowKey'])}.json", "x", encoding="utf-8") as handle:
+                json.dump(entity, handle, ensure_ascii=False, default=_encode_binary)
+        except FileExistsError as exc:
+            raise EntityExistsError(f"{entity['PartitionKey']}/{entity['RowKey']}") from exc
+
+    async def create_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._create_entity, table, dict(entity))
+
+    def _create_entities(self, table: str, entities: List[Dict[str, Any]]) -> None:
+        # Checked up front so a duplicate stores nothing; not atomic across a crash.
+        for entity in entities:
+            if self._entity_path(table, entity["PartitionKey"], entity["RowKey"]).exists():
+                raise EntityExistsError(f"{entity['PartitionKey']}/{entity['RowKey']}")
+        for entity in entities:
+            self._create_entity(table, entity)
+
+    async def create_entities(self, table: str, entities: List[Dict[str, Any]]) -> None:
+        _check_transaction(entities)
+        await asyncio.to_thread(self._create_entities, table, [dict(entity) for entity in entities])
+
+    def _entity_path(self, table: str, partition_key: str, row_key: str) -> Path:
+        return self.root / _safe_segment(table) / _safe_segment(partition_key) / f"{_safe_segment(row_key)}.json"
+
+    def _upsert_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        path = self._entity_path(table, entity["PartitionKey"], entity["RowKey"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        merged = self._get_entity(table, entity["PartitionKey"], entity["RowKey"]) or {}
+        merged.update(entity)
+        temporary = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+        temporary.write_text(json.dumps(merged, ensure_ascii=False, default=_encode_binary), encoding="utf-8")
+        os.replace(temporary, path)
+
+    async def upsert_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._upsert_entity, table, dict(entity))
+
+    def _get_entity(self, table: str, partition_key: str, row_key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(
+                self._entity_path(table, partition_key, row_key).read_text(encoding="utf-8"),
+                object_hook=_decode_binary,
+            )
+        except FileNotFoundError:
+            return None
+
+    async def get_entity(
+        self, table: str, partition_key: str, row_key: str
+    ) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_entity, table, partition_key, row_key)
+
+    def _query_partition(self, table: str, partition_key: str) -> List[Dict[str, Any]]:
+        partition = self.root / _safe_segment(table) / _safe_segment(partition_key)
+        return [
+            json.loads(path.read_text(encoding="utf-8"), object_hook=_decode_binary)
+            for path in sorted(partition.glob("*.json"))
+        ]
+
+    async def query_partition(self, table: str, partition_key: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._query_partition, table, partition_key)
+
+
+class FileSystemQueueStore(QueueStore):
+    """Messages stored as ``<root>/queues/<queue>/<sequence>.msg`` files, oldest first."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root) / "queues"
+
+    def _send(self, queue: str, message: str) -> None:
+        directory = self.root / _safe_segment(queue)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns():020d}-{uuid4().hex}.msg"
+        temporary = directory / f".{name}.tmp"
+        temporary.write_text(message, encoding="utf-8")
+        os.replace(temporary, directory / name)
+
+    async def send(self, queue: str, message: str) -> None:
+        await asyncio.to_thread(self._send, queue, message)
+
+    def receive(self, queue: str) -> Optional[str]:
+        """Remove and return the oldest message, for local workers and tests."""
+        directory = self.root / _safe_segment(queue)
+        for path in sorted(directory.glob("*.msg")) if directory.is_dir() else []:
+            try:
+                message = path.read_text(encoding="utf-8")
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            return message
+        return None
+
+
+# ============================================================
+# In-memory
+# ============================================================
+
+
+class MemoryBlobStore(BlobStore):
+    def __init__(self) -> None:
+        self.blobs: Dict[Tuple[str, str], BlobDownload] = {}
+        self._lock = threading.Lock()
+        self._version = 0
+
+    async def download(
+        self, container: str, blob: str, if_none_match: Optional[str] = None
+    ) -> BlobDownload:
+        with self._lock:
+            stored = self.blobs.get((container, blob))
+            if stored is None:
+                if not any(key[0] == container for key in self.blobs):
+                    raise ContainerNotFoundError(container)
+                raise BlobNotFoundError(blob)
+        if if_none_match and if_none_match == stored.etag:
+            raise BlobNotModifiedError(blob)
+        return stored
+
+    async def exists(self, container: str, blob: str) -> bool:
+        return (container, blob) in self.blobs
+
+    async def upload(
+        self,
+        container: str,
+        blob: str,
+        data: BlobData,
+        overwrite: bool = True,
+        content_type: Optional[str] = None,
+    ) -> str:
+        content = data.read() if _is_stream(data) else bytes(data)
+        with self._lock:
+            if not overwrite and (container, blob) in self.blobs:
+                raise BlobExistsError(blob)
+            self._version += 1
+            self.blobs[(container, blob)] = BlobDownload(content, f'"{self._version}"')
+        return self.url(container, blob)
+
+    def url(self, container: str, blob: str) -> str:
+        return f"memory://{container}/{blob}"
+
+
+class MemoryTableStore(TableStore):
+    def __init__(self) -> None:
+        self.tables: Dict[str, Dict[Tuple[str, str], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    async def create_table_if_not_exists(self, table: str) -> None:
+        with self._lock:
+            self.tables.setdefault(table, {})
+
+    async def create_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        key = (entity["PartitionKey"], entity["RowKey"])
+        with self._lock:
+            rows = self.tables.setdefault(table, {})
+            if key in rows:
+                raise EntityExistsError("/".join(key))
+            rows[key] = dict(entity)
+
+    async def create_entities(self, table: str, entities: List[Dict[str, Any]]) -> None:
+        _check_transaction(entities)
+        with self._lock:
+            rows = self.tables.setdefault(table, {})
+            keys = [(entity["PartitionKey"], entity["RowKey"]) for entity in entities]
+            for key in keys:
+                if key in rows:
+                    raise EntityExistsError("/".join(key))
+            rows.update((key, dict(entity)) for key, entity in zip(keys, entities))
+
+    async def upsert_entity(self, table: str, entity: Dict[str, Any]) -> None:
+        key = (entity["PartitionKey"], entity["RowKey"])
+        with self._lock:
+            self.tables.setdefault(table, {}).setdefault(key, {}).update(entity)
+
+    async def get_entity(
+        self, table: str, partition_key: str, row_key: str
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entity = self.tables.get(table, {}).get((partition_key, row_key))
+            return dict(entity) if entity is not None else None
+
+    async def query_partition(self, table: str, partition_key: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                dict(entity)
+                for (entity_partition, _), entity in self.tables.get(table, {}).items()
+                if entity_partition == partition_key
+            ]
+
+
+class MemoryQueueStore(QueueStore):
+    def __init__(self) -> None:
+        self.queues: Dict[str, Deque[str]] = {}
+        self._lock = threading.Lock()
+
+    async def send(self, queue: str, message: str) -> None:
+        with self._lock:
+            self.queues.setdefault(queue, deque()).append(message)
+
+    def receive(self, queue: str) -> Optional[str]:
+        """Remove and return the oldest message, for local workers and tests."""
+        with self._lock:
+            messages = self.queues.get(queue)
+            return messages.popleft() if messages else None
+
+
+# ============================================================
+# Backend selection
+# ============================================================
+
+
+_AZURE_BLOB_STORES: Dict[str, Tuple[asyncio.AbstractEventLoop, AzureBlobStore]] = {}
+_AZURE_TABLE_STORES: Dict[str, Tuple[asyncio.AbstractEventLoop, AzureTableStore]] = {}
+_AZURE_QUEUE_STORES: Dict[str, Tuple[asyncio.AbstractEventLoop, AzureQueueStore]] = {}
+_MEMORY_BLOB_STORE = MemoryBlobStore()
+_MEMORY_TABLE_STORE = MemoryTableStore()
+_MEMORY_QUEUE_STORE = MemoryQueueStore()
+
+
+def storage_backend() -> str:
+    backend = (os.getenv("StorageBackend") or "azure").strip().lower()
+    if backend not in BACKENDS:
+        raise StorageError(
+            f"Unknown StorageBackend '{backend}'. Use one of: {', '.join(BACKENDS)}."
+        )
+    return backend
+
+
+def storage_root() -> Path:
+    configured = (os.getenv("StorageRoot") or "").strip()
+    return Path(configured) if configured else DEFAULT_STORAGE_ROOT
+
+
+def get_blob_store(connection_string: str) -> BlobStore:
+    """Return the blob store for ``connection_string`` under the configured backend.
+
+    Azure stores are pooled per connection string so requests share one HTTP
+    session; a store created on another event loop is replaced because its
+    session is bound to that loop.
+    """
+    backend = storage_backend()
+    if backend == "memory":
+        return _MEMORY_BLOB_STORE
+    if backend == "filesystem":
+        return FileSystemBlobStore(storage_root() / "blobs")
+
+    return _pooled(_AZURE_BLOB_STORES, connection_string, AzureBlobStore)
+
+
+# Closes of replaced stores still in progress, kept so they are not collected early.
+_DISPOSING: set["asyncio.Future[None]"] = set()
+
+
+async def _dispose_quietly(store: Any) -> None:
+    try:
+        await store.dispose()
+    except Exception:
+        logging.debug("Failed to close a replaced storage client", exc_info=True)
+
+
+def _dispose_replaced(loop: asyncio.AbstractEventLoop, store: Any) -> None:
+    """Close a pooled store whose event loop is no longer the current one."""
+    if loop.is_running():
+        # Still serving another thread: close it there, where its session lives.
+        asyncio.run_coroutine_threadsafe(_dispose_quietly(store), loop)
+        return
+    task = asyncio.ensure_future(_dispose_quietly(store))
+    _DISPOSING.add(task)
+    task.add_done_callback(_DISPOSING.discard)
+
+
+def _pooled(
+    registry: Dict[str, Tuple[asyncio.AbstractEventLoop, Any]], connection_string: str, factory: Any
+) -> Any:
+    loop = asyncio.get_running_loop()
+    cached = registry.get(connection_string)
+    if cached is not None:
+        if cached[0] is loop:
+            return cached[1]
+        _dispose_replaced(*cached)
+
+    store = factory(connection_string)
+    registry[connection_string] = (loop, store)
+    return store
+
+
+def get_table_store(connection_string: str) -> TableStore:
+    """Return the table store for ``connection_string``; Azure stores are pooled like blob stores."""
+    backend = storage_backend()
+    if backend == "memory":
+        return _MEMORY_TABLE_STORE
+    if backend == "filesystem":
+        return FileSystemTableStore(storage_root())
+    return _pooled(_AZURE_TABLE_STORES, connection_string, AzureTableStore)
+
+
+def get_queue_store(connection_string: str) -> QueueStore:
+    backend = storage_backend()
+    if backend == "memory":
+        return _MEMORY_QUEUE_STORE
+    if backend == "filesystem":
+        return FileSystemQueueStore(storage_root())
+    return _pooled(_AZURE_QUEUE_STORES, connection_string, AzureQueueStore)
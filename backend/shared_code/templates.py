@@ -0,0 +1,262 @@
+"""Contract templates: storage settings, the template cache and template loading.
+
+Templates are read from a local path or from blob storage. Blob templates are
+kept in ``TEMPLATE_CACHE`` and revalidated on their ETag once
+``TemplateCacheTtlSeconds`` has passed.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from shared_code.settings import clean, env_number
+from shared_code.storage import (
+    BlobNotFoundError,
+    BlobNotModifiedError,
+    ContainerNotFoundError,
+    StorageError,
+    get_blob_store,
+)
+
+
+# ============================================================
+# Errors
+# ============================================================
+
+
+class TemplateProcessingError(RuntimeError):
+    pass
+
+
+class TemplateStorageError(TemplateProcessingError):
+    """A storage call failed; the same request may succeed when retried."""
+
+
+# ============================================================
+# Storage Resolution (CRITICAL FIX)
+# ============================================================
+
+
+def _resolve_connection(*env_vars: str, default: str = "UseDevelopmentStorage=true") -> str:
+    for var in env_vars:
+        candidate = clean(os.getenv(var))
+        if candidate:
+            return candidate
+    return default
+
+
+@dataclass
+class StorageSettings:
+    template_path: str
+    template_container: str
+    template_connection: str
+    contracts_container: str
+    contracts_connection: str
+
+    @classmethod
+    def from_env(cls, template_path_override: Optional[str]) -> "StorageSettings":
+        template_path = clean(template_path_override) or clean(
+            os.getenv("TemplateBlobPath")
+        )
+
+        if not template_path:
+            raise TemplateProcessingError(
+                "Template path not provided. Supply 'templatePath' in the request or set the TemplateBlobPath environment variable."
+            )
+
+        return cls(
+            template_path=template_path,
+            template_container=clean(os.getenv("TemplatesContainer")) or "templates",
+            template_connection=_resolve_connection(
+                "TemplateBlobConnection", "ContractsBlobConnection", "AzureWebJobsStorage"
+            ),
+            contracts_container=clean(os.getenv("ContractsContainer")) or "contracts",
+            contracts_connection=_resolve_connection(
+                "ContractsBlobConnection", "AzureWebJobsStorage"
+            ),
+        )
+
+    @staticmethod
+    def template_hint() -> str:
+        return (
+            "Check TemplateBlobConnection, ContractsBlobConnection, AzureWebJobsStorage, and TemplatesContainer environment values."
+        )
+
+    @staticmethod
+    def contract_hint() -> str:
+        return "Verify ContractsBlobConnection, AzureWebJobsStorage, and ContractsContainer environment values."
+
+
+# ============================================================
+# Template Cache
+# ============================================================
+
+
+@dataclass
+class _CachedTemplate:
+    extension: str
+    data: bytes
+    etag: Optional[str]
+    validated_at: float
+
+
+class TemplateCache:
+    """Size-bounded LRU of blob templates keyed by (connection, container, blob).
+
+    Entries younger than ``ttl_seconds`` are served without any storage call;
+    older entries are revalidated with a conditional download on their ETag.
+    """
+
+    def __init__(self, max_entries: int = 8, ttl_seconds: float = 60.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self._entries: "OrderedDict[Tuple[str, str, str], _CachedTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "TemplateCache":
+        return cls(
+            max_entries=int(env_number("TemplateCacheMaxEntries", 8)),
+            ttl_seconds=env_number("TemplateCacheTtlSeconds", 60.0),
+        )
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[_CachedTemplate]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def is_fresh(self, entry: _CachedTemplate) -> bool:
+        return time.monotonic() - entry.validated_at < self.ttl_seconds
+
+    def put(self, key: Tuple[str, str, str], entry: _CachedTemplate) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revalidate(self, key: Tuple[str, str, str]) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.validated_at = time.monotonic()
+
+    def discard(self, key: Tuple[str, str, str]) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def record_hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+TEMPLATE_CACHE = TemplateCache.from_env()
+
+
+def template_cache_stats() -> Dict[str, int]:
+    return TEMPLATE_CACHE.stats()
+
+
+# ============================================================
+# Template Loading
+# ============================================================
+
+
+def _split_template_path(template_path: str, container: str) -> Tuple[str, str]:
+    blob_name = template_path.lstrip("/")
+    container_name = container
+
+    if "/" in blob_name:
+        maybe_container, remainder = blob_name.split("/", 1)
+        if remainder:
+            container_name = maybe_container
+            blob_name = remainder
+
+    return container_name, blob_name
+
+
+def _read_local_template(template_path: str) -> bytes:
+    with open(template_path, "rb") as f:
+        return f.read()
+
+
+async def load_template(
+    template_path: str, connection_string: str, container: str
+) -> Tuple[str, bytes]:
+    # Local file
+    if os.path.exists(template_path):
+        data = await asyncio.to_thread(_read_local_template, template_path)
+        return os.path.splitext(template_path)[1].lower(), data
+
+    if not connection_string:
+        raise TemplateProcessingError(
+            f"Template storage connection not configured for '{template_path}'. {StorageSettings.template_hint()}"
+        )
+
+    container_name, blob_name = _split_template_path(template_path, container)
+    extension = os.path.splitext(template_path)[1].lower()
+    cache_key = (connection_string, container_name, blob_name)
+
+    cached = TEMPLATE_CACHE.get(cache_key)
+    if cached is not None and TEMPLATE_CACHE.is_fresh(cached):
+        TEMPLATE_CACHE.record_hit()
+        return cached.extension, cached.data
+
+    try:
+        store = get_blob_store(connection_string)
+        if_none_match = cached.etag if cached is not None else None
+
+        try:
+            download = await store.download(container_name, blob_name, if_none_match=if_none_match)
+        except BlobNotModifiedError:
+            TEMPLATE_CACHE.revalidate(cache_key)
+            TEMPLATE_CACHE.record_hit()
+            return cached.extension, cached.data
+        except ContainerNotFoundError as exc:
+            raise TemplateProcessingError(
+                f"Template container '{container_name}' not found while attempting to read '{template_path}'. {StorageSettings.template_hint()}"
+            ) from exc
+        except BlobNotFoundError as exc:
+            raise TemplateProcessingError(
+                f"Template blob '{blob_name}' not found in container '{container_name}'. {StorageSettings.template_hint()}"
+            ) from exc
+
+        data, etag = download.data, download.etag
+
+    except TemplateProcessingError:
+        TEMPLATE_CACHE.discard(cache_key)
+        raise
+    except (StorageError, ValueError) as exc:
+        raise TemplateStorageError(
+            f"Failed to load template '{template_path}' from blob storage. {StorageSettings.template_hint()}"
+        ) from exc
+
+    TEMPLATE_CACHE.record_miss()
+    TEMPLATE_CACHE.put(cache_key, _CachedTemplate(extension, data, etag, time.monotonic()))
+    return extension, data
@@ -0,0 +1,74 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator, Optional, TypeVar
+
+import azure.functions as func
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """Collects per-stage durations and byte sizes for a single request."""
+
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.sizes: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        with self.stage(name):
+            return await awaitable
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds * 1000
+
+    def size(self, name: str, value: Optional[int]) -> None:
+        if value is not None:
+            self.sizes[name] = value
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.stages.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(entries)
+
+    def finish(self, response: func.HttpResponse, **fields: Any) -> func.HttpResponse:
+        """Attach the ``Server-Timing`` header and emit one structured log line."""
+        response.headers["Server-Timing"] = self.server_timing()
+        logging.info(
+            json.dumps(
+                {
+                    "event": f"{self.operation}.timing",
+                    "status": response.status_code,
+                    "total_ms": round(self.total_ms(), 1),
+                    "stages_ms": {name: round(value, 1) for name, value in self.stages.items()},
+                    "bytes": self.sizes,
+                    **fields,
+                },
+                ensure_ascii=False,
+            )
+        )
+        return response
+
+
+def request_body_size(req: func.HttpRequest) -> Optional[int]:
+    get_body = getattr(req, "get_body", None)
+    if get_body is None:
+        return None
+    try:
+        return len(get_body())
+    except (TypeError, ValueError):
+        return None
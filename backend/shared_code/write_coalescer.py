@@ -0,0 +1,207 @@
+"""Group commit for table inserts.
+
+Concurrent requests on one worker each insert a single entity. With
+coalescing enabled, :class:`WriteCoalescer` buffers the inserts for the same
+connection, table and partition for up to ``flush_interval_ms`` (or until
+``max_batch`` are waiting) and writes them as one table transaction.
+
+``durability`` decides when a request is answered: ``committed`` (default)
+waits for its transaction and receives its own result, ``buffered``
+acknowledges as soon as the entity is queued. Buffered writes are lost if the
+worker stops before the flush, and their failures are only logged.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from shared_code.settings import clean, env_number
+from shared_code.storage import MAX_TRANSACTION_ENTITIES, EntityExistsError, StorageError, TableStore
+from shared_code.timing import StageTimer
+
+DURABILITY_MODES = ("committed", "buffered")
+
+
+@dataclass
+class _Batch:
+    store: TableStore
+    table: str
+    opened_at: float
+    entities: List[Dict[str, Any]] = field(default_factory=list)
+    # One future per committed-mode request; ``None`` for buffered writes.
+    waiters: List[Optional[asyncio.Future]] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class WriteCoalescer:
+    """Coalesces ``create_entity`` calls into per-partition table transactions."""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        flush_interval_ms: float = 5.0,
+        max_batch: int = MAX_TRANSACTION_ENTITIES,
+        durability: str = "committed",
+    ) -> None:
+        self.enabled = enabled
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000
+        self.max_batch = min(MAX_TRANSACTION_ENTITIES, max(1, int(max_batch)))
+        self.durability = durability if durability in DURABILITY_MODES else "committed"
+        self._batches: Dict[Tuple[Any, ...], _Batch] = {}
+        self._flushing: Set[asyncio.Task] = set()
+        self.flushes = 0
+        self.entities = 0
+        self.fallbacks = 0
+        self.failed = 0
+        self.max_flush_size = 0
+        self.total_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "WriteCoalescer":
+        """Read ``<prefix>WriteCoalescing``, ``…WriteFlushMs``, ``…WriteBatchSize`` and ``…WriteDurability``."""
+        enabled = (clean(os.getenv(f"{prefix}WriteCoalescing")) or "").lower() in ("1", "true", "yes", "on")
+        return cls(
+            enabled=enabled,
+            flush_interval_ms=env_number(f"{prefix}WriteFlushMs", 5),
+            max_batch=int(env_number(f"{prefix}WriteBatchSize", MAX_TRANSACTION_ENTITIES)),
+            durability=(clean(os.getenv(f"{prefix}WriteDurability")) or "committed").lower(),
+        )
+
+    @property
+    def acknowledges_early(self) -> bool:
+        return self.enabled and self.durability == "buffered"
+
+    async def create_entity(
+        self,
+        store: TableStore,
+        table: str,
+        entity: Dict[str, Any],
+        timer: Optional[StageTimer] = None,
+    ) -> None:
+        """Insert ``entity`` through the group commit, or directly when coalescing is off.
+
+        In ``committed`` mode this raises the entity's own error, e.g.
+        :class:`~shared_code.storage.EntityExistsError`, even when other
+        entities in its transaction were stored.
+        """
+        if not self.enabled:
+            await store.create_entity(table, entity)
+            return
+
+        loop = asyncio.get_running_loop()
+        key = (loop, store.identity, table, entity["PartitionKey"])
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(store, table, time.perf_counter())
+            batch.timer = loop.call_later(self.flush_interval, self._start_flush, key, batch)
+
+        waiter = loop.create_future() if self.durability == "committed" else None
+        batch.entities.append(dict(entity))
+        batch.waiters.append(waiter)
+        if len(batch.entities) >= self.max_batch:
+            self._start_flush(key, batch)
+
+        if waiter is None:
+            return
+        enqueued = time.perf_counter()
+        try:
+            await waiter
+        finally:
+            if timer is not None:
+                timer.record("write_batch", time.perf_counter() - enqueued)
+
+    def _start_flush(self, key: Tuple[Any, ...], batch: _Batch) -> None:
+        if self._batches.get(key) is not batch:
+            return
+        del self._batches[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = key[0].create_task(self._flush(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, batch: _Batch) -> None:
+        waited = time.perf_counter() - batch.opened_at
+        started = time.perf_counter()
+        # Replaced once the write returns; a cancelled flush fails every request.
+        outcomes: List[Optional[BaseException]] = [StorageError("Write was not flushed.")] * len(batch.entities)
+        try:
+            try:
+                await batch.store.create_entities(batch.table, batch.entities)
+                outcomes = [None] * len(batch.entities)
+            except EntityExistsError as exc:
+                if len(batch.entities) == 1:
+                    outcomes = [exc]
+                else:
+                    # One duplicate aborts the whole transaction; insert one by one so
+                    # every request receives its own outcome. Other failures, such as
+                    # throttling, fail the batch as a whole rather than multiply the load.
+                    self.fallbacks += 1
+                    outcomes = list(
+                        await asyncio.gather(
+                            *(batch.store.create_entity(batch.table, entity) for entity in batch.entities),
+                            return_exceptions=True,
+                        )
+                    )
+            except Exception as exc:
+                outcomes = [exc] * len(batch.entities)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._resolve(batch, outcomes)
+
+        failed = sum(1 for outcome in outcomes if outcome is not None)
+        self.flushes += 1
+        self.entities += len(batch.entities)
+        self.failed += failed
+        self.max_flush_size = max(self.max_flush_size, len(batch.entities))
+        self.total_flush_ms += elapsed * 1000
+        self.max_flush_ms = max(self.max_flush_ms, elapsed * 1000)
+        logging.info(
+            "Table flush: table=%s size=%d failed=%d wait_ms=%.1f commit_ms=%.1f",
+            batch.table, len(batch.entities), failed, waited * 1000, elapsed * 1000,
+        )
+
+    def _resolve(self, batch: _Batch, outcomes: List[Optional[BaseException]]) -> None:
+        for entity, waiter, outcome in zip(batch.entities, batch.waiters, outcomes):
+            if waiter is None:
+                if outcome is not None:
+                    logging.error(
+                        "Buffered write of %s/%s to %s was lost: %s",
+                        entity["PartitionKey"], entity["RowKey"], batch.table, outcome,
+                    )
+            elif waiter.done():
+                continue
+            elif outcome is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(outcome)
+
+    async def drain(self) -> None:
+        """Flush every batch buffered on the running loop and wait for all flushes."""
+        loop = asyncio.get_running_loop()
+        for key, batch in list(self._batches.items()):
+            if key[0] is loop:
+                self._start_flush(key, batch)
+        pending = [task for task in self._flushing if task.get_loop() is loop]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "durability": self.durability,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "max_batch": self.max_batch,
+            "buffered": sum(len(batch.entities) for batch in self._batches.values()),
+            "flushes": self.flushes,
+            "entities": self.entities,
+            "failed": self.failed,
+            "fallbacks": self.fallbacks,
+            "max_flush_size": self.max_flush_size,
+            "avg_flush_size": self.entities / self.flushes if self.flushes else 0.0,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+            "max_flush_ms": self.max_flush_ms,
+        }
@@ -0,0 +1,69 @@
+import copy
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from shared_code import storage  # noqa: E402
+
+# A landlord-side Mask A/B pair that satisfies the bundled contract template.
+MASK_A = {
+    "rolle": "Vermieter",
+    "eigene_name": "A",
+    "eigene_anschrift": "Addr",
+    "eigene_iban": "DE12",
+    "gegenpartei_name": "B",
+    "gegenpartei_anschrift": "Addr B",
+    "objektadresse": "Obj, Berlin",
+    "wohnung_bez": "Unit 1",
+    "wohnflaeche": "50",
+    "bezugsfertig": "2014-01-01",
+    "mietbeginn": "2024-01-01",
+    "grundmiete": "1000",
+    "zustand": "renoviert",
+}
+MASK_B = {
+    "mpb_status": "Bereits vermietet",
+    "mpb_vormiet": "vor dem 1. Juni 2015",
+}
+
+
+class DummyRequest:
+    def __init__(self, body=None, params=None, route_params=None, headers=None):
+        self._body = body
+        self.headers = headers or {}
+        self.params = params or {}
+        self.route_params = route_params or {}
+
+    def get_json(self):
+        return self._body
+
+
+@pytest.fixture
+def mask_a():
+    return copy.deepcopy(MASK_A)
+
+
+@pytest.fixture
+def mask_b():
+    return copy.deepcopy(MASK_B)
+
+
+@pytest.fixture
+def make_request():
+    return DummyRequest
+
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    monkeypatch.setenv("StorageBackend", "memory")
+    monkeypatch.setenv("ContractsBlobConnection", "memory://contracts")
+    monkeypatch.setattr(storage, "_MEMORY_BLOB_STORE", storage.MemoryBlobStore())
+    monkeypatch.setattr(storage, "_MEMORY_TABLE_STORE", storage.MemoryTableStore())
+    queue = storage.MemoryQueueStore()
+    monkeypatch.setattr(storage, "_MEMORY_QUEUE_STORE", queue)
+    return queue
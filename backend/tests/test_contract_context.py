@@ -7,7 +7,17 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from domain.contract_context import ContractContextError, _build_mpb_clause  # noqa: E402
+from benchmarks import fixtures  # noqa: E402
+from domain.contract_context import (  # noqa: E402
+    PLACEHOLDER_DEPENDENCIES,
+    ContractContextError,
+    _build_mpb_clause,
+    affected_placeholders,
+    build_contract_context,
+    build_contract_context_columns,
+    iter_contract_contexts,
+    update_contract_context,
+)
 
 
 def _base_masks():
@@ -53,3 +63,156 @@ def test_build_mpb_clause_rejects_multiple_justifications():
     message = str(excinfo.value)
     assert "Multiple MPB justifications provided" in message
     assert "mpb_vormiete > mpb_modern > mpb_erstmiete" in message
+
+
+def _bad_pairs():
+    missing_rent = fixtures.mask_pair("within-limit")
+    missing_rent[0]["grundmiete"] = ""
+    bad_area = fixtures.mask_pair("within-limit")
+    bad_area[0]["wohnflaeche"] = "groß"
+    return missing_rent, bad_area
+
+
+@pytest.mark.parametrize(
+    "index, field, value, message",
+    [
+        (0, "wohnflaeche", "50,5", "A2.wohnflaeche must be a valid number"),
+        (1, "kuendigungsverzicht", "zwei", "B1.kuendigungsverzicht must be a whole number"),
+    ],
+)
+def test_malformed_numbers_raise_context_errors(index, field, value, message):
+    pair = fixtures.mask_pair("within-limit")
+    pair[index][field] = value
+
+    with pytest.raises(ContractContextError) as excinfo:
+        build_contract_context(*pair)
+
+    assert str(excinfo.value) == message
+
+
+def test_iter_contract_contexts_streams_errors_in_place():
+    good = fixtures.mask_pair("new-build-after-2014")
+    missing_rent, bad_area = _bad_pairs()
+
+    results = list(iter_contract_contexts(iter([good, missing_rent, bad_area, good])))
+
+    assert results[0] == results[3] == build_contract_context(*good)
+    assert isinstance(results[1], ContractContextError)
+    assert "A5.grundmiete is required" in str(results[1])
+    assert isinstance(results[2], ContractContextError)
+    assert results[2].__cause__ is not None
+
+
+def test_build_contract_context_columns_aligns_values_with_rows():
+    pairs = [fixtures.mask_pair(branch) for branch in fixtures.MPB_BRANCHES]
+    pairs.insert(1, _bad_pairs()[0])
+
+    result = build_contract_context_columns(pairs)
+
+    assert result.rows == [0] + list(range(2, len(pairs)))
+    assert list(result.errors) == [1]
+    expected = [build_contract_context(*pairs[row]) for row in result.rows]
+    assert result.columns["MPB_CLAUSE"] == [context["MPB_CLAUSE"] for context in expected]
+    assert set(result.columns) == set(expected[0])
+
+
+# One edit per field the dependency graph knows about, applied to the
+# "over-limit-prior-rent" fixture (tenant side, represented, WEG).
+_MASK_A_EDITS = {
+    "rolle": "Vermieter",
+    "eigene_name": "Neue Verwaltung GmbH",
+    "eigene_anschrift": "Hafenstraße 3, 20095 Hamburg",
+    "gegenpartei_name": "Max Muster",
+    "gegenpartei_anschrift": "Am Markt 9, 04109 Leipzig",
+    "wird_vertreten": "Nein",
+    "vertreten_durch": "RA Neu",
+    "ust_id": "DE999999999",
+    "steuernummer": "12/345/67890",
+    "objektadresse": "Neue Straße 5, 20095 Hamburg",
+    "wohnung_bez": "2. OG rechts",
+    "wohnflaeche": "88.5",
+    "ausstattung": ["Balkon"],
+    "zustand": "renoviert",
+    "schluessel_anzahl": 4,
+    "schluessel_arten": ["Haustür"],
+    "bezugsfertig": "2016-01-01",
+    "mietbeginn": "2027-02-01",
+    "grundmiete": "1234.5",
+    "eigene_iban": "DE02120300000000202051",
+    "weg": "Nein",
+    "mea": "50/1000",
+}
+_MASK_B_EDITS = {
+    "mpb_status": "Neubau (nie vermietet)",
+    "mpb_vormiet": "vor dem 1. Juni 2015",
+    "mpb_grenze": "Ja, unter Grenze",
+    "mpb_vormiete": False,
+    "mpb_vormiete_betrag": "990",
+    "mpb_modern": True,
+    "mpb_modern_text": "Dach 2022",
+    "mpb_erstmiete": "on",
+    "mpb_erstmiete_text": "Kernsanierung",
+    "kuendigungsverzicht": 2,
+    "weg_text": "Neue Teilungserklärung.",
+    "anlagen": ["Hausordnung"],
+}
+
+
+def test_dependency_graph_covers_every_edited_field():
+    graph_fields = set().union(*PLACEHOLDER_DEPENDENCIES.values())
+
+    assert graph_fields == set(_MASK_A_EDITS) | set(_MASK_B_EDITS)
+    assert affected_placeholders({"grundmiete"}) == {"BETRAG", "DATUM"}
+    assert affected_placeholders({"objektadresse"}) == {"OBJEKTADRESSE", "ORT", "DATUM"}
+
+
+@pytest.mark.parametrize("field", sorted({**_MASK_A_EDITS, **_MASK_B_EDITS}))
+def test_update_contract_context_matches_full_rebuild(field):
+    mask_a, mask_b = fixtures.mask_pair("over-limit-prior-rent")
+    previous = build_contract_context(mask_a, mask_b)
+    if field in _MASK_A_EDITS:
+        mask_a = {**mask_a, field: _MASK_A_EDITS[field]}
+    else:
+        mask_b = {**mask_b, field: _MASK_B_EDITS[field]}
+
+    try:
+        expected = build_contract_context(mask_a, mask_b)
+    except ContractContextError as exc:
+        with pytest.raises(ContractContextError) as excinfo:
+            update_contract_context(previous, mask_a, mask_b, {field})
+        assert str(excinfo.value) == str(exc)
+        return
+
+    assert update_contract_context(previous, mask_a, mask_b, {field}) == expected
+
+
+_SHORT_FORM = frozenset({"LANDLORD_NAME", "TENANT_NAME", "BETRAG", "DATUM"})
+
+
+@pytest.mark.parametrize("field", sorted({**_MASK_A_EDITS, **_MASK_B_EDITS}))
+def test_update_contract_context_keeps_a_template_restriction(field):
+    mask_a, mask_b = fixtures.mask_pair("over-limit-prior-rent")
+    # Breaks the MPB cascade, which a context without MPB_CLAUSE never evaluates.
+    mask_b = {**mask_b, "mpb_status": ""}
+    previous = build_contract_context(mask_a, mask_b, _SHORT_FORM)
+    if field in _MASK_A_EDITS:
+        mask_a = {**mask_a, field: _MASK_A_EDITS[field]}
+    elif field != "mpb_status":
+        mask_b = {**mask_b, field: _MASK_B_EDITS[field]}
+
+    updated = update_contract_context(previous, mask_a, mask_b, {field})
+
+    assert updated == build_contract_context(mask_a, mask_b, _SHORT_FORM)
+    assert update_contract_context(previous, mask_a, mask_b, {field}, _SHORT_FORM) == updated
+
+
+def test_build_contract_context_evaluates_only_requested_placeholders():
+    mask_a, mask_b = fixtures.mask_pair("within-limit")
+    # Breaks the MPB cascade, which a template without MPB_CLAUSE never evaluates.
+    mask_b = {**mask_b, "mpb_status": ""}
+
+    with pytest.raises(ContractContextError):
+        build_contract_context(mask_a, mask_b)
+    context = build_contract_context(mask_a, mask_b, {"TENANT_NAME", "BETRAG", "CUSTOM"})
+
+    assert context == {"TENANT_NAME": "Erika Mustermann", "BETRAG": "1.250,00"}
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import contract_job_status  # noqa: E402
+from domain.contract_context import build_contract_context  # noqa: E402
+import generate_contract as gc  # noqa: E402
+import generate_contract_worker as worker  # noqa: E402
+from shared_code import jobs, render_executor, templates  # noqa: E402
+
+TEMPLATE_PATH = str(ROOT / "templates" / "contract-template.docx")
+
+
+@pytest.fixture
+def job_status(make_request):
+    def status(job_id):
+        response = asyncio.run(contract_job_status.main(make_request(route_params={"jobId": job_id})))
+        return response.status_code, json.loads(response.get_body())
+
+    return status
+
+
+def test_async_generation_round_trip(
+    memory_backend, job_status, monkeypatch, make_request, mask_a, mask_b
+):
+    async def forbidden(*args, **kwargs):
+        raise AssertionError("the HTTP front end must not render or upload")
+
+    class ForbiddenExecutor:
+        render = staticmethod(forbidden)
+
+    # The worker keeps its own references to the real executor and upload helper.
+    monkeypatch.setattr(gc, "RENDER_EXECUTOR", ForbiddenExecutor())
+    monkeypatch.setattr(gc, "upload_contract", forbidden)
+    request = make_request(
+        {"maskA": mask_a, "maskB": mask_b, "templatePath": TEMPLATE_PATH}, params={"mode": "async"}
+    )
+
+    response = asyncio.run(gc.main(request))
+
+    assert response.status_code == 202
+    accepted = json.loads(response.get_body())
+    assert accepted["status"] == jobs.QUEUED
+    assert response.headers["Location"] == accepted["statusUrl"]
+    assert job_status(accepted["jobId"])[1]["status"] == jobs.QUEUED
+
+    message = json.loads(memory_backend.receive(jobs.JOBS_QUEUE))
+    assert message["jobId"] == accepted["jobId"]
+    asyncio.run(worker.process_job(message))
+
+    status_code, job = job_status(accepted["jobId"])
+    assert status_code == 200
+    assert job["status"] == jobs.SUCCEEDED
+    assert job["downloadUrl"].startswith("memory://contracts/contract-")
+
+
+def test_worker_fails_job_on_template_errors(memory_backend, job_status):
+    job = asyncio.run(jobs.enqueue_job({"templatePath": TEMPLATE_PATH, "context": {"UNKNOWN": "x"}}))
+    message = json.loads(memory_backend.receive(jobs.JOBS_QUEUE))
+
+    asyncio.run(worker.process_job(message))
+
+    _, body = job_status(job.job_id)
+    assert body["status"] == jobs.FAILED
+    assert "Missing placeholders" in body["message"]
+
+
+@pytest.mark.parametrize("step", ["load_template", "upload_contract"])
+def test_worker_retries_storage_failures_until_last_attempt(
+    memory_backend, job_status, monkeypatch, mask_a, mask_b, step
+):
+    async def failing_storage(*args, **kwargs):
+        raise templates.TemplateStorageError("storage unavailable")
+
+    monkeypatch.setattr(worker, step, failing_storage)
+    monkeypatch.setenv("ContractDeduplication", "false")
+    monkeypatch.setenv("JobMaxAttempts", "2")
+
+    payload = {"templatePath": TEMPLATE_PATH, "context": build_contract_context(mask_a, mask_b)}
+    job = asyncio.run(jobs.enqueue_job(payload))
+    message = json.loads(memory_backend.receive(jobs.JOBS_QUEUE))
+
+    with pytest.raises(templates.TemplateProcessingError):
+        asyncio.run(worker.process_job(message, attempt=1))
+    assert job_status(job.job_id)[1]["status"] == jobs.RUNNING
+
+    asyncio.run(worker.process_job(message, attempt=2))
+    assert job_status(job.job_id)[1]["status"] == jobs.FAILED
+
+
+def test_worker_fails_job_when_last_attempt_hits_a_full_render_queue(
+    memory_backend, job_status, monkeypatch, mask_a, mask_b
+):
+    class FullExecutor:
+        async def render(self, *args, **kwargs):
+            raise render_executor.RenderQueueFull(1)
+
+    monkeypatch.setattr(worker, "RENDER_EXECUTOR", FullExecutor())
+    monkeypatch.setenv("ContractDeduplication", "false")
+    monkeypatch.setenv("JobMaxAttempts", "2")
+
+    payload = {"templatePath": TEMPLATE_PATH, "context": build_contract_context(mask_a, mask_b)}
+    job = asyncio.run(jobs.enqueue_job(payload))
+    message = json.loads(memory_backend.receive(jobs.JOBS_QUEUE))
+
+    with pytest.raises(render_executor.RenderQueueFull):
+        asyncio.run(worker.process_job(message, attempt=1))
+    assert job_status(job.job_id)[1]["status"] == jobs.RUNNING
+
+    with pytest.raises(render_executor.RenderQueueFull):
+        asyncio.run(worker.process_job(message, attempt=2))
+    _, body = job_status(job.job_id)
+    assert body["status"] == jobs.FAILED
+    assert "capacity" in body["message"]
+
+
+def test_short_form_template_uses_only_its_placeholders(
+    memory_backend, job_status, monkeypatch, tmp_path, make_request, mask_a, mask_b
+):
+    from docx import Document
+
+    template = tmp_path / "short.docx"
+    document = Document()
+    document.add_paragraph("[LANDLORD_NAME] vermietet [OBJEKTADRESSE] für [BETRAG] Euro.")
+    document.save(template)
+    body = {"maskA": mask_a, "maskB": mask_b, "templatePath": str(template)}
+
+    # Synchronous: the MPB cascade is never evaluated, so its inputs may be missing.
+    response = asyncio.run(gc.main(make_request({**body, "maskB": {}})))
+    assert response.status_code == 200
+
+    # Async: the same request is accepted and queues only the template's placeholders.
+    response = asyncio.run(gc.main(make_request({**body, "maskB": {}}, params={"mode": "async"})))
+    assert response.status_code == 202
+    accepted = json.loads(response.get_body())
+    message = json.loads(memory_backend.receive(jobs.JOBS_QUEUE))
+    assert set(message["context"]) == {"LANDLORD_NAME", "OBJEKTADRESSE", "BETRAG"}
+    asyncio.run(worker.process_job(message))
+    assert job_status(accepted["jobId"])[1]["status"] == jobs.SUCCEEDED
+
+
+def test_status_of_unknown_job_is_404(memory_backend, job_status):
+    assert job_status("not-a-uuid")[0] == 404
+    assert job_status("6f1c1f9e-0000-4000-8000-000000000000")[0] == 404
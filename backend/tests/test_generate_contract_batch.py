@@ -0,0 +1,98 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import generate_contract_batch as batch  # noqa: E402
+
+TEMPLATE_PATH = str(ROOT / "templates" / "contract-template.docx")
+
+
+def test_batch_reports_per_item_results(memory_backend, monkeypatch, make_request, mask_a, mask_b):
+    uploads = []
+    loads = []
+    original_load = batch.load_template
+
+    async def fake_upload(contract_bytes, connection, container, blob_name=None):
+        uploads.append(contract_bytes)
+        return f"contract-{len(uploads)}.docx", f"https://blob/contract-{len(uploads)}.docx"
+
+    async def counting_load(*args):
+        loads.append(args)
+        return await original_load(*args)
+
+    monkeypatch.setattr(batch, "upload_contract", fake_upload)
+    monkeypatch.setattr(batch, "load_template", counting_load)
+
+    items = [
+        {"maskA": mask_a, "maskB": mask_b},
+        {"maskA": {**mask_a, "rolle": "Unknown"}, "maskB": mask_b},
+        {"maskA": mask_a},
+        {"maskA": {**mask_a, "grundmiete": "1200"}, "maskB": mask_b},
+        {"maskA": {**mask_a, "wohnflaeche": "abc"}, "maskB": mask_b},
+    ]
+    response = asyncio.run(batch.main(make_request({"items": items, "templatePath": TEMPLATE_PATH})))
+
+    assert response.status_code == 200
+    body = json.loads(response.get_body())
+    statuses = [result["status"] for result in body["results"]]
+    assert statuses == [200, 400, 400, 200, 400]
+    assert body["succeeded"] == 2 and body["failed"] == 3
+    assert "A1.rolle" in body["results"][1]["message"]
+    assert body["results"][2]["errors"][0]["loc"] == ["maskB"]
+    assert body["results"][4]["message"] == "A2.wohnflaeche must be a valid number"
+    assert len(uploads) == 2
+    assert len(loads) == 1
+
+
+def test_batch_rejects_oversized_batches(memory_backend, monkeypatch, make_request, mask_a, mask_b):
+    monkeypatch.setenv("BatchMaxItems", "1")
+    items = [{"maskA": mask_a, "maskB": mask_b}] * 2
+
+    response = asyncio.run(batch.main(make_request({"items": items, "templatePath": TEMPLATE_PATH})))
+
+    assert response.status_code == 400
+    assert b"maximum of 1 items" in response.get_body()
+
+
+def test_batch_renders_share_the_admission_limit(memory_backend, monkeypatch, make_request, mask_a, mask_b):
+    class FullExecutor:
+        workers = 2
+
+        async def render(self, *args, **kwargs):
+            raise batch.RenderQueueFull(7)
+
+    monkeypatch.setattr(batch, "RENDER_EXECUTOR", FullExecutor())
+    items = [{"maskA": mask_a, "maskB": mask_b}] * 3
+
+    response = asyncio.run(batch.main(make_request({"items": items, "templatePath": TEMPLATE_PATH})))
+
+    body = json.loads(response.get_body())
+    assert [result["status"] for result in body["results"]] == [503] * 3
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_batch_reuses_existing_contracts_without_rendering(
+    memory_backend, monkeypatch, make_request, mask_a, mask_b
+):
+    items = [{"maskA": mask_a, "maskB": mask_b}, {"maskA": {**mask_a, "grundmiete": "1200"}, "maskB": mask_b}]
+    body = {"items": items, "templatePath": TEMPLATE_PATH}
+    first = json.loads(asyncio.run(batch.main(make_request(body))).get_body())
+
+    class ForbiddenExecutor:
+        workers = 2
+
+        async def render(self, *args, **kwargs):
+            raise AssertionError("a deduplicated item must not be rendered")
+
+    monkeypatch.setattr(batch, "RENDER_EXECUTOR", ForbiddenExecutor())
+    second = json.loads(asyncio.run(batch.main(make_request(body))).get_body())
+
+    assert [result["downloadUrl"] for result in second["results"]] == [
+        result["downloadUrl"] for result in first["results"]
+    ]
+    assert all(result["deduplicated"] for result in second["results"])
@@ -1,8 +1,12 @@
+import asyncio
 import io
+import json
 import os
 import socket
 import subprocess
+import threading
 import time
+import zipfile
 from pathlib import Path
 import sys
 
@@ -16,6 +20,7 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 import generate_contract as gc  # noqa: E402
+from shared_code import contracts, render_executor, rendering, storage, templates  # noqa: E402
 
 
 DEVSTORE_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6jAz=="
@@ -130,7 +135,7 @@ def test_load_template_from_azurite(azurite, sample_docx_bytes):
         pass
     container.upload_blob("contract.docx", sample_docx_bytes, overwrite=True)
 
-    extension, data = gc._load_template("contract.docx", azurite, "templates")
+    extension, data = asyncio.run(templates.load_template("contract.docx", azurite, "templates"))
 
     assert extension == ".docx"
     assert data[:4] == sample_docx_bytes[:4]
@@ -144,8 +149,8 @@ def test_load_template_missing_blob_reports_hint(azurite):
     except ResourceExistsError:
         pass
 
-    with pytest.raises(gc.TemplateProcessingError) as excinfo:
-        gc._load_template("missing.docx", azurite, "templates")
+    with pytest.raises(templates.TemplateProcessingError) as excinfo:
+        asyncio.run(templates.load_template("missing.docx", azurite, "templates"))
 
     message = str(excinfo.value)
     assert "Template blob 'missing.docx'" in message
@@ -153,15 +158,15 @@ def test_load_template_missing_blob_reports_hint(azurite):
 
 
 def test_render_docx_template(sample_docx_bytes):
-    rendered = gc._render_docx_template(sample_docx_bytes, {"NAME": "Alice"})
+    rendered = rendering.render_docx_template(sample_docx_bytes, {"NAME": "Alice"})
 
     doc = Document(io.BytesIO(rendered))
     assert any("Alice" in paragraph.text for paragraph in doc.paragraphs)
 
 
 def test_render_docx_template_reports_unused_placeholders(sample_docx_bytes):
-    with pytest.raises(gc.TemplateProcessingError) as excinfo:
-        gc._render_docx_template(sample_docx_bytes, {"NAME": "Alice", "EXTRA": "value"})
+    with pytest.raises(templates.TemplateProcessingError) as excinfo:
+        rendering.render_docx_template(sample_docx_bytes, {"NAME": "Alice", "EXTRA": "value"})
 
     assert "Unexpected placeholders not in template" in str(excinfo.value)
 
@@ -172,14 +177,14 @@ def test_render_docx_template_reports_missing_placeholders():
     buffer = io.BytesIO()
     doc.save(buffer)
 
-    with pytest.raises(gc.TemplateProcessingError) as excinfo:
-        gc._render_docx_template(buffer.getvalue(), {"NAME": "Alice"})
+    with pytest.raises(templates.TemplateProcessingError) as excinfo:
+        rendering.render_docx_template(buffer.getvalue(), {"NAME": "Alice"})
 
     assert "Missing placeholders in context: DATE" in str(excinfo.value)
 
 
 def test_upload_contract_to_azurite(azurite, sample_docx_bytes):
-    blob_name, url = gc._upload_contract(sample_docx_bytes, azurite, "contracts")
+    blob_name, url = asyncio.run(contracts.upload_contract(sample_docx_bytes, azurite, "contracts"))
 
     service = BlobServiceClient.from_connection_string(azurite)
     blob_client = service.get_container_client("contracts").get_blob_client(blob_name)
@@ -191,13 +196,536 @@ def test_upload_contract_to_azurite(azurite, sample_docx_bytes):
 
 def test_upload_contract_bad_connection_reports_hint(monkeypatch, sample_docx_bytes):
     def raise_error(_conn):
-        raise gc.AzureError("boom")
+        raise storage.AzureError("boom")
 
-    monkeypatch.setattr(gc.BlobServiceClient, "from_connection_string", raise_error)
+    monkeypatch.delenv("StorageBackend", raising=False)
+    monkeypatch.setattr(storage.BlobServiceClient, "from_connection_string", raise_error)
+    monkeypatch.setattr(storage, "_AZURE_BLOB_STORES", {})
 
-    with pytest.raises(gc.TemplateProcessingError) as excinfo:
-        gc._upload_contract(sample_docx_bytes, "AccountEndpoint=https://example.blob.core.windows.net/", "contracts")
+    with pytest.raises(templates.TemplateProcessingError) as excinfo:
+        asyncio.run(
+            contracts.upload_contract(
+                sample_docx_bytes, "AccountEndpoint=https://example.blob.core.windows.net/", "contracts"
+            )
+        )
 
     message = str(excinfo.value)
     assert "Failed to upload generated contract" in message
     assert "ContractsContainer" in message
+
+
+class _FakeDownloader:
+    def __init__(self, data, etag):
+        self._data = data
+        self.properties = type("Props", (), {"etag": etag})()
+
+    async def readall(self):
+        return self._data
+
+
+class _FakeTemplateBlob:
+    def __init__(self, store, calls):
+        self._store = store
+        self._calls = calls
+
+    async def download_blob(self, etag=None, match_condition=None):
+        self._calls.append(etag)
+        data, current_etag = self._store["blob"]
+        if etag is not None and etag == current_etag:
+            raise storage.HttpResponseError(
+                message="not modified", response=type("Resp", (), {"status_code": 304, "reason": None, "headers": {}})()
+            )
+        return _FakeDownloader(data, current_etag)
+
+
+@pytest.fixture
+def fake_template_blob(monkeypatch, sample_docx_bytes):
+    store = {"blob": (sample_docx_bytes, '"etag-1"')}
+    calls: list = []
+
+    class FakeService:
+        def get_blob_client(self, container, blob):
+            return _FakeTemplateBlob(store, calls)
+
+    monkeypatch.delenv("StorageBackend", raising=False)
+    monkeypatch.setattr(storage.BlobServiceClient, "from_connection_string", lambda _conn: FakeService())
+    monkeypatch.setattr(storage, "_AZURE_BLOB_STORES", {})
+    return store, calls
+
+
+def test_load_template_serves_fresh_cache_without_storage_calls(monkeypatch, fake_template_blob):
+    _, calls = fake_template_blob
+    cache = templates.TemplateCache(max_entries=2, ttl_seconds=300)
+    monkeypatch.setattr(templates, "TEMPLATE_CACHE", cache)
+
+    first = asyncio.run(templates.load_template("contract.docx", "conn", "templates"))
+    second = asyncio.run(templates.load_template("contract.docx", "conn", "templates"))
+
+    assert first == second
+    assert calls == [None]
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_load_template_revalidates_stale_entry_with_etag(monkeypatch, fake_template_blob):
+    store, calls = fake_template_blob
+    cache = templates.TemplateCache(max_entries=2, ttl_seconds=0)
+    monkeypatch.setattr(templates, "TEMPLATE_CACHE", cache)
+
+    asyncio.run(templates.load_template("contract.docx", "conn", "templates"))
+    asyncio.run(templates.load_template("contract.docx", "conn", "templates"))
+    store["blob"] = (b"changed", '"etag-2"')
+    _, data = asyncio.run(templates.load_template("contract.docx", "conn", "templates"))
+
+    assert data == b"changed"
+    assert calls == [None, '"etag-1"', '"etag-1"']
+    assert cache.hits == 1
+    assert cache.misses == 2
+
+
+def test_template_cache_evicts_least_recently_used(monkeypatch, fake_template_blob):
+    cache = templates.TemplateCache(max_entries=1, ttl_seconds=300)
+    monkeypatch.setattr(templates, "TEMPLATE_CACHE", cache)
+
+    asyncio.run(templates.load_template("a.docx", "conn", "templates"))
+    asyncio.run(templates.load_template("b.docx", "conn", "templates"))
+
+    assert cache.evictions == 1
+    assert cache.get(("conn", "templates", "a.docx")) is None
+
+
+def test_compiled_template_indexes_placeholder_runs():
+    doc = Document()
+    doc.add_paragraph("Intro")
+    doc.add_paragraph("Hello [NAME]")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).merge(table.cell(0, 1)).paragraphs[0].add_run("Due [DATE]")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+
+    compiled = rendering.CompiledDocxTemplate(buffer.getvalue())
+
+    assert compiled.placeholders == {"NAME", "DATE"}
+    assert [(loc.node, loc.keys) for loc in compiled.locations] == [
+        (1, ("NAME",)),
+        (2, ("DATE",)),
+    ]
+    assert all(loc.part == "/word/document.xml" for loc in compiled.locations)
+
+
+def test_compiled_template_patches_headers_footers_and_nested_tables():
+    doc = Document()
+    section = doc.sections[0]
+    section.header.paragraphs[0].text = "Ref [REF]"
+    section.footer.paragraphs[0].text = "Page for [NAME]"
+    outer = doc.add_table(rows=1, cols=2)
+    outer.cell(0, 0).merge(outer.cell(0, 1)).paragraphs[0].add_run("Tenant [NAME]")
+    outer.cell(0, 0).add_table(rows=1, cols=1).cell(0, 0).paragraphs[0].add_run("Notes: [NOTES]")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+
+    compiled = rendering.CompiledDocxTemplate(buffer.getvalue())
+    context = {"REF": "A-1", "NAME": "Alice", "NOTES": "first\nsecond"}
+
+    assert compiled.placeholders == {"REF", "NAME", "NOTES"}
+    assert len(compiled.locations) == 4
+    for mode in ("zip", "package"):
+        rendered = Document(io.BytesIO(compiled.render(context, mode=mode)))
+        section = rendered.sections[0]
+        cell = rendered.tables[0].cell(0, 0)
+        assert section.header.paragraphs[0].text == "Ref A-1"
+        assert section.footer.paragraphs[0].text == "Page for Alice"
+        assert cell.paragraphs[0].text == "Tenant Alice"
+        assert cell.tables[0].cell(0, 0).paragraphs[0].text == "Notes: first\nsecond"
+
+
+def test_compiled_template_renders_without_mutating_source(sample_docx_bytes):
+    compiled = rendering.compile_docx_template(sample_docx_bytes)
+
+    first = Document(io.BytesIO(compiled.render({"NAME": "Alice"})))
+    second = Document(io.BytesIO(compiled.render({"NAME": "Bob"})))
+
+    assert first.paragraphs[0].text == "Hello Alice"
+    assert second.paragraphs[0].text == "Hello Bob"
+    assert rendering.compile_docx_template(sample_docx_bytes) is compiled
+
+
+def test_apply_placeholders_replaces_all_markers_in_one_pass():
+    class FakeRun:
+        def __init__(self, text):
+            self.text = text
+
+    runs = [FakeRun("[A] and [B] and [UNKNOWN]"), FakeRun("plain")]
+    used: set[str] = set()
+
+    rendering._apply_placeholders_to_runs(runs, {"A": "[B]", "B": "two"}, used)
+
+    assert runs[0].text == "[B] and two and [UNKNOWN]"
+    assert runs[1].text == "plain"
+    assert used == {"A", "B"}
+
+
+def test_zip_render_copies_untouched_members_raw(sample_docx_bytes):
+    compiled = rendering.CompiledDocxTemplate(sample_docx_bytes)
+
+    rendered = compiled.render({"NAME": "Alice"}, mode="zip")
+
+    with zipfile.ZipFile(io.BytesIO(sample_docx_bytes)) as source, zipfile.ZipFile(
+        io.BytesIO(rendered)
+    ) as output:
+        assert output.testzip() is None
+        assert output.namelist() == source.namelist()
+        for info in source.infolist():
+            if info.filename == "word/document.xml":
+                continue
+            copied = output.getinfo(info.filename)
+            assert (copied.CRC, copied.compress_size) == (info.CRC, info.compress_size)
+            assert rendering._raw_member_data(memoryview(rendered), copied) == rendering._raw_member_data(
+                memoryview(sample_docx_bytes), info
+            )
+
+    assert Document(io.BytesIO(rendered)).paragraphs[0].text == "Hello Alice"
+
+
+def test_zip_and_package_render_modes_agree(sample_docx_bytes):
+    compiled = rendering.CompiledDocxTemplate(sample_docx_bytes)
+
+    zipped = Document(io.BytesIO(compiled.render({"NAME": "Alice"}, mode="zip")))
+    packaged = Document(io.BytesIO(compiled.render({"NAME": "Alice"}, mode="package")))
+
+    assert [p.text for p in zipped.paragraphs] == [p.text for p in packaged.paragraphs]
+
+
+@pytest.mark.parametrize("mode", ["zip", "package"])
+def test_render_to_writes_the_same_bytes_as_render(sample_docx_bytes, mode):
+    compiled = rendering.CompiledDocxTemplate(sample_docx_bytes)
+    out = io.BytesIO()
+
+    compiled.render_to({"NAME": "Alice"}, out, mode=mode)
+
+    assert out.getvalue() == compiled.render({"NAME": "Alice"}, mode=mode)
+
+
+def test_render_to_buffer_spools_large_contracts_to_disk(monkeypatch, sample_docx_bytes):
+    monkeypatch.setenv("RenderSpoolThresholdBytes", "64")
+
+    with rendering.render_to_buffer(".docx", sample_docx_bytes, {"NAME": "Alice"}) as buffer:
+        assert buffer._rolled
+        assert buffer.tell() == 0
+        assert Document(buffer).paragraphs[0].text == "Hello Alice"
+
+
+def test_main_overlaps_template_load_with_validation(monkeypatch, tmp_path, sample_docx_bytes, make_request):
+    template = tmp_path / "contract.docx"
+    doc = Document()
+    doc.add_paragraph("[LANDLORD_NAME] / [TENANT_NAME]")
+    doc.save(template)
+    events = []
+    original_load = templates.load_template
+
+    async def tracking_load(*args):
+        events.append("load-start")
+        return await original_load(*args)
+
+    def tracking_build(mask_a, mask_b, placeholders=None):
+        events.append("context")
+        assert placeholders == {"LANDLORD_NAME", "TENANT_NAME"}
+        return {"LANDLORD_NAME": mask_a["eigene_name"], "TENANT_NAME": mask_a["gegenpartei_name"]}
+
+    async def fake_upload(contract_bytes, connection, container, blob_name=None):
+        events.append("upload")
+        return blob_name, f"https://blob/{blob_name}"
+
+    async def no_existing_contract(*args):
+        return None
+
+    monkeypatch.setattr(gc, "find_existing_contract", no_existing_contract)
+    monkeypatch.setattr(gc, "load_template", tracking_load)
+    monkeypatch.setattr(gc, "build_contract_context", tracking_build)
+    monkeypatch.setattr(gc, "upload_contract", fake_upload)
+
+    body = {
+        "maskA": {"eigene_name": "A", "gegenpartei_name": "B"},
+        "maskB": {},
+        "templatePath": str(template),
+    }
+    response = asyncio.run(gc.main(make_request(body)))
+
+    assert response.status_code == 200
+    assert events == ["load-start", "context", "upload"]
+
+
+def test_main_validation_error_discards_template_load(monkeypatch, make_request):
+    cancelled = []
+
+    async def slow_load(*args):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    monkeypatch.setattr(gc, "load_template", slow_load)
+
+    response = asyncio.run(gc.main(make_request({"maskA": {}, "templatePath": "x.docx"})))
+
+    assert response.status_code == 400
+    assert cancelled == [True]
+
+
+class _FakeUploadService:
+    def __init__(self):
+        self.calls = []
+        self.container_exists = True
+
+    def get_container_client(self, container):
+        service = self
+
+        class ContainerClient:
+            def get_blob_client(self, blob_name):
+                class BlobClient:
+                    url = f"https://blob/{container}/{blob_name}"
+
+                    async def upload_blob(self, data, **kwargs):
+                        service.calls.append("upload")
+                        missing = not service.container_exists
+                        # Let concurrent uploads interleave like real requests.
+                        await asyncio.sleep(0)
+                        if missing:
+                            raise storage.HttpResponseError(
+                                message="container gone",
+                                response=type("Resp", (), {"status_code": 404, "reason": None, "headers": {}})(),
+                            )
+
+                return BlobClient()
+
+        return ContainerClient()
+
+    async def create_container(self, container):
+        self.calls.append("create")
+        if self.container_exists:
+            raise ResourceExistsError("container exists")
+        self.container_exists = True
+
+    async def close(self):
+        self.calls.append("close")
+
+
+@pytest.fixture
+def fake_upload_service(monkeypatch):
+    service = _FakeUploadService()
+    created = []
+
+    def from_connection_string(_conn):
+        created.append(_conn)
+        return service
+
+    monkeypatch.delenv("StorageBackend", raising=False)
+    monkeypatch.setattr(storage.BlobServiceClient, "from_connection_string", from_connection_string)
+    monkeypatch.setattr(storage, "_AZURE_BLOB_STORES", {})
+    return service, created
+
+
+def test_upload_contract_reuses_client_without_container_checks(fake_upload_service, sample_docx_bytes):
+    service, created = fake_upload_service
+
+    async def upload_twice():
+        await contracts.upload_contract(sample_docx_bytes, "conn", "contracts")
+        await contracts.upload_contract(sample_docx_bytes, "conn", "contracts")
+
+    asyncio.run(upload_twice())
+
+    assert created == ["conn"]
+    assert service.calls == ["upload", "upload"]
+
+
+def test_upload_contract_recreates_missing_container_on_404(fake_upload_service, sample_docx_bytes):
+    service, _ = fake_upload_service
+    service.container_exists = False
+
+    blob_name, url = asyncio.run(contracts.upload_contract(sample_docx_bytes, "conn", "contracts"))
+
+    assert service.calls == ["upload", "create", "upload"]
+    assert url.endswith(blob_name)
+
+
+def test_concurrent_first_uploads_both_create_the_container(fake_upload_service, sample_docx_bytes):
+    service, _ = fake_upload_service
+    service.container_exists = False
+
+    async def upload_concurrently():
+        return await asyncio.gather(
+            *(contracts.upload_contract(sample_docx_bytes, "conn", "contracts") for _ in range(2))
+        )
+
+    results = asyncio.run(upload_concurrently())
+
+    assert len({blob_name for blob_name, _ in results}) == 2
+    assert service.calls.count("create") == 2
+
+
+def test_pooled_store_from_a_finished_loop_is_closed_when_replaced(fake_upload_service):
+    service, created = fake_upload_service
+
+    async def get_store():
+        store = storage.get_blob_store("conn")
+        # Let the close of a replaced store run.
+        await asyncio.sleep(0)
+        return store
+
+    first = asyncio.run(get_store())
+    second = asyncio.run(get_store())
+
+    assert first is not second
+    assert created == ["conn", "conn"]
+    assert service.calls == ["close"]
+
+
+def test_render_is_byte_deterministic(sample_docx_bytes):
+    compiled = rendering.CompiledDocxTemplate(sample_docx_bytes)
+
+    outputs = [
+        compiled.render({"NAME": "Alice"}, mode="package"),
+        rendering.render_html_template(b"<p>[A]</p>", {"A": "x"}),
+    ]
+
+    assert compiled.render({"NAME": "Alice"}, mode="zip") == compiled.render({"NAME": "Alice"}, mode="zip")
+    for rendered in outputs:
+        with zipfile.ZipFile(io.BytesIO(rendered)) as package:
+            assert {info.date_time for info in package.infolist()} == {rendering._FIXED_ZIP_DATE_TIME}
+
+
+def test_contract_fingerprint_tracks_context_and_template(sample_docx_bytes):
+    base = contracts.contract_fingerprint(".docx", sample_docx_bytes, {"NAME": "Alice", "B": "1"})
+
+    assert base == contracts.contract_fingerprint(".docx", sample_docx_bytes, {"B": "1", "NAME": "Alice"})
+    assert base != contracts.contract_fingerprint(".docx", sample_docx_bytes, {"NAME": "Bob", "B": "1"})
+    assert base != contracts.contract_fingerprint(".docx", sample_docx_bytes + b" ", {"NAME": "Alice", "B": "1"})
+
+
+def test_main_returns_existing_contract_without_rendering(monkeypatch, tmp_path, sample_docx_bytes, make_request):
+    template = tmp_path / "contract.docx"
+    template.write_bytes(sample_docx_bytes)
+    seen = []
+
+    async def existing_contract(blob_name, connection, container):
+        seen.append(blob_name)
+        return f"https://blob/{blob_name}"
+
+    def fail_render(*args):
+        raise AssertionError("render should be skipped")
+
+    monkeypatch.setattr(gc, "build_contract_context", lambda a, b, placeholders=None: {"NAME": a["name"]})
+    monkeypatch.setattr(gc, "find_existing_contract", existing_contract)
+    monkeypatch.setattr(render_executor, "render_to_buffer", fail_render)
+
+    body = {"maskA": {"name": "Alice"}, "maskB": {}, "templatePath": str(template)}
+    first = json.loads(asyncio.run(gc.main(make_request(body))).get_body())
+    second = json.loads(asyncio.run(gc.main(make_request(body))).get_body())
+
+    assert first == second
+    assert first["deduplicated"] is True
+    assert seen[0] == seen[1]
+    assert seen[0].startswith("contract-") and len(seen[0]) == len("contract-") + 64 + len(".docx")
+
+
+def test_render_executor_rejects_when_queue_is_full(monkeypatch):
+    release = threading.Event()
+
+    def blocking_render(extension, template_bytes, context, out):
+        release.wait(5)
+        out.write(b"rendered")
+
+    monkeypatch.setattr(rendering, "render_template_to", blocking_render)
+    executor = render_executor.RenderExecutor(kind="thread", workers=1, queue_limit=2, retry_after=7)
+
+    async def scenario():
+        first = asyncio.create_task(executor.render(".docx", b"", {}))
+        second = asyncio.create_task(executor.render(".docx", b"", {}))
+        await asyncio.sleep(0.05)
+        with pytest.raises(render_executor.RenderQueueFull) as excinfo:
+            await executor.render(".docx", b"", {})
+        assert excinfo.value.retry_after == 7
+        assert executor.queue_depth() == 1
+        release.set()
+        return [buffer.read() for buffer in await asyncio.gather(first, second)]
+
+    assert asyncio.run(scenario()) == [b"rendered", b"rendered"]
+    stats = executor.stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["max_queue_depth"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_render_executor_holds_the_slot_of_a_cancelled_render_until_it_finishes(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_render(extension, template_bytes, context, out):
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(rendering, "render_template_to", blocking_render)
+    executor = render_executor.RenderExecutor(kind="thread", workers=1, queue_limit=1)
+
+    async def scenario():
+        task = asyncio.create_task(executor.render(".docx", b"", {}))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(render_executor.RenderQueueFull):
+            await executor.render(".docx", b"", {})
+
+    asyncio.run(scenario())
+    assert executor.stats()["in_flight"] == 1
+    release.set()
+    executor._pool.shutdown(wait=True)
+    assert executor.stats()["in_flight"] == 0
+def test_main_answers_503_with_retry_after_when_render_queue_full(monkeypatch, tmp_path, sample_docx_bytes, make_request):
+    template = tmp_path / "contract.docx"
+    template.write_bytes(sample_docx_bytes)
+
+    class FullExecutor:
+        async def render(self, *args, **kwargs):
+            raise render_executor.RenderQueueFull(3)
+
+    monkeypatch.setenv("ContractDeduplication", "false")
+    monkeypatch.setattr(gc, "build_contract_context", lambda a, b, placeholders=None: {"NAME": "Alice"})
+    monkeypatch.setattr(gc, "RENDER_EXECUTOR", FullExecutor())
+
+    body = {"maskA": {}, "maskB": {}, "templatePath": str(template)}
+    response = asyncio.run(gc.main(make_request(body)))
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+
+def test_main_reports_stage_timings(monkeypatch, tmp_path, sample_docx_bytes, caplog, make_request):
+    template = tmp_path / "contract.docx"
+    template.write_bytes(sample_docx_bytes)
+
+    async def fake_upload(contract_bytes, connection, container, blob_name=None):
+        return "contract.docx", "https://blob/contract.docx"
+
+    monkeypatch.setenv("ContractDeduplication", "false")
+    monkeypatch.setattr(gc, "build_contract_context", lambda a, b, placeholders=None: {"NAME": "Alice"})
+    monkeypatch.setattr(gc, "upload_contract", fake_upload)
+
+    body = {"maskA": {}, "maskB": {}, "templatePath": str(template)}
+    with caplog.at_level("INFO"):
+        response = asyncio.run(gc.main(make_request(body)))
+
+    assert response.status_code == 200
+    server_timing = response.headers["Server-Timing"]
+    for stage in ("parse", "validate", "compile", "context", "template", "render", "upload", "total"):
+        assert f"{stage};dur=" in server_timing
+
+    timing_logs = [
+        json.loads(record.getMessage())
+        for record in caplog.records
+        if record.getMessage().startswith('{"event": "generate_contract.timing"')
+    ]
+    assert len(timing_logs) == 1
+    assert timing_logs[0]["status"] == 200
+    assert timing_logs[0]["bytes"]["template"] == len(sample_docx_bytes)
+    assert timing_logs[0]["bytes"]["contract"] > 0
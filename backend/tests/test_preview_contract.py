@@ -0,0 +1,93 @@
+import asyncio
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from docx import Document
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import generate_contract as gc  # noqa: E402
+import preview_contract as preview  # noqa: E402
+from domain.contract_context import build_contract_context  # noqa: E402
+from shared_code import rendering  # noqa: E402
+
+TEMPLATE_PATH = str(ROOT / "templates" / "contract-template.docx")
+
+
+@pytest.fixture
+def run_preview(make_request):
+    return lambda body: asyncio.run(preview.main(make_request(body)))
+
+
+def test_preview_matches_rendered_contract_text(monkeypatch, run_preview, mask_a, mask_b):
+    mask_a["gegenpartei_name"] = "B <Mieter>"
+
+    async def no_upload(*args, **kwargs):
+        raise AssertionError("preview must not write to storage")
+
+    monkeypatch.setattr(gc, "upload_contract", no_upload)
+
+    response = run_preview({"maskA": mask_a, "maskB": mask_b, "templatePath": TEMPLATE_PATH, "format": "json"})
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "preview;dur=" in response.headers["Server-Timing"]
+    sections = json.loads(response.get_body())["sections"]
+
+    context = build_contract_context(mask_a, mask_b)
+    template_bytes = Path(TEMPLATE_PATH).read_bytes()
+    rendered = Document(io.BytesIO(rendering.render_docx_template(template_bytes, context)))
+    expected = [p.text for p in rendered.paragraphs if p.text.strip()]
+
+    assert [section["text"] for section in sections] == expected
+
+
+def test_preview_html_escapes_values_and_keeps_structure(tmp_path):
+    doc = Document()
+    doc.add_heading("Mietvertrag [VERTRAGSART]", level=1)
+    doc.add_paragraph("Mieter: [MIETER_NAME]")
+    table = doc.add_table(rows=1, cols=3)
+    table.cell(0, 0).merge(table.cell(0, 1)).text = "Miete [GRUNDMIETE]"
+    table.cell(0, 2).text = "EUR"
+    template = tmp_path / "preview.docx"
+    doc.save(template)
+
+    compiled = rendering.CompiledDocxTemplate(template.read_bytes())
+    context = {key: f"<{key.lower()}>" for key in compiled.placeholders}
+    sections = compiled.preview(context)
+
+    assert [section.kind for section in sections] == ["heading", "paragraph", "table"]
+    assert sections[2].rows == (("Miete <grundmiete>", "EUR"),)
+    html = preview._preview_html(sections)
+    assert html.startswith("<h1>Mietvertrag &lt;vertragsart&gt;</h1>")
+    assert "<tr><td>Miete &lt;grundmiete&gt;</td><td>EUR</td></tr>" in html
+
+
+def test_preview_reports_context_errors(run_preview):
+    response = run_preview({"maskA": {}, "maskB": {}, "templatePath": TEMPLATE_PATH})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "mask, field, value",
+    [("maskA", "wohnflaeche", "50,5"), ("maskB", "kuendigungsverzicht", "zwei")],
+)
+def test_preview_reports_malformed_numbers(run_preview, mask_a, mask_b, mask, field, value):
+    masks = {"maskA": mask_a, "maskB": mask_b}
+    masks[mask][field] = value
+    response = run_preview({**masks, "templatePath": TEMPLATE_PATH})
+
+    assert response.status_code == 400
+    assert field in json.loads(response.get_body())["message"]
+
+
+def test_preview_rejects_unknown_format(run_preview, mask_a, mask_b):
+    response = run_preview({"maskA": mask_a, "maskB": mask_b, "templatePath": TEMPLATE_PATH, "format": "pdf"})
+
+    assert response.status_code == 400
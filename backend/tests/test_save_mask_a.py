@@ -1,16 +1,30 @@
 import asyncio
 import json
 import sys
-from datetime import datetime
+import zlib
+from datetime import date, datetime
 from pathlib import Path
 
-ROOT = Path(__file__).resolve().parents[2]
-if str(ROOT) not in sys.path:
-    sys.path.insert(0, str(ROOT))
+import pytest
 
-from azure.core.exceptions import HttpResponseError
+ROOT = Path(__file__).resolve().parents[2]
+for path in (ROOT, ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
 
 from backend.save_mask_a import main
+from shared_code import storage
+from shared_code.mask_a import (
+    MAX_PARTITION_BUCKETS,
+    day_partitions,
+    decode_payload,
+    encode_payload,
+    get_mask_a,
+    list_mask_a,
+    partition_buckets,
+    partition_key,
+)
+from shared_code.storage import MemoryTableStore, StorageError
 
 
 VALID_PAYLOAD = {
@@ -36,46 +50,15 @@ VALID_PAYLOAD = {
 }
 
 
-class DummyRequest:
-    def __init__(self, body, headers=None):
-        self._body = body
-        self.headers = headers or {}
-
-    def get_json(self):
-        return self._body
-
-
-class FakeTableClient:
-    def __init__(self):
-        self.entities = []
-
-    def create_entity(self, entity):
-        self.entities.append(entity)
-
-
-class FakeTableService:
-    def __init__(self, client):
-        self.client = client
-        self.created_tables = []
-
-    def create_table_if_not_exists(self, table_name):
-        self.created_tables.append(table_name)
-
-    def get_table_client(self, table_name):
-        assert table_name in self.created_tables
-        return self.client
-
-
-def test_successful_write(monkeypatch):
-    table_client = FakeTableClient()
-    table_service = FakeTableService(table_client)
-    monkeypatch.setattr("backend.save_mask_a._get_table_client", lambda: table_service)
+def test_successful_write(monkeypatch, make_request):
+    table_store = MemoryTableStore()
+    monkeypatch.setattr("backend.save_mask_a.get_mask_a_store", lambda: table_store)
 
     headers = {
         "x-forwarded-for": "203.0.113.1",
         "user-agent": "pytest-agent",
     }
-    request = DummyRequest({**VALID_PAYLOAD, "wohnung_bez": None}, headers=headers)
+    request = make_request({**VALID_PAYLOAD, "wohnung_bez": None}, headers=headers)
 
     response = asyncio.run(main(request))
 
@@ -84,34 +67,200 @@ def test_successful_write(monkeypatch):
     datetime.fromisoformat(response_body["payload"]["created_at"])
     datetime.fromisoformat(response_body["payload"]["updated_at"])
     assert response_body["payload"]["caller_metadata"]["source_ip"] == "203.0.113.1"
-    assert table_client.entities, "Entity should be written"
+    entities = list(table_store.tables["MaskAInput"].values())
+    assert entities, "Entity should be written"
+    assert entities[0]["RowKey"] == response_body["rowKey"]
+
+    assert entities[0]["payload_format"] == 2
+    assert decode_payload(entities[0]) == response_body["payload"]
+    assert b"pytest-agent" not in zlib.decompress(entities[0]["payload"])
 
-    stored_payload = json.loads(table_client.entities[0]["payload"])
-    assert stored_payload["created_at"] == response_body["payload"]["created_at"]
-    assert stored_payload["caller_metadata"]["user_agent"] == "pytest-agent"
+    server_timing = response.headers["Server-Timing"]
+    for stage in ("legacy_merge", "validate", "table_setup", "create_entity", "total"):
+        assert f"{stage};dur=" in server_timing
 
 
-def test_rejects_unexpected_fields(monkeypatch):
-    table_service = FakeTableService(FakeTableClient())
-    monkeypatch.setattr("backend.save_mask_a._get_table_client", lambda: table_service)
+def test_rejects_unexpected_fields(monkeypatch, make_request):
+    table_store = MemoryTableStore()
+    monkeypatch.setattr("backend.save_mask_a.get_mask_a_store", lambda: table_store)
 
-    request = DummyRequest({**VALID_PAYLOAD, "unexpected": "value"})
+    request = make_request({**VALID_PAYLOAD, "unexpected": "value"})
     response = asyncio.run(main(request))
 
     assert response.status_code == 400
     assert b"Extra inputs are not permitted" in response.get_body()
 
 
-def test_handles_storage_errors(monkeypatch):
-    class FailingClient(FakeTableClient):
-        def create_entity(self, entity):
-            raise HttpResponseError(message="boom")
+def test_handles_storage_errors(monkeypatch, make_request):
+    class FailingStore(MemoryTableStore):
+        async def create_entity(self, table, entity):
+            raise StorageError("boom")
 
-    failing_service = FakeTableService(FailingClient())
-    monkeypatch.setattr("backend.save_mask_a._get_table_client", lambda: failing_service)
+    monkeypatch.setattr("backend.save_mask_a.get_mask_a_store", FailingStore)
 
-    request = DummyRequest(VALID_PAYLOAD)
+    request = make_request(VALID_PAYLOAD)
     response = asyncio.run(main(request))
 
     assert response.status_code == 500
     assert b"Failed to persist payload" in response.get_body()
+
+
+def test_requires_connection_for_azure_backend(monkeypatch, make_request):
+    monkeypatch.delenv("MaskAInput", raising=False)
+    monkeypatch.setenv("StorageBackend", "azure")
+
+    response = asyncio.run(main(make_request(VALID_PAYLOAD)))
+
+    assert response.status_code == 500
+    assert b"Failed to persist payload" in response.get_body()
+
+
+def test_filesystem_backend_persists_entity(monkeypatch, tmp_path, make_request):
+    monkeypatch.delenv("MaskAInput", raising=False)
+    monkeypatch.setenv("StorageBackend", "filesystem")
+    monkeypatch.setenv("StorageRoot", str(tmp_path))
+
+    response = asyncio.run(main(make_request(VALID_PAYLOAD)))
+
+    assert response.status_code == 201
+    body = json.loads(response.get_body().decode())
+    stored = tmp_path / "tables" / "MaskAInput" / body["partitionKey"] / f"{body['rowKey']}.json"
+    assert json.loads(stored.read_text(encoding="utf-8"))["RowKey"] == body["rowKey"]
+    store = storage.FileSystemTableStore(tmp_path)
+    assert asyncio.run(get_mask_a(store, body["partitionKey"], body["rowKey"])) == body["payload"]
+
+
+def test_payload_formats_round_trip_and_chunk_large_payloads():
+    enriched = {
+        **VALID_PAYLOAD,
+        # Random-looking text that barely compresses, so it spans several chunks.
+        "ausstattung": "".join(f"{index * 7919 % 104729:x}" for index in range(40000)),
+        "created_at": "2024-05-01T10:00:00+00:00",
+        "updated_at": "2024-05-01T10:00:00+00:00",
+        "caller_metadata": {"source_ip": "203.0.113.1"},
+    }
+    columns = {"created_at": enriched["created_at"], "updated_at": enriched["updated_at"], "source_ip": "203.0.113.1"}
+
+    legacy = {**encode_payload(enriched, fmt=1), **columns}
+    compact = {**encode_payload(enriched, fmt=2), **columns}
+
+    assert "payload_format" not in legacy
+    assert compact["payload_chunks"] > 1
+    chunks = [compact["payload"]] + [compact[f"payload_{index}"] for index in range(1, compact["payload_chunks"])]
+    assert all(len(chunk) <= 64 * 1024 for chunk in chunks)
+    assert decode_payload(legacy) == decode_payload(compact) == enriched
+
+
+def test_azure_backend_reuses_client_and_creates_table_once(monkeypatch, make_request):
+    from azure.core.exceptions import ResourceNotFoundError
+
+    calls = []
+
+    class FakeTableClient:
+        def __init__(self):
+            self.entities = []
+            self.missing = False
+
+        async def create_entity(self, entity):
+            calls.append("create_entity")
+            if self.missing:
+                raise ResourceNotFoundError("TableNotFound")
+            self.entities.append(entity)
+
+    class FakeService:
+        table = FakeTableClient()
+
+        @classmethod
+        def from_connection_string(cls, connection_string):
+            calls.append("connect")
+            return cls()
+
+        async def create_table_if_not_exists(self, table_name):
+            calls.append("create_table")
+            self.table.missing = False
+
+        def get_table_client(self, table_name):
+            return self.table
+
+    monkeypatch.setenv("StorageBackend", "azure")
+    monkeypatch.setenv("MaskAInput", "UseDevelopmentStorage=true")
+    monkeypatch.setattr(storage, "TableServiceClient", FakeService, raising=False)
+    monkeypatch.setattr(storage, "_AZURE_TABLE_STORES", {})
+
+    async def submit_three():
+        statuses = [(await main(make_request(VALID_PAYLOAD))).status_code for _ in range(2)]
+        FakeService.table.missing = True  # the table is deleted behind our back
+        statuses.append((await main(make_request(VALID_PAYLOAD))).status_code)
+        return statuses
+
+    assert asyncio.run(submit_three()) == [201, 201, 201]
+    assert calls == [
+        "connect", "create_table", "create_entity", "create_entity",
+        "create_entity", "create_table", "create_entity",
+    ]
+    assert len(FakeService.table.entities) == 3
+
+
+def test_buffered_write_coalescing_acknowledges_before_flush(monkeypatch, make_request):
+    from shared_code.write_coalescer import WriteCoalescer
+
+    table_store = MemoryTableStore()
+    coalescer = WriteCoalescer(enabled=True, flush_interval_ms=1000, durability="buffered")
+    monkeypatch.setattr("backend.save_mask_a.get_mask_a_store", lambda: table_store)
+    monkeypatch.setattr("backend.save_mask_a._WRITE_COALESCER", coalescer)
+
+    async def submit():
+        responses = await asyncio.gather(*(main(make_request(VALID_PAYLOAD)) for _ in range(3)))
+        buffered = len(table_store.tables.get("MaskAInput", {}))
+        await coalescer.drain()
+        return responses, buffered
+
+    responses, buffered = asyncio.run(submit())
+
+    assert [response.status_code for response in responses] == [202] * 3
+    assert json.loads(responses[0].get_body().decode())["status"] == "accepted"
+    assert buffered == 0
+    assert len(table_store.tables["MaskAInput"]) == 3
+    assert coalescer.stats()["max_flush_size"] == 3
+
+
+@pytest.mark.parametrize("backend", ["memory", "filesystem"])
+def test_sharded_partitions_are_listed_with_legacy_rows(monkeypatch, tmp_path, backend, make_request):
+    monkeypatch.setenv("StorageBackend", backend)
+    monkeypatch.setenv("StorageRoot", str(tmp_path))
+    monkeypatch.setenv("MaskAPartitionBuckets", "4")
+    monkeypatch.setattr(storage, "_MEMORY_TABLE_STORE", MemoryTableStore())
+
+    async def scenario():
+        table_store = storage.get_table_store("")
+        responses = [await main(make_request(VALID_PAYLOAD)) for _ in range(12)]
+        keys = [json.loads(response.get_body().decode()) for response in responses]
+        day = keys[0]["partitionKey"][:10]
+        legacy = {
+            "PartitionKey": day,
+            "RowKey": "legacy",
+            "created_at": f"{day}T00:00:00+00:00",
+            **encode_payload({**VALID_PAYLOAD, "caller_metadata": None}, fmt=1),
+        }
+        await table_store.create_entity("MaskAInput", legacy)
+        return keys, await list_mask_a(table_store, day)
+
+    keys, listed = asyncio.run(scenario())
+
+    assert len({key["partitionKey"] for key in keys}) > 1
+    assert all(key["partitionKey"].startswith(listed[0]["partitionKey"] + "_") for key in keys)
+    assert listed[0]["rowKey"] == "legacy"
+    assert [entry["rowKey"] for entry in listed[1:]] == [key["rowKey"] for key in keys]
+    assert listed[1]["payload"] == keys[0]["payload"]
+
+
+def test_bucket_keys_keep_their_width_when_buckets_grow(monkeypatch):
+    day = date(2024, 5, 1)
+
+    assert partition_key("row", day, buckets=4) == f"2024-05-01_{zlib.crc32(b'row') % 4:02d}"
+    assert day_partitions(day, buckets=100)[1:3] == ["2024-05-01_00", "2024-05-01_01"]
+    with pytest.raises(ValueError):
+        day_partitions(day, buckets=101)
+
+    monkeypatch.setenv("MaskAPartitionBuckets", "500")
+    assert partition_buckets() == MAX_PARTITION_BUCKETS
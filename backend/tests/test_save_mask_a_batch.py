@@ -0,0 +1,98 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+for path in (ROOT, ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from backend.save_mask_a_batch import main
+from shared_code.mask_a import decode_payload
+from shared_code.storage import EntityExistsError, MemoryTableStore, StorageError
+from tests.test_save_mask_a import VALID_PAYLOAD
+
+
+class RecordingStore(MemoryTableStore):
+    def __init__(self, fail_on_chunk=None):
+        super().__init__()
+        self.chunks = []
+        self.fail_on_chunk = fail_on_chunk
+
+    async def create_entities(self, table, entities):
+        self.chunks.append(len(entities))
+        if len(self.chunks) == self.fail_on_chunk:
+            raise StorageError("boom")
+        await super().create_entities(table, entities)
+
+
+@pytest.fixture
+def submit(monkeypatch, make_request):
+    def run(store, body):
+        monkeypatch.setattr("backend.save_mask_a_batch.get_mask_a_store", lambda: store)
+        response = asyncio.run(main(make_request(body)))
+        return response, json.loads(response.get_body().decode())
+
+    return run
+
+
+def test_reports_per_item_results(submit):
+    store = RecordingStore()
+    items = [VALID_PAYLOAD, {**VALID_PAYLOAD, "unexpected": "value"}, "not-an-object", VALID_PAYLOAD]
+
+    response, body = submit(store, {"items": items})
+
+    assert response.status_code == 200
+    assert (body["stored"], body["failed"]) == (2, 2)
+    assert [result["status"] for result in body["results"]] == [201, 400, 400, 201]
+    assert body["results"][1]["errors"][0]["type"] == "extra_forbidden"
+    stored = store.tables["MaskAInput"]
+    assert {(result["partitionKey"], result["rowKey"]) for result in body["results"] if result["status"] == 201} == set(stored)
+    assert decode_payload(next(iter(stored.values())))["eigene_name"] == "Max Mustermann"
+    assert store.chunks == [2]
+
+
+def test_chunks_transactions_and_isolates_failures(submit):
+    store = RecordingStore(fail_on_chunk=2)
+
+    response, body = submit(store, {"items": [VALID_PAYLOAD] * 205})
+
+    assert store.chunks == [100, 100, 5]
+    assert (body["stored"], body["failed"]) == (105, 100)
+    assert [result["status"] for result in body["results"][95:105]] == [201] * 5 + [500] * 5
+    assert len(store.tables["MaskAInput"]) == 105
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        ({"items": []}, "Batch must contain at least one item."),
+        ({"items": [VALID_PAYLOAD] * 3}, "Batch exceeds the maximum of 2 items."),
+        ([VALID_PAYLOAD], "Request body must be a JSON object with an 'items' list."),
+    ],
+)
+def test_rejects_invalid_batches(monkeypatch, submit, body, message):
+    monkeypatch.setenv("MaskABatchMaxItems", "2")
+
+    response, payload = submit(RecordingStore(), body)
+
+    assert response.status_code == 400
+    assert payload["message"] == message
+
+
+def test_memory_transaction_is_all_or_nothing():
+    store = MemoryTableStore()
+    rows = [{"PartitionKey": "p", "RowKey": str(index)} for index in range(3)]
+
+    async def scenario():
+        await store.create_entity("t", rows[1])
+        with pytest.raises(EntityExistsError):
+            await store.create_entities("t", rows)
+        with pytest.raises(ValueError):
+            await store.create_entities("t", [rows[0], {"PartitionKey": "q", "RowKey": "0"}])
+
+    asyncio.run(scenario())
+    assert list(store.tables["t"]) == [("p", "1")]
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks import startup  # noqa: E402
+
+HEAVY_MODULES = ("docx", "lxml", "pydantic", "email_validator", "azure.storage.blob", "azure.data.tables", "azure.storage.queue")
+
+
+def _modules_loaded_by(function: str) -> set:
+    code = f"import json, sys; import {function}; print(json.dumps(sorted(sys.modules)))"
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return set(json.loads(completed.stdout))
+
+
+@pytest.mark.parametrize("function", startup.discover_functions())
+def test_function_import_defers_heavy_dependencies(function):
+    loaded = _modules_loaded_by(function)
+
+    assert not [module for module in HEAVY_MODULES if module in loaded]
+
+
+def test_parse_importtime_reads_depth_and_cumulative_time():
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:        20 |         20 |     json.decoder",
+            "import time:       100 |        150 |   json",
+            "import time:       300 |       1450 | generate_contract",
+        ]
+    )
+
+    assert startup.parse_importtime(stderr) == [
+        (2, "json.decoder", 0.02),
+        (1, "json", 0.15),
+        (0, "generate_contract", 1.45),
+    ]
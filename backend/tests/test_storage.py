@@ -0,0 +1,192 @@
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from shared_code import storage  # noqa: E402
+
+
+@pytest.fixture(params=["memory", "filesystem"])
+def blob_store(request, tmp_path):
+    if request.param == "memory":
+        return storage.MemoryBlobStore()
+    return storage.FileSystemBlobStore(tmp_path)
+
+
+def test_blob_store_round_trip_and_conditional_download(blob_store):
+    async def scenario():
+        url = await blob_store.upload("templates", "nested/contract.docx", b"v1")
+        first = await blob_store.download("templates", "nested/contract.docx")
+        with pytest.raises(storage.BlobNotModifiedError):
+            await blob_store.download("templates", "nested/contract.docx", if_none_match=first.etag)
+        return url, first
+
+    url, first = asyncio.run(scenario())
+
+    assert first.data == b"v1"
+    assert first.etag
+    assert url == blob_store.url("templates", "nested/contract.docx")
+
+
+def test_blob_store_distinguishes_missing_container_and_blob(blob_store):
+    async def scenario():
+        with pytest.raises(storage.ContainerNotFoundError):
+            await blob_store.download("missing", "contract.docx")
+        await blob_store.upload("templates", "a.docx", b"a")
+        with pytest.raises(storage.BlobNotFoundError):
+            await blob_store.download("templates", "b.docx")
+
+    asyncio.run(scenario())
+
+
+def test_blob_store_refuses_overwrite_when_asked(blob_store):
+    async def scenario():
+        await blob_store.upload("contracts", "contract.docx", b"first", overwrite=False)
+        with pytest.raises(storage.BlobExistsError):
+            await blob_store.upload("contracts", "contract.docx", b"second", overwrite=False)
+        assert await blob_store.exists("contracts", "contract.docx")
+        return await blob_store.download("contracts", "contract.docx")
+
+    assert asyncio.run(scenario()).data == b"first"
+
+
+def test_blob_store_uploads_from_a_stream(blob_store):
+    async def scenario():
+        await blob_store.upload("contracts", "contract.docx", io.BytesIO(b"streamed"))
+        return await blob_store.download("contracts", "contract.docx")
+
+    assert asyncio.run(scenario()).data == b"streamed"
+
+
+def test_table_stores_reject_duplicate_keys(tmp_path):
+    entity = {"PartitionKey": "2024-01-01", "RowKey": "abc", "payload": "{}"}
+
+    async def scenario(store):
+        async with store:
+            await store.create_table_if_not_exists("MaskAInput")
+            await store.create_entity("MaskAInput", entity)
+            with pytest.raises(storage.EntityExistsError):
+                await store.create_entity("MaskAInput", entity)
+
+    asyncio.run(scenario(storage.MemoryTableStore()))
+    asyncio.run(scenario(storage.FileSystemTableStore(tmp_path)))
+
+    assert (tmp_path / "tables" / "MaskAInput" / "2024-01-01" / "abc.json").is_file()
+
+
+def test_backend_selection(monkeypatch, tmp_path):
+    monkeypatch.setenv("StorageBackend", "memory")
+    assert storage.get_blob_store("ignored") is storage.get_blob_store("other")
+
+    monkeypatch.setenv("StorageBackend", "filesystem")
+    monkeypatch.setenv("StorageRoot", str(tmp_path))
+    assert isinstance(storage.get_blob_store(""), storage.FileSystemBlobStore)
+    assert isinstance(storage.get_table_store(""), storage.FileSystemTableStore)
+
+    monkeypatch.setenv("StorageBackend", "s3")
+    with pytest.raises(storage.StorageError):
+        storage.get_blob_store("")
+
+
+def test_local_queue_stores_deliver_in_order(tmp_path):
+    async def scenario(store):
+        await store.send("contract-jobs", "first")
+        await store.send("contract-jobs", "second")
+        return [store.receive("contract-jobs") for _ in range(3)]
+
+    for store in (storage.MemoryQueueStore(), storage.FileSystemQueueStore(tmp_path)):
+        assert asyncio.run(scenario(store)) == ["first", "second", None]
+
+
+def test_table_store_upsert_merges_properties(tmp_path):
+    async def scenario(store):
+        await store.upsert_entity("Jobs", {"PartitionKey": "p", "RowKey": "r", "status": "queued", "a": 1})
+        await store.upsert_entity("Jobs", {"PartitionKey": "p", "RowKey": "r", "status": "done"})
+        return await store.get_entity("Jobs", "p", "r"), await store.get_entity("Jobs", "p", "missing")
+
+    for store in (storage.MemoryTableStore(), storage.FileSystemTableStore(tmp_path)):
+        entity, missing = asyncio.run(scenario(store))
+        assert (entity["status"], entity["a"], missing) == ("done", 1, None)
+
+
+def test_write_coalescer_groups_inserts_and_resolves_each_request():
+    from shared_code.write_coalescer import WriteCoalescer
+
+    class RecordingStore(storage.MemoryTableStore):
+        transactions = []
+
+        async def create_entities(self, table, entities):
+            self.transactions.append(len(entities))
+            await super().create_entities(table, entities)
+
+    table_store = RecordingStore()
+    coalescer = WriteCoalescer(enabled=True, flush_interval_ms=50, max_batch=4)
+    rows = [{"PartitionKey": "p", "RowKey": str(index)} for index in range(6)]
+
+    async def scenario():
+        await table_store.create_entity("t", {"PartitionKey": "p", "RowKey": "5"})
+        return await asyncio.gather(
+            *(coalescer.create_entity(table_store, "t", row) for row in rows), return_exceptions=True
+        )
+
+    outcomes = asyncio.run(scenario())
+
+    # A full batch flushes at once; the duplicate fails only its own request.
+    assert RecordingStore.transactions == [4, 2]
+    assert outcomes[:5] == [None] * 5
+    assert isinstance(outcomes[5], storage.EntityExistsError)
+    assert len(table_store.tables["t"]) == 6
+    assert coalescer.stats()["flushes"] == 2
+    assert coalescer.stats()["fallbacks"] == 1
+
+
+def test_write_coalescer_groups_filesystem_stores_by_root(tmp_path):
+    from shared_code.write_coalescer import WriteCoalescer
+
+    coalescer = WriteCoalescer(enabled=True, flush_interval_ms=50, max_batch=10)
+    rows = [{"PartitionKey": "p", "RowKey": str(index)} for index in range(3)]
+
+    async def scenario():
+        # The filesystem backend hands out a new store per call.
+        await asyncio.gather(
+            *(coalescer.create_entity(storage.FileSystemTableStore(tmp_path), "t", row) for row in rows)
+        )
+
+    asyncio.run(scenario())
+
+    assert coalescer.stats()["flushes"] == 1
+    assert coalescer.stats()["max_flush_size"] == 3
+
+
+def test_write_coalescer_does_not_retry_throttled_transactions_one_by_one():
+    from shared_code.write_coalescer import WriteCoalescer
+
+    class ThrottledStore(storage.MemoryTableStore):
+        inserts = 0
+
+        async def create_entities(self, table, entities):
+            raise storage.StorageError("Server busy")
+
+        async def create_entity(self, table, entity):
+            ThrottledStore.inserts += 1
+
+    coalescer = WriteCoalescer(enabled=True, flush_interval_ms=50, max_batch=3)
+    table_store = ThrottledStore()
+    rows = [{"PartitionKey": "p", "RowKey": str(index)} for index in range(3)]
+
+    async def scenario():
+        return await asyncio.gather(
+            *(coalescer.create_entity(table_store, "t", row) for row in rows), return_exceptions=True
+        )
+
+    outcomes = asyncio.run(scenario())
+
+    assert all(isinstance(outcome, storage.StorageError) for outcome in outcomes)
+    assert ThrottledStore.inserts == 0
+    assert coalescer.stats()["fallbacks"] == 0